@@ -103,24 +103,23 @@ def set_environment_variables(
         print(f"  - Log-Verzeichnis: {os.environ['ref_log_dir']}")
 
 
-def provider_thread_target(ready_event=None):
+def provider_thread_target(handle: reference_provider.ProviderHandle):
     """
     Startet den Provider in einem separaten Thread.
-    Verbessert mit Event für Bereitschaftssignalisierung.
+    Bereitschaft und Fehler werden über das ProviderHandle signalisiert.
     """
     try:
-        # Start des Providers mit Ausnahmebehandlung im Inneren
-        reference_provider.run_provider()
+        reference_provider.run_provider(handle)
     except Exception as e:
         print(f"FEHLER im Provider-Thread: {e}")
-        if ready_event:
-            ready_event.set()  # Signal senden, dass Thread beendet wurde (mit Fehler)
+        if not handle.ready.done():
+            handle.ready.set_exception(e)
 
 
 def run(tls: bool, timeout: int = 10) -> reference_consumer.TestCollector:
     """
     Startet den Provider im Hintergrund und führt dann Consumer-Tests aus.
-    Verbessert mit Timeout-Handling und Bereitschaftssignalisierung.
+    Die Tests beginnen, sobald der Provider seine Bereitschaft meldet.
     
     Args:
         tls: TLS-Verschlüsselung aktivieren
@@ -131,13 +130,12 @@ def run(tls: bool, timeout: int = 10) -> reference_consumer.TestCollector:
     """
     print("\n--- VITALPARAMETER-MONITOR: TESTSUITE WIRD GESTARTET ---\n")
     
-    # Event für die Synchronisation (Provider ist bereit oder fehlgeschlagen)
-    ready_event = threading.Event()
+    handle = reference_provider.ProviderHandle()
     
     print("Starte Provider in separatem Thread...")
     thread = threading.Thread(
         target=provider_thread_target,
-        args=(ready_event,),
+        args=(handle,),
         daemon=True
     )
     thread.start()
@@ -145,43 +143,22 @@ def run(tls: bool, timeout: int = 10) -> reference_consumer.TestCollector:
     # Warte auf Provider-Start
     print(f"Warte maximal {timeout} Sekunden auf Provider-Start...")
     start_time = time.time()
-    
-    # Verbesserte Statusüberprüfung mit Timeout
-    while time.time() - start_time < timeout:
-        # Prüfe, ob Thread noch läuft
-        if not thread.is_alive():
-            print("\nFEHLER: Provider-Thread wurde unerwartet beendet!")
-            sys.exit(1)
-        
-        # Prüfe, ob das Ready-Event signalisiert wurde (Fehler)
-        if ready_event.is_set():
-            print("\nFEHLER: Provider hat einen Fehler gemeldet!")
-            sys.exit(1)
-        
-        # Kurze Pause
-        time.sleep(2)
-        
-        # Nach 3 Sekunden anfangen, auf Provider-Bereitschaft zu prüfen
-        
-        elapsed = time.time() - start_time
-        if elapsed >= 3:
-            try:
-                # Der Provider sollte eine Flag setzen, wenn er bereit ist
-                if hasattr(reference_provider, 'provider_ready') and reference_provider.provider_ready:
-                    print(f"Provider erfolgreich gestartet nach {elapsed:.1f} Sekunden!")
-                    break
-            except Exception:
-                # Ignoriere Fehler bei der Statusabfrage
-                pass
-    
-    # Timeout-Prüfung
-    if time.time() - start_time >= timeout:
+    try:
+        handle.wait_ready(timeout)
+        print(f"Provider erfolgreich gestartet nach {time.time() - start_time:.1f} Sekunden!")
+    except TimeoutError:
         print(f"\nWARNUNG: Timeout ({timeout}s) beim Warten auf Provider-Start!")
         print("Versuche trotzdem, mit den Tests fortzufahren...")
+    except Exception as e:
+        print(f"\nFEHLER: Provider hat einen Fehler gemeldet: {e}")
+        sys.exit(1)
     
-    # Starte Consumer und Tests
-    print("Starte Consumer und Tests...")
-    return reference_consumer.run_ref_test()
+    try:
+        # Starte Consumer und Tests
+        print("Starte Consumer und Tests...")
+        return reference_consumer.run_ref_test()
+    finally:
+        handle.stop(timeout)
 
 
 def main(
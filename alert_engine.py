@@ -0,0 +1,122 @@
+"""Rule based evaluation of alert conditions.
+
+Limits are configured per AlertCondition handle and per source metric:
+
+    {
+        "ac0.mds0": {
+            "limits": {"numeric.ch0.vmd0": {"lower": 55, "upper": 95}},
+            "hysteresis": 1,
+            "latching": false
+        }
+    }
+
+A limit is violated above upper or below lower. Once violated, the value has
+to come back by `hysteresis` inside the limits before the violation clears.
+A condition is present while any of its limits is violated; a latching
+condition stays present until reset(). Rules are only evaluated when one of
+their source values changes, and only presence flips are reported.
+"""
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import pathlib
+from typing import Any, Iterable
+
+DEFAULT_CONFIG_PATH = pathlib.Path(__file__).parent / 'alert_rules_default.json'
+
+
+@dataclasses.dataclass(frozen=True)
+class Limit:
+    lower: float | None = None
+    upper: float | None = None
+
+    def violated(self, value: float, hysteresis: float) -> bool:
+        return ((self.upper is not None and value > self.upper - hysteresis)
+                or (self.lower is not None and value < self.lower + hysteresis))
+
+
+@dataclasses.dataclass(frozen=True)
+class AlertRule:
+    handle: str
+    limits: dict[str, Limit]
+    hysteresis: float = 0.0
+    latching: bool = False
+
+
+class AlertEngine:
+    """Evaluates AlertRules incrementally on changed source values."""
+
+    def __init__(self, rules: Iterable[AlertRule]):
+        self.rules = {rule.handle: rule for rule in rules}
+        self._rules_by_source: dict[str, list[AlertRule]] = {}
+        for rule in self.rules.values():
+            for source in rule.limits:
+                self._rules_by_source.setdefault(source, []).append(rule)
+        self._values: dict[str, Any] = {}
+        self._violations: dict[str, set[str]] = {handle: set() for handle in self.rules}
+        self._latched: set[str] = set()
+        self.presence: dict[str, bool] = {}
+        self.evaluations = 0
+
+    @classmethod
+    def from_config(cls, config: dict, known_handles: Iterable[str] | None = None) -> AlertEngine:
+        """Create from a config dict; rules for handles not in known_handles are dropped."""
+        known = set(known_handles) if known_handles is not None else None
+        rules = []
+        for handle, fields in config.items():
+            if known is not None and handle not in known:
+                continue
+            limits = {source: Limit(**limit) for source, limit in fields['limits'].items()}
+            rules.append(AlertRule(handle, limits, fields.get('hysteresis', 0.0), fields.get('latching', False)))
+        return cls(rules)
+
+    @classmethod
+    def from_env(cls, known_handles: Iterable[str] | None = None) -> AlertEngine:
+        """Load the file named by ref_alert_rules or alert_rules_default.json."""
+        path = pathlib.Path(os.getenv('ref_alert_rules', str(DEFAULT_CONFIG_PATH)))
+        return cls.from_config(json.loads(path.read_bytes()), known_handles)
+
+    @property
+    def sources(self) -> set[str]:
+        return set(self._rules_by_source)
+
+    def update(self, values: Iterable[tuple[str, Any]]) -> list[tuple[str, bool]]:
+        """Feed new source values; returns (condition handle, presence) of all flipped conditions."""
+        touched: dict[str, AlertRule] = {}
+        for source, value in values:
+            rules = self._rules_by_source.get(source)
+            if rules is None or self._values.get(source) == value:
+                continue
+            self._values[source] = value
+            value = float(value)
+            for rule in rules:
+                violations = self._violations[rule.handle]
+                hysteresis = rule.hysteresis if source in violations else 0.0
+                if rule.limits[source].violated(value, hysteresis):
+                    violations.add(source)
+                else:
+                    violations.discard(source)
+                touched[rule.handle] = rule
+        flips = []
+        for handle, rule in touched.items():
+            self.evaluations += 1
+            present = bool(self._violations[handle])
+            if rule.latching:
+                if present:
+                    self._latched.add(handle)
+                present = handle in self._latched
+            if self.presence.get(handle) != present:
+                self.presence[handle] = present
+                flips.append((handle, present))
+        return flips
+
+    def reset(self, handle: str) -> list[tuple[str, bool]]:
+        """Release a latched condition; returns the flip if it is no longer violated."""
+        self._latched.discard(handle)
+        present = bool(self._violations.get(handle))
+        if handle in self.presence and self.presence[handle] != present:
+            self.presence[handle] = present
+            return [(handle, present)]
+        return []
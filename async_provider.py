@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Asyncio driver for reference providers.
+
+Each metric group (vitals, alerts, waveforms, contexts) is a coroutine with its
+own period. Generation and staging happen on the event loop, the MDIB commits
+run in a thread pool executor, so the loop never blocks on a transaction. One
+process (and one event loop) can drive many providers this way.
+
+Periods in seconds come from ref_vitals_period (default ref_send_interval),
+ref_alerts_period, ref_waveforms_period and ref_contexts_period; a period of
+0 disables the group.
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import asyncio
+import dataclasses
+import functools
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import reference_provider
+from sdc11073 import location, provider, wsdiscovery
+from sdc11073.loghelper import LoggerAdapter
+from sdc11073.xml_types import pm_types
+from sdc11073.xml_types import pm_qnames as pm
+
+from publish_policy import PublishFilter
+from scheduler import DeadlineScheduler
+from signal_generator import SignalGenerator, get_seed, heart_rate_spec, spo2_spec
+from tick_engine import TickEngine
+
+
+@dataclasses.dataclass
+class GroupPeriods:
+    """Period in seconds per metric group, None = group disabled."""
+    vitals: float | None = 0.05
+    alerts: float | None = 0.1
+    waveforms: float | None = 0.1
+    contexts: float | None = None
+
+    @classmethod
+    def from_env(cls) -> GroupPeriods:
+        def period(name: str, default: float) -> float | None:
+            value = float(os.getenv(f'ref_{name}_period', str(default)))
+            return value if value > 0 else None
+
+        return cls(
+            vitals=period('vitals', reference_provider.get_send_interval()),
+            alerts=period('alerts', 0.1),
+            waveforms=period('waveforms', 0.1),
+            contexts=period('contexts', 0),
+        )
+
+
+def touch_patient_context(prov: provider.SdcProvider):
+    """Re-commit the associated patient context state, i.e. send a context report."""
+    with prov.mdib.context_state_transaction() as mgr:
+        for state in prov.mdib.context_states.NODETYPE.get(pm.PatientContextState, []):
+            if state.ContextAssociation == pm_types.ContextAssociation.ASSOCIATED:
+                mgr.get_context_state(state.Handle)
+
+
+class AsyncProviderDriver:
+    """Drives the metric groups of one started reference provider."""
+
+    def __init__(
+        self,
+        prov: provider.SdcProvider,
+        executor: ThreadPoolExecutor,
+        periods: GroupPeriods,
+        publish_filter: PublishFilter | None = None,
+        context_update: Callable[[provider.SdcProvider], None] = touch_patient_context,
+        logger=None
+    ):
+        self._prov = prov
+        self._executor = executor
+        self.periods = periods
+        self._context_update = context_update
+        self._logger = logger or LoggerAdapter(logging.getLogger('sdc'))
+        self._stop = asyncio.Event()
+        self._generator = SignalGenerator(
+            [heart_rate_spec(reference_provider.HEART_RATE_HANDLE), spo2_spec(reference_provider.SPO2_HANDLE)],
+            seed=get_seed()
+        )
+        self.vitals_engine = TickEngine(prov.mdib, publish_filter)
+        # both engines commit concurrently in the executor, so each gets its own filter state
+        self.alerts_engine = TickEngine(prov.mdib, publish_filter.copy() if publish_filter is not None else None)
+        self.alert_engine = reference_provider.mk_alert_engine(prov)
+        self.schedulers: dict[str, DeadlineScheduler] = {}
+        self._latest_vitals = None
+
+    @property
+    def provider(self) -> provider.SdcProvider:
+        return self._prov
+
+    def stop(self) -> None:
+        """Stop all group coroutines; must be called from the event loop thread."""
+        self._stop.set()
+
+    async def _in_executor(self, func, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        except Exception:
+            self._logger.exception("Fehler beim MDIB-Commit")
+            return None
+
+    async def _periodic(self, name: str, period: float, step: Callable[[], object]):
+        scheduler = self.schedulers[name] = DeadlineScheduler(period)
+        while not self._stop.is_set():
+            await step()
+            await scheduler.wait_async()
+
+    async def _vitals_step(self):
+        hr, spo2 = self._latest_vitals = self._generator.next_values()
+        self.vitals_engine.set_metric_value(reference_provider.HEART_RATE_HANDLE, hr)
+        self.vitals_engine.set_metric_value(reference_provider.SPO2_HANDLE, spo2)
+        if self.vitals_engine.pending:
+            await self._in_executor(self.vitals_engine.commit)
+
+    async def _alerts_step(self):
+        if self._latest_vitals is None:
+            return
+        hr, spo2 = self._latest_vitals
+        for handle, presence in self.alert_engine.update(
+                ((reference_provider.HEART_RATE_HANDLE, hr), (reference_provider.SPO2_HANDLE, spo2))):
+            self.alerts_engine.set_alert_presence(handle, presence)
+        if self.alerts_engine.pending:
+            await self._in_executor(self.alerts_engine.commit)
+
+    def _mk_waveforms_step(self):
+        generators = reference_provider.get_waveform_generators(self._prov)
+        next_start = {handle: time.time() for handle in generators}
+
+        async def step():
+            now = time.time()
+            chunks = {}
+            for handle, generator in generators.items():
+                count = int((now - next_start[handle]) / generator.sample_period)
+                if count > 0:
+                    chunks[handle] = (next_start[handle], generator.next_samples(count))
+                    next_start[handle] += count * generator.sample_period
+            if chunks:
+                await self._in_executor(reference_provider.write_waveform_samples, self._prov, chunks)
+
+        return step if generators else None
+
+    async def _contexts_step(self):
+        await self._in_executor(self._context_update, self._prov)
+
+    async def run(self):
+        """Run all enabled groups until stop() is called."""
+        steps = {
+            'vitals': self._vitals_step,
+            'alerts': self._alerts_step,
+            'waveforms': self._mk_waveforms_step() if self.periods.waveforms else None,
+            'contexts': self._contexts_step,
+        }
+        tasks = []
+        for name, step in steps.items():
+            period = getattr(self.periods, name)
+            if period and step is not None:
+                tasks.append(asyncio.create_task(self._periodic(name, period, step), name=name))
+        await asyncio.gather(*tasks)
+
+
+async def run_providers(count: int, periods: GroupPeriods, workers: int):
+    """Start count reference providers and drive them all from the running event loop."""
+    logger = reference_provider.setup_logging()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mdib-commit')
+    wsd = wsdiscovery.WSDiscovery(reference_provider.get_network_adapter().ip)
+    wsd.start()
+    base_loc = reference_provider.get_location()
+    drivers: list[AsyncProviderDriver] = []
+    try:
+        for i in range(count):
+            epr = reference_provider.get_epr() if count == 1 else uuid.uuid4()
+            loc = base_loc if count == 1 else location.SdcLocation(
+                fac=base_loc.fac, poc=base_loc.poc, bed=f'{base_loc.bed}{i:03d}'
+            )
+            prov = await loop.run_in_executor(executor, functools.partial(
+                reference_provider.start_reference_provider, wsd, epr, loc,
+                # the waveform group replaces the rt sample loop of sdc11073
+                start_rtsample_loop=periods.waveforms is None
+            ))
+            drivers.append(AsyncProviderDriver(prov, executor, periods, PublishFilter.from_env(), logger=logger))
+            logger.info("Provider %d gestartet: EPR=%s Bett=%s", i, epr, loc.bed)
+        logger.info("%d Provider laufen in einem Event-Loop. CTRL-C zum Beenden", count)
+        await asyncio.gather(*(driver.run() for driver in drivers))
+    finally:
+        for i, driver in enumerate(drivers):
+            driver.stop()
+            logger.info(
+                "Provider %d: %d Vitals-Ticks, %d Transaktionen",
+                i,
+                driver.vitals_engine.ticks,
+                driver.vitals_engine.total.transactions + driver.alerts_engine.total.transactions
+            )
+            driver.provider.stop_all()
+        wsd.stop()
+        executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Asyncio-Treiber für Referenz-Provider')
+    parser.add_argument('--count', type=int, default=1, help='Anzahl Provider in diesem Prozess (Default: 1)')
+    parser.add_argument('--workers', type=int, default=4, help='Threads für MDIB-Commits (Default: 4)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_providers(args.count, GroupPeriods.from_env(), args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Kompressions-Benchmark: lohnt sich HTTP-Kompression (lz4) zwischen Provider und Consumer?
+
+Für jede MDIB-Größe (erzeugt mit mdib_generator) und jedes Verfahren
+(Default: none, lz4) wird ein Provider in eigenem Prozess gestartet und ein
+Consumer mit demselben Verfahren verbunden. Gemessen werden:
+  - GetMdib beim Verbinden: Bytes auf der Leitung und Dauer
+  - Report-Strom für --duration Sekunden: Bytes je Report, CPU-Zeit je Report
+    (Provider-Prozess und Consumer-Prozess) und Latenz DeterminationTime -> Empfang
+Bytes werden über die Empfangszähler der Schnittstelle (--interface, Default lo,
+/proc/net/dev) gezählt, laufen also nur auf Linux und sollten auf einem sonst
+ruhigen Host gemessen werden.
+
+Beispiel:
+    python compression_benchmark.py --sizes 1x2x3,4x4x10,8x8x25 --modes none,lz4 --duration 10
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import csv
+import dataclasses
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import mdib_generator
+import reference_provider
+from fanout_benchmark import find_service, process_cpu_seconds
+from provider_farm import ProviderFarm
+from sdc11073 import observableproperties
+from sdc11073.consumer import SdcConsumer
+from sdc11073.mdib.consumermdib import ConsumerMdib
+from sdc11073.wsdiscovery import WSDiscovery
+
+
+@dataclasses.dataclass
+class CompressionResult:
+    """Messwerte einer Kombination aus MDIB-Größe und Kompressionsverfahren."""
+    size: str
+    metrics: int
+    mode: str
+    getmdib_bytes: int | None
+    getmdib_seconds: float
+    reports: int
+    bytes_per_report: float | None
+    provider_cpu_per_report_ms: float | None
+    consumer_cpu_per_report_ms: float
+    latency_p50_ms: float
+    latency_p99_ms: float
+
+
+def interface_rx_bytes(interface: str) -> int | None:
+    """Empfangene Bytes der Schnittstelle laut /proc/net/dev, None wenn nicht verfügbar."""
+    try:
+        with open('/proc/net/dev') as f:
+            for line in f:
+                name, _, counters = line.partition(':')
+                if name.strip() == interface:
+                    return int(counters.split()[0])
+    except OSError:
+        pass
+    return None
+
+
+def _delta(before: float | None, after: float | None) -> float | None:
+    return after - before if before is not None and after is not None else None
+
+
+def parse_size(text: str) -> tuple[int, int, int]:
+    """Parst 'VMDSxCHANNELSxMETRICS', z.B. '4x4x10'."""
+    vmds, channels, metrics = (int(part) for part in text.lower().split('x'))
+    return vmds, channels, metrics
+
+
+def measure(size: str, mdib_path: pathlib.Path, metrics: int, mode: str, duration: float,
+            interval: float, interface: str, timeout: float, policy_path: str) -> CompressionResult:
+    """Startet einen Provider mit Verfahren mode, verbindet einen Consumer und misst."""
+    methods = [] if mode == 'none' else mode.split('+')
+    farm = ProviderFarm(1, extra_env={
+        'ref_mdib_path': str(mdib_path),
+        'ref_compression': ','.join(methods) or 'none',
+        'ref_send_interval': str(interval),
+        'ref_publish_policy': policy_path,
+        'ref_log_tick_every': '1000',
+    })
+    wsd = WSDiscovery(str(reference_provider.get_network_adapter().ip))
+    client = None
+    latencies: list[float] = []
+    try:
+        farm.start()
+        if not farm.wait_ready(timeout):
+            raise RuntimeError("Provider nicht bereit")
+        member = farm.members[0]
+        wsd.start()
+        service = find_service(wsd, str(member.epr), timeout)
+
+        client = SdcConsumer.from_wsd_service(
+            service, ssl_context_container=reference_provider.get_ssl_context(), validate=False
+        )
+        reference_provider.apply_compression(client, methods)
+        rx_start = interface_rx_bytes(interface)
+        start = time.perf_counter()
+        client.start_all()
+        mdib = ConsumerMdib(client)
+        mdib.init_mdib()
+        getmdib_seconds = time.perf_counter() - start
+        getmdib_bytes = _delta(rx_start, interface_rx_bytes(interface))
+
+        def on_metric(updates):
+            state = updates.get(reference_provider.HEART_RATE_HANDLE)
+            if state is not None and state.MetricValue is not None and state.MetricValue.DeterminationTime:
+                latencies.append(time.time() - state.MetricValue.DeterminationTime)
+
+        time.sleep(1.0)  # Einschwingen
+        observableproperties.bind(mdib, metrics_by_handle=on_metric)
+        rx_start = interface_rx_bytes(interface)
+        provider_cpu_start = process_cpu_seconds(member.process.pid)
+        consumer_cpu_start = time.process_time()
+        time.sleep(duration)
+        observableproperties.unbind(mdib, metrics_by_handle=on_metric)
+        consumer_cpu = time.process_time() - consumer_cpu_start
+        provider_cpu = _delta(provider_cpu_start, process_cpu_seconds(member.process.pid))
+        stream_bytes = _delta(rx_start, interface_rx_bytes(interface))
+    finally:
+        if client is not None:
+            client.stop_all()
+        wsd.stop()
+        farm.stop()
+
+    reports = len(latencies)
+    per_report = (lambda value: value / reports if value is not None and reports else None)
+    lat = np.asarray(latencies) * 1000
+    return CompressionResult(
+        size=size,
+        metrics=metrics,
+        mode=mode,
+        getmdib_bytes=getmdib_bytes,
+        getmdib_seconds=getmdib_seconds,
+        reports=reports,
+        bytes_per_report=per_report(stream_bytes),
+        provider_cpu_per_report_ms=per_report(provider_cpu * 1000 if provider_cpu is not None else None),
+        consumer_cpu_per_report_ms=per_report(consumer_cpu * 1000) or 0.0,
+        latency_p50_ms=float(np.percentile(lat, 50)) if lat.size else float('nan'),
+        latency_p99_ms=float(np.percentile(lat, 99)) if lat.size else float('nan'),
+    )
+
+
+def _fmt(value, spec: str) -> str:
+    return format(value, spec) if value is not None else 'n/a'
+
+
+def print_result(r: CompressionResult) -> None:
+    print(f"{r.size:>10} ({r.metrics:5d} Metriken) {r.mode:>6}: "
+          f"GetMdib {_fmt(r.getmdib_bytes, ',')} B in {r.getmdib_seconds * 1000:.0f}ms, "
+          f"{r.reports} Reports à {_fmt(r.bytes_per_report, '.0f')} B, "
+          f"CPU/Report Provider {_fmt(r.provider_cpu_per_report_ms, '.3f')}ms "
+          f"Consumer {r.consumer_cpu_per_report_ms:.3f}ms, "
+          f"Latenz p50={r.latency_p50_ms:.1f}ms p99={r.latency_p99_ms:.1f}ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Vergleicht HTTP-Kompression über verschiedene MDIB-Größen')
+    parser.add_argument('--sizes', default='1x2x3,4x4x10,8x8x25',
+                        help="MDIB-Größen als VMDSxCHANNELSxMETRICS (Default: 1x2x3,4x4x10,8x8x25)")
+    parser.add_argument('--modes', default='none,lz4',
+                        help="Verfahren, kommagetrennt: none, lz4, gzip, lz4+gzip (Default: none,lz4)")
+    parser.add_argument('--duration', type=float, default=10, help='Messdauer je Kombination in Sekunden')
+    parser.add_argument('--send-interval', type=float, default=0.05, help='Provider-Sendeintervall in Sekunden')
+    parser.add_argument('--interface', default='lo', help='Schnittstelle für die Byte-Zählung (Default: lo)')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout für Start und Verbinden in Sekunden')
+    parser.add_argument('--csv', help='Ergebnisse zusätzlich als CSV schreiben')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        policy_path = os.path.join(tmp, 'publish_policy.json')
+        with open(policy_path, 'w') as f:
+            # jeden Tick senden, damit alle Verfahren gleich viele Reports erzeugen
+            json.dump({'default': {'change_only': False}}, f)
+        for size in args.sizes.split(','):
+            mdib_path = pathlib.Path(tmp) / f'mdib_{size}.xml'
+            stats = mdib_generator.write_mdib(mdib_path, *parse_size(size))
+            for mode in args.modes.split(','):
+                print(f"Messe {size} mit Kompression {mode}...")
+                result = measure(size, mdib_path, stats.metrics, mode, args.duration, args.send_interval,
+                                 args.interface, args.timeout, policy_path)
+                print_result(result)
+                results.append(result)
+
+    print("\n--- ERGEBNISSE ---")
+    for result in results:
+        print_result(result)
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=[field.name for field in dataclasses.fields(CompressionResult)])
+            writer.writeheader()
+            for result in results:
+                writer.writerow(dataclasses.asdict(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
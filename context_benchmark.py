@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Kontext-Churn-Benchmark: was kosten Patienten- und Location-Kontexte bei hoher Fluktuation?
+
+Ein Referenz-Provider läuft in eigenem Prozess (ProviderFarm) mit Kontext-Churn
+(context_churn: Aufnahmen, Re-Assoziationen und Verlegungen mit den Raten
+--admit-rate, --reassociate-rate, --transfer-rate pro Sekunde). Ein Consumer
+verbindet sich und misst für --duration Sekunden:
+  - Provider: Dauer der Aufnahme-/Re-Assoziations-Transaktionen und der Verlegungen
+    (Metrik-Endpunkt, sdc_context_churn_seconds; getrennt, da set_location ebenfalls
+    eine Kontext-Transaktion ist) und CPU-Zeit des Provider-Prozesses
+  - Consumer: Verarbeitungszeit je EpisodicContextReport in der ConsumerMdib
+  - alle --sample-every Sekunden die Dauer typischer context_states-Abfragen
+    in Abhängigkeit von der Anzahl (historischer) Kontext-Zustände
+
+Beispiel:
+    python context_benchmark.py --admit-rate 5 --reassociate-rate 2 --transfer-rate 0.2 --duration 120
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import csv
+import dataclasses
+import functools
+import re
+import socket
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+import reference_provider
+from fanout_benchmark import find_service, process_cpu_seconds
+from provider_farm import ProviderFarm
+from sdc11073 import observableproperties
+from sdc11073.consumer import SdcConsumer
+from sdc11073.mdib.consumermdib import ConsumerMdib
+from sdc11073.wsdiscovery import WSDiscovery
+from sdc11073.xml_types import pm_qnames as pm
+from sdc11073.xml_types import pm_types
+
+
+@dataclasses.dataclass
+class LookupSample:
+    """Dauer der context_states-Abfragen bei einer bestimmten Anzahl Zustände (Mikrosekunden, Median)."""
+    elapsed: float
+    context_states: int
+    patient_states: int
+    by_type_us: float
+    by_descriptor_us: float
+    by_handle_us: float
+    associated_patient_us: float
+
+
+@dataclasses.dataclass
+class ChurnResult:
+    """Gesamtergebnis eines Laufs."""
+    context_reports: int
+    context_updates: int
+    consumer_ms_per_report: float | None
+    provider_transactions: int | None
+    provider_ms_per_transaction: float | None
+    provider_transfers: int | None
+    provider_ms_per_transfer: float | None
+    provider_cpu: float | None
+    samples: list[LookupSample]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def scrape_churn(url: str) -> dict[str, tuple[int, float]] | None:
+    """(Anzahl, Summe in Sekunden) je Churn-Vorgang (associate, transfer) laut Metrik-Endpunkt."""
+    try:
+        text = urllib.request.urlopen(url, timeout=5).read().decode()
+    except OSError:
+        return None
+    churn = {}
+    for operation in ('associate', 'transfer'):
+        values = {}
+        for suffix in ('count', 'sum'):
+            match = re.search(rf'^sdc_context_churn_seconds_{suffix}\{{operation="{operation}"\}} (\S+)$',
+                              text, re.MULTILINE)
+            values[suffix] = float(match.group(1)) if match else 0.0
+        churn[operation] = int(values['count']), values['sum']
+    return churn
+
+
+def _median_us(func, repetitions: int) -> float:
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1e6
+
+
+def sample_lookups(mdib: ConsumerMdib, elapsed: float, repetitions: int) -> LookupSample:
+    """Misst die typischen Abfragen eines Consumers auf mdib.context_states."""
+    states = mdib.context_states
+    patients = states.NODETYPE.get(pm.PatientContextState, [])
+    descriptor_handle = patients[0].DescriptorHandle if patients else ''
+    handle = patients[len(patients) // 2].Handle if patients else ''
+
+    def associated_patient():
+        return [s for s in states.NODETYPE.get(pm.PatientContextState, [])
+                if s.ContextAssociation == pm_types.ContextAssociation.ASSOCIATED]
+
+    return LookupSample(
+        elapsed=elapsed,
+        context_states=len(states.objects),
+        patient_states=len(patients),
+        by_type_us=_median_us(lambda: states.NODETYPE.get(pm.PatientContextState, []), repetitions),
+        by_descriptor_us=_median_us(lambda: states.descriptor_handle.get(descriptor_handle, []), repetitions),
+        by_handle_us=_median_us(lambda: states.handle.get_one(handle, allow_none=True), repetitions),
+        associated_patient_us=_median_us(associated_patient, repetitions),
+    )
+
+
+def timed_context_reports(mdib: ConsumerMdib, durations: list[float]) -> bool:
+    """
+    Misst die Verarbeitung der EpisodicContextReports in der ConsumerMdib.
+    Muss vor init_mdib() aufgerufen werden, dort wird der Handler gebunden.
+    """
+    original = getattr(mdib, '_on_episodic_context_report', None)
+    if original is None:
+        return False
+
+    @functools.wraps(original)
+    def on_context_report(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    mdib._on_episodic_context_report = on_context_report
+    return True
+
+
+def run_benchmark(admit_rate: float, reassociate_rate: float, transfer_rate: float, duration: float,
+                  sample_every: float, repetitions: int, timeout: float) -> ChurnResult:
+    metrics_port = free_port()
+    farm = ProviderFarm(1, extra_env={
+        'ref_context_admit_rate': str(admit_rate),
+        'ref_context_reassociate_rate': str(reassociate_rate),
+        'ref_context_transfer_rate': str(transfer_rate),
+        'ref_metrics_port': str(metrics_port),
+        'ref_log_tick_every': '1000',
+    })
+    metrics_url = f'http://127.0.0.1:{metrics_port}/metrics'
+    wsd = WSDiscovery(str(reference_provider.get_network_adapter().ip))
+    client = None
+    report_durations: list[float] = []
+    updates = [0]
+    samples: list[LookupSample] = []
+    try:
+        farm.start()
+        if not farm.wait_ready(timeout):
+            raise RuntimeError("Provider nicht bereit")
+        member = farm.members[0]
+        wsd.start()
+        service = find_service(wsd, str(member.epr), timeout)
+        client = SdcConsumer.from_wsd_service(
+            service, ssl_context_container=reference_provider.get_ssl_context(), validate=False
+        )
+        client.start_all()
+        mdib = ConsumerMdib(client)
+        timed = timed_context_reports(mdib, report_durations)
+        if not timed:
+            print("Warnung: Kontext-Handler der ConsumerMdib nicht gefunden, keine Verarbeitungszeiten")
+        mdib.init_mdib()
+
+        def on_context(states):
+            updates[0] += len(states)
+
+        observableproperties.bind(mdib, context_by_handle=on_context)
+        report_durations.clear()
+        churn_start = scrape_churn(metrics_url)
+        cpu_start = process_cpu_seconds(member.process.pid)
+        start = time.monotonic()
+        next_sample = start
+        while (now := time.monotonic()) < start + duration:
+            if now >= next_sample:
+                sample = sample_lookups(mdib, now - start, repetitions)
+                samples.append(sample)
+                print_sample(sample)
+                next_sample += sample_every
+            time.sleep(min(0.1, max(0.0, next_sample - time.monotonic())))
+        samples.append(sample_lookups(mdib, time.monotonic() - start, repetitions))
+        print_sample(samples[-1])
+        observableproperties.unbind(mdib, context_by_handle=on_context)
+        cpu_end = process_cpu_seconds(member.process.pid)
+        churn_end = scrape_churn(metrics_url)
+    finally:
+        if client is not None:
+            client.stop_all()
+        wsd.stop()
+        farm.stop()
+
+    counts: dict[str, int | None] = {'associate': None, 'transfer': None}
+    ms_per: dict[str, float | None] = {'associate': None, 'transfer': None}
+    if churn_start is not None and churn_end is not None:
+        for operation in counts:
+            count = counts[operation] = churn_end[operation][0] - churn_start[operation][0]
+            if count:
+                ms_per[operation] = (churn_end[operation][1] - churn_start[operation][1]) * 1000 / count
+    reports = len(report_durations)
+    return ChurnResult(
+        context_reports=reports,
+        context_updates=updates[0],
+        consumer_ms_per_report=sum(report_durations) * 1000 / reports if reports else None,
+        provider_transactions=counts['associate'],
+        provider_ms_per_transaction=ms_per['associate'],
+        provider_transfers=counts['transfer'],
+        provider_ms_per_transfer=ms_per['transfer'],
+        provider_cpu=cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None,
+        samples=samples,
+    )
+
+
+def print_sample(s: LookupSample) -> None:
+    print(f"t={s.elapsed:6.1f}s {s.context_states:6d} Kontext-Zustände ({s.patient_states:6d} Patienten): "
+          f"NODETYPE {s.by_type_us:8.1f}us, Descriptor-Handle {s.by_descriptor_us:8.1f}us, "
+          f"Handle {s.by_handle_us:6.1f}us, assoziierter Patient {s.associated_patient_us:8.1f}us")
+
+
+def _fmt(value, spec: str) -> str:
+    return format(value, spec) if value is not None else 'n/a'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Misst die Kosten von Kontext-Fluktuation auf Provider und Consumer')
+    parser.add_argument('--admit-rate', type=float, default=5, help='Aufnahmen pro Sekunde')
+    parser.add_argument('--reassociate-rate', type=float, default=1, help='Re-Assoziationen pro Sekunde')
+    parser.add_argument('--transfer-rate', type=float, default=0.2, help='Verlegungen (set_location) pro Sekunde')
+    parser.add_argument('--duration', type=float, default=60, help='Messdauer in Sekunden')
+    parser.add_argument('--sample-every', type=float, default=5, help='Abstand der Abfrage-Messungen in Sekunden')
+    parser.add_argument('--repetitions', type=int, default=200, help='Wiederholungen je Abfrage-Messung')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout für Start und Verbinden in Sekunden')
+    parser.add_argument('--csv', help='Abfrage-Messungen zusätzlich als CSV schreiben')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.admit_rate, args.reassociate_rate, args.transfer_rate, args.duration,
+                           args.sample_every, args.repetitions, args.timeout)
+
+    print("\n--- ERGEBNISSE ---")
+    print(f"Provider: {_fmt(result.provider_transactions, 'd')} Aufnahme-/Re-Assoziations-Transaktionen à "
+          f"{_fmt(result.provider_ms_per_transaction, '.3f')}ms, {_fmt(result.provider_transfers, 'd')} "
+          f"Verlegungen à {_fmt(result.provider_ms_per_transfer, '.3f')}ms, "
+          f"CPU {_fmt(result.provider_cpu, '.2f')}s in {args.duration:.0f}s")
+    print(f"Consumer: {result.context_reports} Kontext-Reports ({result.context_updates} Zustände) à "
+          f"{_fmt(result.consumer_ms_per_report, '.3f')}ms Verarbeitung")
+    if len(result.samples) >= 2:
+        first, last = result.samples[0], result.samples[-1]
+        print(f"Abfrage assoziierter Patient: {first.associated_patient_us:.1f}us bei {first.context_states} "
+              f"-> {last.associated_patient_us:.1f}us bei {last.context_states} Zuständen")
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=[field.name for field in dataclasses.fields(LookupSample)])
+            writer.writeheader()
+            for sample in result.samples:
+                writer.writerow(dataclasses.asdict(sample))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Patient and location context churn of a reference provider.
+
+Simulates a busy ward: admissions (a new PatientContextState is associated, the
+previous one disassociated), re-associations of a historic patient state and
+transfers (set_location to another bed), each at its own rate per second:
+
+    ref_context_admit_rate, ref_context_reassociate_rate, ref_context_transfer_rate
+
+Context states are never removed, so the number of historic PatientContext
+states of the MDS grows with every admission. Rates of 0 (the default)
+disable the churn.
+
+set_location commits through context_state_transaction as well, so with
+metrics the churn reports its two kinds of work separately as
+sdc_context_churn_seconds{operation="associate"|"transfer"}.
+"""
+from __future__ import annotations
+
+import dataclasses
+import os
+import random
+import time
+from typing import TYPE_CHECKING
+
+import reference_provider
+from sdc11073 import location
+from sdc11073.xml_types import pm_qnames as pm
+from sdc11073.xml_types import pm_types
+
+if TYPE_CHECKING:
+    from sdc11073.provider import SdcProvider
+
+    from provider_metrics import ProviderMetrics
+
+
+@dataclasses.dataclass
+class ChurnStats:
+    """Operations done and time spent in the context transactions, in seconds."""
+    admissions: int = 0
+    reassociations: int = 0
+    transfers: int = 0
+    transactions: int = 0
+    context_seconds: float = 0.0
+    location_seconds: float = 0.0
+
+
+def _rate(name: str) -> float:
+    return float(os.getenv(f'ref_context_{name}_rate', '0'))
+
+
+class ContextChurn:
+    """Drives admissions, re-associations and transfers at fixed rates."""
+
+    def __init__(self, prov: SdcProvider, admit_rate: float = 0.0, reassociate_rate: float = 0.0,
+                 transfer_rate: float = 0.0, base_location: location.SdcLocation | None = None,
+                 seed: int | None = None, clock=time.monotonic, metrics: ProviderMetrics | None = None):
+        self._prov = prov
+        self._metrics = metrics
+        self.rates = {'admit': admit_rate, 'reassociate': reassociate_rate, 'transfer': transfer_rate}
+        self._credit = dict.fromkeys(self.rates, 0.0)
+        self._clock = clock
+        self._last: float | None = None
+        self._rng = random.Random(seed)
+        self._base_location = base_location or reference_provider.get_location()
+        self._patient_descriptor = prov.mdib.descriptions.NODETYPE.get_one(pm.PatientContextDescriptor).Handle
+        self._beds = 0
+        self.stats = ChurnStats()
+
+    @classmethod
+    def from_env(cls, prov: SdcProvider, base_location: location.SdcLocation | None = None,
+                 metrics: ProviderMetrics | None = None) -> ContextChurn | None:
+        """Create with the ref_context_*_rate rates; None if all rates are 0."""
+        churn = cls(prov, _rate('admit'), _rate('reassociate'), _rate('transfer'), base_location, metrics=metrics)
+        return churn if any(churn.rates.values()) else None
+
+    def _due(self) -> dict[str, int]:
+        now = self._clock()
+        elapsed = 0.0 if self._last is None else now - self._last
+        self._last = now
+        due = {}
+        for name, rate in self.rates.items():
+            credit = self._credit[name] + rate * elapsed
+            due[name] = int(credit)
+            self._credit[name] = credit - due[name]
+        return due
+
+    def step(self) -> None:
+        """Do all operations that became due since the last call; admissions and
+        re-associations of one call share one context transaction."""
+        due = self._due()
+        if due['admit'] or due['reassociate']:
+            start = time.perf_counter()
+            self._associate(due['admit'], due['reassociate'])
+            seconds = time.perf_counter() - start
+            self.stats.context_seconds += seconds
+            self.stats.transactions += 1
+            self._observe('associate', seconds)
+        for _ in range(due['transfer']):
+            start = time.perf_counter()
+            self._transfer()
+            seconds = time.perf_counter() - start
+            self.stats.location_seconds += seconds
+            self.stats.transfers += 1
+            self._observe('transfer', seconds)
+
+    def _observe(self, operation: str, seconds: float) -> None:
+        if self._metrics is not None:
+            self._metrics.observe('sdc_context_churn_seconds', seconds, operation=operation)
+
+    def _patient_states(self) -> list:
+        return self._prov.mdib.context_states.NODETYPE.get(pm.PatientContextState, [])
+
+    def _associate(self, admissions: int, reassociations: int) -> None:
+        states = self._patient_states()
+        with self._prov.mdib.context_state_transaction() as mgr:
+            copies = {}
+
+            def copy(handle: str):
+                # a state can only be taken into a transaction once
+                if handle not in copies:
+                    copies[handle] = mgr.get_context_state(handle)
+                return copies[handle]
+
+            for state in states:
+                if state.ContextAssociation == pm_types.ContextAssociation.ASSOCIATED:
+                    copy(state.Handle).ContextAssociation = pm_types.ContextAssociation.DISASSOCIATED
+            associated = None
+            for _ in range(admissions):
+                self.stats.admissions += 1
+                if associated is not None:
+                    associated.ContextAssociation = pm_types.ContextAssociation.DISASSOCIATED
+                associated = mgr.mk_context_state(self._patient_descriptor)
+                associated.CoreData.Givenname = 'Patient'
+                associated.CoreData.Familyname = f'{self.stats.admissions:06d}'
+                associated.Identification = []
+            for _ in range(reassociations if states else 0):
+                self.stats.reassociations += 1
+                if associated is not None:
+                    associated.ContextAssociation = pm_types.ContextAssociation.DISASSOCIATED
+                associated = copy(self._rng.choice(states).Handle)
+            if associated is not None:
+                associated.ContextAssociation = pm_types.ContextAssociation.ASSOCIATED
+
+    def _transfer(self) -> None:
+        base = self._base_location
+        self._beds += 1
+        self._prov.set_location(
+            location.SdcLocation(fac=base.fac, poc=base.poc, bed=f'{base.bed}-{self._beds % 1000:03d}'),
+            [pm_types.InstanceIdentifier('Validator', extension_string='System')]
+        )
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Fan-out-Benchmark: wie skaliert ein Referenz-Provider mit vielen Subscribern?
+
+Ein Provider läuft in eigenem Prozess (ProviderFarm), die Subscriber (je ein
+SdcConsumer mit ConsumerMdib) werden auf mehrere Worker-Prozesse verteilt,
+damit nicht der GIL der Consumer-Seite gemessen wird. Je Stufe (Default
+1, 10, 50, 100 Subscriber) werden neue Subscriber hinzugefügt und für
+--duration Sekunden gemessen:
+  - Reports pro Sekunde je Subscriber (erwartet: 1 / Sendeintervall)
+  - Latenz DeterminationTime -> Empfang je Subscriber (gleicher Host, gleiche Uhr)
+  - CPU-Zeit des Provider-Prozesses
+Eine Stufe gilt als verzögert, wenn ein Subscriber weniger als --lag-factor
+der erwarteten Rate erhält oder dessen p99-Latenz über --lag-latency liegt.
+
+Der Provider sendet jeden Tick (Publish-Filter ohne change_only), damit die
+erwartete Rate bekannt ist.
+
+Beispiel:
+    python fanout_benchmark.py --levels 1,10,50,100 --duration 10 --send-interval 0.05
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import csv
+import dataclasses
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import reference_provider
+from provider_farm import ProviderFarm
+from sdc11073 import observableproperties
+from sdc11073.consumer import SdcConsumer
+from sdc11073.definitions_sdc import SdcV1Definitions
+from sdc11073.mdib.consumermdib import ConsumerMdib
+from sdc11073.wsdiscovery import WSDiscovery
+
+
+@dataclasses.dataclass
+class SubscriberResult:
+    """Messwerte eines Subscribers in einem Messfenster."""
+    reports: int
+    latencies: list[float]
+
+
+@dataclasses.dataclass
+class LevelResult:
+    """Ergebnis einer Fan-out-Stufe."""
+    subscribers: int
+    expected_rate: float
+    rate_min: float
+    rate_median: float
+    latency_p50: float
+    latency_p99: float
+    latency_max: float
+    provider_cpu: float | None
+    duration: float
+    lagging: bool
+
+
+def find_service(wsd: WSDiscovery, epr: str, timeout: float):
+    """Sucht den Provider mit der gegebenen EPR per WS-Discovery."""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        for service in wsd.search_services(types=SdcV1Definitions.MedicalDeviceTypesFilter, timeout=1):
+            if service.epr and service.epr.endswith(epr):
+                return service
+    raise RuntimeError(f"Provider {epr} nicht gefunden")
+
+
+def process_cpu_seconds(pid: int) -> float | None:
+    """User- plus System-CPU-Zeit eines Prozesses (psutil oder /proc), None wenn nicht verfügbar."""
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except ImportError:
+        pass
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _subscriber_worker(epr: str, timeout: float, commands, results) -> None:
+    """
+    Worker-Prozess: hält einen Teil der Subscriber.
+    Kommandos: ('add', n), ('measure', t0, t1), ('stop',).
+    """
+    adapter = reference_provider.get_network_adapter()
+    wsd = WSDiscovery(str(adapter.ip))
+    wsd.start()
+    clients = []
+    samples: list[list] = []
+    window = [float('inf'), float('-inf')]
+
+    def mk_callback(buffer: list):
+        def on_metric(updates):
+            now = time.time()
+            if not window[0] <= now <= window[1]:
+                return
+            state = updates.get(reference_provider.HEART_RATE_HANDLE)
+            if state is None or state.MetricValue is None or state.MetricValue.DeterminationTime is None:
+                return
+            buffer.append(now - state.MetricValue.DeterminationTime)
+        return on_metric
+
+    try:
+        service = find_service(wsd, epr, timeout)
+        while True:
+            command = commands.get()
+            if command[0] == 'add':
+                for _ in range(command[1]):
+                    client = SdcConsumer.from_wsd_service(
+                        service, ssl_context_container=reference_provider.get_ssl_context(), validate=False
+                    )
+                    client.start_all()
+                    mdib = ConsumerMdib(client)
+                    mdib.init_mdib()
+                    buffer: list[float] = []
+                    observableproperties.bind(mdib, metrics_by_handle=mk_callback(buffer))
+                    clients.append((client, mdib))
+                    samples.append(buffer)
+                results.put(('added', len(clients)))
+            elif command[0] == 'measure':
+                for buffer in samples:
+                    buffer.clear()
+                window[0], window[1] = command[1], command[2]
+                time.sleep(max(0.0, command[2] - time.time()) + 0.2)
+                results.put(('measured', [SubscriberResult(len(b), list(b)) for b in samples]))
+            else:
+                break
+    except Exception as e:
+        results.put(('error', repr(e)))
+    finally:
+        for client, _ in clients:
+            try:
+                client.stop_all()
+            except Exception:
+                pass
+        wsd.stop()
+
+
+class SubscriberPool:
+    """Verteilt Subscriber reihum auf Worker-Prozesse."""
+
+    def __init__(self, epr: str, processes: int, timeout: float):
+        self._results = multiprocessing.Queue()
+        self._workers = []
+        for i in range(processes):
+            commands = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_subscriber_worker, args=(epr, timeout, commands, self._results),
+                name=f'subscribers-{i}', daemon=True
+            )
+            process.start()
+            self._workers.append((process, commands))
+        self.size = 0
+
+    def _collect(self, expected: str, count: int, timeout: float) -> list:
+        replies = []
+        for _ in range(count):
+            kind, payload = self._results.get(timeout=timeout)
+            if kind == 'error':
+                raise RuntimeError(f"Subscriber-Worker fehlgeschlagen: {payload}")
+            if kind != expected:
+                raise RuntimeError(f"Unerwartete Antwort {kind}")
+            replies.append(payload)
+        return replies
+
+    def grow(self, total: int, timeout: float) -> None:
+        """Erhöht die Anzahl Subscriber auf total."""
+        add = [0] * len(self._workers)
+        for i in range(self.size, total):
+            add[i % len(self._workers)] += 1
+        busy = [(worker, n) for worker, n in zip(self._workers, add) if n]
+        for (_, commands), n in busy:
+            commands.put(('add', n))
+        self._collect('added', len(busy), timeout)
+        self.size = total
+
+    def measure(self, t0: float, t1: float, timeout: float) -> list[SubscriberResult]:
+        for _, commands in self._workers:
+            commands.put(('measure', t0, t1))
+        replies = self._collect('measured', len(self._workers), timeout + t1 - time.time())
+        return [result for reply in replies for result in reply]
+
+    def stop(self) -> None:
+        for _, commands in self._workers:
+            commands.put(('stop',))
+        for process, _ in self._workers:
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+
+
+def evaluate_level(subscribers: int, results: list[SubscriberResult], duration: float, interval: float,
+                   cpu: float | None, lag_factor: float, lag_latency: float) -> LevelResult:
+    expected = 1.0 / interval
+    rates = np.array([r.reports / duration for r in results])
+    latencies = np.concatenate([np.asarray(r.latencies) for r in results]) if results else np.array([])
+    p99_per_subscriber = [np.percentile(r.latencies, 99) for r in results if r.latencies]
+    lagging = bool(
+        len(rates) == 0
+        or rates.min() < lag_factor * expected
+        or (p99_per_subscriber and max(p99_per_subscriber) > lag_latency)
+    )
+    percentile = (lambda q: float(np.percentile(latencies, q))) if latencies.size else (lambda q: float('nan'))
+    return LevelResult(
+        subscribers=subscribers,
+        expected_rate=expected,
+        rate_min=float(rates.min()) if len(rates) else 0.0,
+        rate_median=float(np.median(rates)) if len(rates) else 0.0,
+        latency_p50=percentile(50),
+        latency_p99=percentile(99),
+        latency_max=float(latencies.max()) if latencies.size else float('nan'),
+        provider_cpu=cpu,
+        duration=duration,
+        lagging=lagging,
+    )
+
+
+def print_level(level: LevelResult) -> None:
+    cpu = (f"{level.provider_cpu:.2f}s ({100 * level.provider_cpu / level.duration:.0f}% CPU)"
+           if level.provider_cpu is not None else "n/a")
+    print(f"{level.subscribers:4d} Subscriber: Rate min={level.rate_min:.1f}/s median={level.rate_median:.1f}/s "
+          f"(erwartet {level.expected_rate:.1f}/s), Latenz p50={level.latency_p50 * 1000:.1f}ms "
+          f"p99={level.latency_p99 * 1000:.1f}ms max={level.latency_max * 1000:.1f}ms, "
+          f"Provider {cpu}{'  <-- VERZÖGERT' if level.lagging else ''}")
+
+
+def write_csv(path: str, levels: list[LevelResult]) -> None:
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=[field.name for field in dataclasses.fields(LevelResult)])
+        writer.writeheader()
+        for level in levels:
+            writer.writerow(dataclasses.asdict(level))
+
+
+def run_benchmark(levels: list[int], duration: float, interval: float, processes: int,
+                  timeout: float, lag_factor: float, lag_latency: float) -> list[LevelResult]:
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as policy:
+        # jeden Tick senden, damit die erwartete Rate 1 / Sendeintervall ist
+        json.dump({'default': {'change_only': False}}, policy)
+    farm = ProviderFarm(1, extra_env={
+        'ref_send_interval': str(interval),
+        'ref_publish_policy': policy.name,
+        'ref_log_tick_every': '1000',
+    })
+    pool = None
+    results = []
+    try:
+        farm.start()
+        if not farm.wait_ready(timeout):
+            raise RuntimeError("Provider nicht bereit")
+        member = farm.members[0]
+        pool = SubscriberPool(str(member.epr), processes, timeout)
+        for count in levels:
+            print(f"Verbinde {count - pool.size} weitere Subscriber...")
+            pool.grow(count, timeout)
+            t0 = time.time() + 1.0  # Einschwingen nach dem Verbinden
+            time.sleep(max(0.0, t0 - time.time()))
+            cpu_start = process_cpu_seconds(member.process.pid)
+            t1 = t0 + duration
+            subscriber_results = pool.measure(t0, t1, timeout)
+            cpu_end = process_cpu_seconds(member.process.pid)
+            cpu = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+            level = evaluate_level(count, subscriber_results, duration, interval, cpu, lag_factor, lag_latency)
+            print_level(level)
+            results.append(level)
+    finally:
+        if pool:
+            pool.stop()
+        farm.stop()
+        os.unlink(policy.name)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Fan-out-Benchmark: ein Provider, viele Subscriber')
+    parser.add_argument('--levels', default='1,10,50,100', help='Anzahl Subscriber je Stufe (Default: 1,10,50,100)')
+    parser.add_argument('--duration', type=float, default=10, help='Messdauer je Stufe in Sekunden')
+    parser.add_argument('--send-interval', type=float, default=0.05, help='Provider-Sendeintervall in Sekunden')
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Worker-Prozesse für die Subscriber')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout für Start und Verbinden in Sekunden')
+    parser.add_argument('--lag-factor', type=float, default=0.95,
+                        help='Verzögert, wenn ein Subscriber weniger als diesen Anteil der Rate erhält')
+    parser.add_argument('--lag-latency', type=float, default=0.25,
+                        help='Verzögert, wenn die p99-Latenz eines Subscribers darüber liegt (Sekunden)')
+    parser.add_argument('--csv', help='Ergebnisse zusätzlich als CSV schreiben')
+    args = parser.parse_args()
+
+    levels = sorted(int(level) for level in args.levels.split(','))
+    results = run_benchmark(levels, args.duration, args.send_interval, args.processes,
+                            args.timeout, args.lag_factor, args.lag_latency)
+
+    print("\n--- ERGEBNISSE ---")
+    for level in results:
+        print_level(level)
+    lagging = next((level for level in results if level.lagging), None)
+    if lagging:
+        print(f"Verzögerung ab {lagging.subscribers} Subscribern")
+    else:
+        print(f"Keine Verzögerung bis {results[-1].subscribers if results else 0} Subscriber")
+    if args.csv:
+        write_csv(args.csv, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
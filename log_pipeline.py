@@ -0,0 +1,222 @@
+"""Non-blocking logging for the provider and consumer hot paths.
+
+Loggers only put records into a bounded queue; a background thread writes
+them to the real handlers in batches and flushes once per batch instead of
+once per record. Records are dropped (and counted) instead of blocking when
+the queue is full, e.g. while the disk stalls.
+
+Sampling and rate limiting are plain logging filters and can be attached to
+any logger in the dictConfig, e.g. one "Tick" line per 20 ticks:
+
+    "filters": {"tick_sample": {"()": "log_pipeline.SampleFilter", "every": 20}},
+    "loggers": {"sdc.ticks": {"filters": ["tick_sample"]}}
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Hashable
+
+_HANDLER_CLASSES = {
+    'logging.FileHandler': 'log_pipeline.BatchRotatingFileHandler',
+    'logging.handlers.RotatingFileHandler': 'log_pipeline.BatchRotatingFileHandler',
+    'logging.StreamHandler': 'log_pipeline.BatchStreamHandler',
+}
+
+_listener: BatchingQueueListener | None = None
+
+
+class Sampler:
+    """Lets one of every N events per key pass, optionally at most rate events per second."""
+
+    def __init__(self, every: int = 1, rate: float | None = None, clock=time.monotonic):
+        self.every = max(1, every)
+        self.rate = rate
+        self._clock = clock
+        self._counts: dict[Hashable, int] = {}
+        self._windows: dict[Hashable, tuple[float, int]] = {}
+        self.suppressed = 0
+
+    def __call__(self, key: Hashable = None) -> bool:
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        passed = count % self.every == 0
+        if passed and self.rate is not None:
+            now = self._clock()
+            window_start, passed_in_window = self._windows.get(key, (now, 0))
+            if now - window_start >= 1.0:
+                window_start, passed_in_window = now, 0
+            passed = passed_in_window < self.rate
+            self._windows[key] = (window_start, passed_in_window + passed)
+        if not passed:
+            self.suppressed += 1
+        return passed
+
+
+class SampleFilter(logging.Filter):
+    """Sampling per message template: one of every N records, at most rate records per second."""
+
+    def __init__(self, every: int = 1, rate: float | None = None):
+        super().__init__()
+        self.sampler = Sampler(every, rate)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # warnings and errors are never sampled away
+        return record.levelno >= logging.WARNING or self.sampler(record.msg)
+
+
+class _DeferredFlushMixin:
+    """Suppresses the flush after every record; the listener calls flush_batch() per batch."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class BatchStreamHandler(_DeferredFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchRotatingFileHandler(_DeferredFlushMixin, logging.handlers.RotatingFileHandler):
+    """Size based rotation; note that maxBytes > 0 always opens the file in append mode."""
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the logging thread; counts records that did not fit into the queue."""
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """Background writer: drains the queue in batches and flushes the handlers per batch."""
+
+    _STOP = None
+
+    def __init__(self, record_queue: queue.Queue, handlers: list[logging.Handler],
+                 batch_size: int = 512, flush_interval: float = 0.2):
+        self.queue = record_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.records = 0
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write all queued records, flush and stop the writer thread."""
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _flush(self):
+        for handler in self.handlers:
+            getattr(handler, 'flush_batch', handler.flush)()
+
+    def _handle(self, batch: list[logging.LogRecord]):
+        for record in batch:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        self.batches += 1
+        self.records += len(batch)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if dirty:
+                    self._flush()
+                    dirty = False
+                    last_flush = time.monotonic()
+                continue
+            batch = []
+            stop = record is self._STOP
+            while not stop:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                stop = record is self._STOP
+            if batch:
+                self._handle(batch)
+                dirty = True
+            now = time.monotonic()
+            if stop or now - last_flush >= self.flush_interval:
+                self._flush()
+                dirty = False
+                last_flush = now
+            if stop:
+                return
+
+
+def use_batch_handlers(config: dict, max_bytes: int, backup_count: int) -> None:
+    """Replace the file and stream handler classes of a dictConfig by their batching variants."""
+    for handler in config.get('handlers', {}).values():
+        target = _HANDLER_CLASSES.get(handler.get('class'))
+        if target is None:
+            continue
+        handler['class'] = target
+        if target == 'log_pipeline.BatchRotatingFileHandler':
+            handler['maxBytes'] = max_bytes
+            handler['backupCount'] = backup_count
+
+
+def enqueue_handlers(logger: logging.Logger, queue_size: int = 10000,
+                     batch_size: int = 512, flush_interval: float = 0.2) -> BatchingQueueListener:
+    """Move the handlers of logger behind a queue served by a background writer."""
+    global _listener
+    stop_queue_logging()
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    record_queue = queue.Queue(queue_size)
+    logger.addHandler(DroppingQueueHandler(record_queue))
+    _listener = BatchingQueueListener(record_queue, handlers, batch_size, flush_interval)
+    _listener.start()
+    return _listener
+
+
+def queue_depth() -> int:
+    """Records waiting for the background writer (0 without queue logging)."""
+    return _listener.queue.qsize() if _listener is not None else 0
+
+
+def stop_queue_logging() -> None:
+    """Flush and stop the background writer, if one is running."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_queue_logging)
@@ -0,0 +1,134 @@
+"""Startup cache for parsed and post-processed MDIB files.
+
+Parsing a synthetic MDIB with thousands of descriptors dominates provider
+startup. The cache stores the descriptor and state containers after parsing
+and post-processing as pickle, keyed by the SHA-256 of the MDIB file, the
+sdc11073 version and CACHE_FORMAT. Any change of the XML (or of the
+post-processing, bump CACHE_FORMAT) leads to a new key; the outdated cache
+file of the same MDIB is removed when the new one is written.
+
+ref_mdib_cache=false disables the cache, ref_mdib_cache_dir moves it
+(default: .mdib_cache next to this file).
+"""
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import time
+from importlib import metadata
+from typing import Callable
+
+from sdc11073.mdib import ProviderMdib
+
+CACHE_FORMAT = 1
+
+
+@dataclasses.dataclass
+class StartupTimings:
+    """Seconds spent per startup phase; parse includes reading the cache."""
+    parse: float = 0.0
+    post_process: float = 0.0
+    start_all: float = 0.0
+    cache_hit: bool = False
+
+    @property
+    def total(self) -> float:
+        return self.parse + self.post_process + self.start_all
+
+
+def use_cache() -> bool:
+    return os.getenv('ref_mdib_cache', 'true').lower() in ('true', '1', 'yes')
+
+
+def get_cache_dir() -> pathlib.Path:
+    return pathlib.Path(os.getenv('ref_mdib_cache_dir', str(pathlib.Path(__file__).parent / '.mdib_cache')))
+
+
+def _sdc_version() -> str:
+    try:
+        return metadata.version('sdc11073')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def cache_key(xml_bytes: bytes) -> str:
+    digest = hashlib.sha256(xml_bytes)
+    digest.update(f'{_sdc_version()}/{CACHE_FORMAT}'.encode())
+    return digest.hexdigest()[:32]
+
+
+class MdibCache:
+    """Pickled descriptor/state containers per MDIB file in one directory."""
+
+    def __init__(self, directory: pathlib.Path, logger=None):
+        self.directory = directory
+        self._logger = logger or logging.getLogger('sdc')
+
+    def _path(self, mdib_path: pathlib.Path, key: str) -> pathlib.Path:
+        return self.directory / f'{mdib_path.stem}-{key}.pickle'
+
+    def load(self, mdib_path: pathlib.Path, key: str) -> ProviderMdib | None:
+        path = self._path(mdib_path, key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                sdc_definitions, descriptors, states = pickle.load(f)
+            mdib = ProviderMdib(sdc_definitions)
+            mdib.add_description_containers(descriptors)
+            mdib.add_state_containers(states)
+            mdib.xtra.update_retrievability_lists()
+            return mdib
+        except Exception:
+            self._logger.warning("MDIB-Cache %s unbrauchbar, wird neu erstellt", path, exc_info=True)
+            path.unlink(missing_ok=True)
+            return None
+
+    def store(self, mdib_path: pathlib.Path, key: str, mdib: ProviderMdib) -> None:
+        path = self._path(mdib_path, key)
+        data = (
+            mdib.sdc_definitions,
+            list(mdib.descriptions.objects),
+            list(mdib.states.objects) + list(mdib.context_states.objects),
+        )
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._logger.warning("MDIB-Cache %s konnte nicht geschrieben werden", path, exc_info=True)
+            return
+        for outdated in self.directory.glob(f'{mdib_path.stem}-*.pickle'):
+            if outdated != path:
+                outdated.unlink(missing_ok=True)
+
+
+def load_mdib(
+    mdib_path: pathlib.Path,
+    post_process: Callable[[ProviderMdib], None],
+    cache: MdibCache | None = None,
+) -> tuple[ProviderMdib, StartupTimings]:
+    """Return the parsed and post-processed MDIB, from cache if possible."""
+    timings = StartupTimings()
+    start = time.perf_counter()
+    xml_bytes = mdib_path.read_bytes()
+    key = cache_key(xml_bytes) if cache is not None else None
+    mdib = cache.load(mdib_path, key) if cache is not None else None
+    if mdib is not None:
+        timings.parse = time.perf_counter() - start
+        timings.cache_hit = True
+        return mdib, timings
+    mdib = ProviderMdib.from_string(xml_bytes)
+    timings.parse = time.perf_counter() - start
+    start = time.perf_counter()
+    post_process(mdib)
+    timings.post_process = time.perf_counter() - start
+    if cache is not None:
+        cache.store(mdib_path, key, mdib)
+    return mdib, timings
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Synthetischer MDIB-Generator.
+
+Nimmt reference_mdib.xml als Vorlage und erzeugt MDIBs mit N VMDs x M Channels
+x K Metriken. Pro numerischer Metrik wird eine AlertCondition (mit AlertSignal)
+erzeugt, pro VMD eine Activate-Operation und ab VMD 1 pro Metrik eine
+Set-Operation; VMD 0 ist wie in der Vorlage nicht einstellbar und enthält
+zusätzlich den Waveform-Channel der Vorlage (ecg, pleth).
+Die Handles folgen dem Schema der Vorlage (numeric.ch0.vmd0, ac0.vmd0.mds0,
+string.ch0.vmd1_sco_0, actop.vmd1_sco_0, ...); Metriken von VMD 0, die es in der
+Vorlage gibt, behalten deren Handles (z.B. enumstring2.ch0.vmd0). So laufen
+run_provider und reference_consumer auch mit generierten MDIBs (ab N >= 2,
+M >= 2, K >= 3).
+
+Beispiel:
+    python mdib_generator.py --vmds 10 --channels 4 --metrics 12 -o mdib_10x4x12.xml
+    ref_mdib_path=mdib_10x4x12.xml python reference_provider.py
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import dataclasses
+import pathlib
+import sys
+import xml.etree.ElementTree as ET
+
+TEMPLATE_PATH = pathlib.Path(__file__).parent / 'reference_mdib.xml'
+
+PM = 'http://standards.ieee.org/downloads/11073/11073-10207-2017/participant'
+MSG = 'http://standards.ieee.org/downloads/11073/11073-10207-2017/message'
+XSI = 'http://www.w3.org/2001/XMLSchema-instance'
+XSI_TYPE = f'{{{XSI}}}type'
+
+# Metrik-Arten in der Reihenfolge, in der sie innerhalb eines Channels rotieren
+METRIC_KINDS = ('numeric', 'enumstring', 'string')
+_TEMPLATE_METRIC_TYPES = {
+    'numeric': 'pm:NumericMetricDescriptor',
+    'enumstring': 'pm:EnumStringMetricDescriptor',
+    'string': 'pm:StringMetricDescriptor',
+}
+_KINDS_BY_TYPE = {xsi_type: kind for kind, xsi_type in _TEMPLATE_METRIC_TYPES.items()}
+_WAVEFORM_TYPE = 'pm:RealTimeSampleArrayMetricDescriptor'
+_SET_OPERATION_TYPES = {
+    'numeric': 'pm:SetValueOperationDescriptor',
+    'enumstring': 'pm:SetStringOperationDescriptor',
+    'string': 'pm:SetStringOperationDescriptor',
+}
+
+
+def _pm(tag: str) -> str:
+    return f'{{{PM}}}{tag}'
+
+
+@dataclasses.dataclass
+class GeneratorStats:
+    """Anzahl der erzeugten Elemente."""
+    vmds: int = 0
+    channels: int = 0
+    metrics: int = 0
+    alert_conditions: int = 0
+    operations: int = 0
+    waveforms: int = 0
+
+
+def _register_namespaces(path: pathlib.Path) -> None:
+    """Übernimmt die Präfixe der Vorlage, damit xsi:type="pm:..." gültig bleibt."""
+    for _, (prefix, uri) in ET.iterparse(str(path), events=('start-ns',)):
+        ET.register_namespace(prefix, uri)
+
+
+def metric_handle(kind: str, index: int, channel: int, vmd: int) -> str:
+    """Handle der index-ten Metrik einer Art, z.B. numeric.ch0.vmd0 oder numeric1.ch0.vmd0."""
+    return f'{kind}{index or ""}.ch{channel}.vmd{vmd}'
+
+
+class _Templates:
+    """Vorlagen-Elemente aus reference_mdib.xml."""
+
+    def __init__(self, mds: ET.Element):
+        vmds = mds.findall(_pm('Vmd'))
+        if not vmds:
+            raise ValueError('Vorlage enthält kein Vmd-Element')
+        self.vmd = vmds[0]
+        self.channel = self.vmd.find(_pm('Channel'))
+        # Channel mit RealTimeSampleArray-Metriken, wird in VMD 0 übernommen
+        self.waveform_channel = next(
+            (ch for ch in self.vmd.findall(_pm('Channel'))
+             if any(m.get(XSI_TYPE) == _WAVEFORM_TYPE for m in ch.findall(_pm('Metric')))), None)
+        # Handles der Metriken von VMD 0 der Vorlage: (Channel, Position) -> (Art, Handle)
+        self.vmd0_handles: dict[tuple[int, int], tuple[str, str]] = {}
+        metric_channels = [ch for ch in self.vmd.findall(_pm('Channel')) if ch is not self.waveform_channel]
+        for ch, channel in enumerate(metric_channels):
+            for k, metric in enumerate(channel.findall(_pm('Metric'))):
+                if (kind := _KINDS_BY_TYPE.get(metric.get(XSI_TYPE))) is not None:
+                    self.vmd0_handles[(ch, k)] = (kind, metric.get('Handle'))
+        self.metrics = {}
+        for kind, xsi_type in _TEMPLATE_METRIC_TYPES.items():
+            self.metrics[kind] = next(m for m in self.vmd.iter(_pm('Metric')) if m.get(XSI_TYPE) == xsi_type)
+        self.alert_condition = self.vmd.find(f'{_pm("AlertSystem")}/{_pm("AlertCondition")}')
+        self.alert_signal = self.vmd.find(f'{_pm("AlertSystem")}/{_pm("AlertSignal")}')
+        self.alert_system = self.vmd.find(_pm('AlertSystem'))
+        operations = [op for vmd in vmds for op in vmd.iter(_pm('Operation'))]
+        self.operations = {}
+        for xsi_type in ('pm:ActivateOperationDescriptor',
+                         'pm:SetValueOperationDescriptor',
+                         'pm:SetStringOperationDescriptor'):
+            self.operations[xsi_type] = next(op for op in operations if op.get(XSI_TYPE) == xsi_type)
+
+
+def _strip_children(element: ET.Element, *tags: str) -> ET.Element:
+    for child in list(element):
+        if child.tag in tags:
+            element.remove(child)
+    return element
+
+
+def _mk_metric_handle(templates: _Templates, kind: str, k: int, channel: int, vmd: int, used: set[str]) -> str:
+    """Handle aus der Vorlage (nur VMD 0) oder nach Schema, ohne Kollision mit vergebenen Handles."""
+    if vmd == 0:
+        template_kind, handle = templates.vmd0_handles.get((channel, k), (None, None))
+        if template_kind == kind:
+            return handle
+    index = k // len(METRIC_KINDS)
+    while (handle := metric_handle(kind, index, channel, vmd)) in used:
+        index += 1
+    return handle
+
+
+def _mk_waveform_channel(templates: _Templates, n_channels: int, stats: GeneratorStats) -> ET.Element:
+    """Waveform-Channel der Vorlage als letzter Channel von VMD 0 (ch2.vmd0 bei zwei Channels)."""
+    channel = copy.deepcopy(templates.waveform_channel)
+    channel.set('Handle', f'ch{n_channels}.vmd0')
+    for metric in channel.findall(_pm('Metric')):
+        # ecg.ch2.vmd0 -> ecg.ch<n_channels>.vmd0; der Präfix wählt den Generator (reference_provider)
+        metric.set('Handle', f'{metric.get("Handle").split(".")[0]}.ch{n_channels}.vmd0')
+        stats.metrics += 1
+        stats.waveforms += 1
+    stats.channels += 1
+    return channel
+
+
+def _mk_vmd(templates: _Templates, vmd_index: int, n_channels: int, n_metrics: int,
+            stats: GeneratorStats, used: set[str]) -> ET.Element:
+    vmd = _strip_children(copy.deepcopy(templates.vmd), _pm('AlertSystem'), _pm('Sco'), _pm('Channel'))
+    vmd.set('Handle', f'vmd{vmd_index}')
+
+    alert_system = _strip_children(copy.deepcopy(templates.alert_system),
+                                   _pm('AlertCondition'), _pm('AlertSignal'))
+    alert_system.set('Handle', f'asy.vmd{vmd_index}')
+    sco = ET.Element(_pm('Sco'), Handle=f'sco.vmd{vmd_index}')
+    activate = copy.deepcopy(templates.operations['pm:ActivateOperationDescriptor'])
+    activate.set('Handle', f'actop.vmd{vmd_index}_sco_0')
+    activate.set('OperationTarget', f'vmd{vmd_index}')
+    sco.append(activate)
+    stats.operations += 1
+
+    channels = []
+    signals = []
+    conditions = 0
+    for ch in range(n_channels):
+        channel = _strip_children(copy.deepcopy(templates.channel), _pm('Metric'))
+        channel.set('Handle', f'ch{ch}.vmd{vmd_index}')
+        for k in range(n_metrics):
+            kind = METRIC_KINDS[k % len(METRIC_KINDS)]
+            handle = _mk_metric_handle(templates, kind, k, ch, vmd_index, used)
+            used.add(handle)
+            metric = copy.deepcopy(templates.metrics[kind])
+            metric.set('Handle', handle)
+            channel.append(metric)
+            stats.metrics += 1
+
+            # VMD 0 ist wie in der Vorlage nicht einstellbar, die Metriken werden vom Provider geschrieben
+            if vmd_index > 0:
+                operation = copy.deepcopy(templates.operations[_SET_OPERATION_TYPES[kind]])
+                operation.set('Handle', f'{handle}_sco_0')
+                operation.set('OperationTarget', handle)
+                sco.append(operation)
+                stats.operations += 1
+
+            if kind == 'numeric':
+                ac_handle = f'ac{conditions}.vmd{vmd_index}.mds0'
+                condition = copy.deepcopy(templates.alert_condition)
+                condition.set('Handle', ac_handle)
+                condition.find(_pm('Source')).text = handle
+                alert_system.append(condition)
+                signal = copy.deepcopy(templates.alert_signal)
+                signal.set('Handle', ac_handle.replace('ac', 'as', 1))
+                signal.set('ConditionSignaled', ac_handle)
+                signals.append(signal)
+                conditions += 1
+                stats.alert_conditions += 1
+        channels.append(channel)
+        stats.channels += 1
+    if vmd_index == 0 and templates.waveform_channel is not None:
+        channels.append(_mk_waveform_channel(templates, n_channels, stats))
+
+    # Schema-Reihenfolge: erst alle AlertConditions, dann alle AlertSignals
+    alert_system.extend(signals)
+    vmd.extend([alert_system, sco, *channels])
+    stats.vmds += 1
+    return vmd
+
+
+def generate_mdib(n_vmds: int, n_channels: int, n_metrics: int,
+                  template: pathlib.Path = TEMPLATE_PATH) -> tuple[ET.ElementTree, GeneratorStats]:
+    """Erzeugt ein MDIB mit n_vmds x n_channels x n_metrics Metriken aus der Vorlage."""
+    if min(n_vmds, n_channels, n_metrics) < 1:
+        raise ValueError('vmds, channels und metrics müssen >= 1 sein')
+    _register_namespaces(template)
+    tree = ET.parse(str(template))
+    mds = tree.getroot().find(f'{{{MSG}}}Mdib/{_pm("MdDescription")}/{_pm("Mds")}')
+    templates = _Templates(mds)
+    for vmd in mds.findall(_pm('Vmd')):
+        mds.remove(vmd)
+
+    stats = GeneratorStats()
+    # Vorlagen-Handles von VMD 0 sind reserviert, damit das Schema sie nicht doppelt vergibt
+    used = {handle for _, handle in templates.vmd0_handles.values()}
+    for n in range(n_vmds):
+        mds.append(_mk_vmd(templates, n, n_channels, n_metrics, stats, used))
+    return tree, stats
+
+
+def write_mdib(path: pathlib.Path, n_vmds: int, n_channels: int, n_metrics: int,
+               template: pathlib.Path = TEMPLATE_PATH) -> GeneratorStats:
+    """Erzeugt ein MDIB und schreibt es nach path."""
+    tree, stats = generate_mdib(n_vmds, n_channels, n_metrics, template)
+    ET.indent(tree, space='\t')
+    tree.write(str(path), encoding='UTF-8', xml_declaration=True)
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Synthetischer MDIB-Generator auf Basis von reference_mdib.xml')
+    parser.add_argument('--vmds', type=int, default=2, help='Anzahl VMDs (Default: 2)')
+    parser.add_argument('--channels', type=int, default=2, help='Channels pro VMD (Default: 2)')
+    parser.add_argument('--metrics', type=int, default=3, help='Metriken pro Channel (Default: 3)')
+    parser.add_argument('--template', type=pathlib.Path, default=TEMPLATE_PATH, help='Vorlage (Default: reference_mdib.xml)')
+    parser.add_argument('-o', '--output', type=pathlib.Path, required=True, help='Ausgabedatei')
+    args = parser.parse_args()
+
+    stats = write_mdib(args.output, args.vmds, args.channels, args.metrics, args.template)
+    size_kb = args.output.stat().st_size / 1024
+    print(f"MDIB geschrieben: {args.output} ({size_kb:.1f} kB)")
+    print(f"  VMDs: {stats.vmds}, Channels: {stats.channels}, Metriken: {stats.metrics}, "
+          f"AlertConditions: {stats.alert_conditions}, Operationen: {stats.operations}, "
+          f"Waveforms: {stats.waveforms}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Operations-Benchmark: Latenzverteilung von SetString, SetValue und Activate unter Last.
+
+Ein Referenz-Provider läuft in eigenem Prozess (ProviderFarm) mit Metrik-Endpunkt,
+ein Consumer ruft die Operationen aus Test 9 (reference_consumer) mit
+--concurrency parallelen Aufrufern insgesamt --invocations Mal je Operation auf.
+Gemessen werden auf Consumer-Seite je Aufruf:
+  - Antwort: Aufruf bis zur Rückkehr von set_service_client (SetResponse)
+  - Abschluss: Aufruf bis zum finalen OperationInvokedReport (Future erfüllt)
+und auf Provider-Seite (operation_timing, sdc_operation_phase_seconds) die
+mittlere Dauer je Phase: Warteschlange, Handler, Commit, Report.
+
+Beispiel:
+    python operation_benchmark.py --invocations 200 --concurrency 8
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import csv
+import dataclasses
+import re
+import sys
+import time
+import urllib.request
+from concurrent import futures
+from decimal import Decimal
+
+import numpy as np
+
+import reference_provider
+from context_benchmark import free_port
+from fanout_benchmark import find_service
+from operation_timing import PHASES
+from provider_farm import ProviderFarm
+from sdc11073.consumer import SdcConsumer
+from sdc11073.mdib.consumermdib import ConsumerMdib
+from sdc11073.wsdiscovery import WSDiscovery
+from sdc11073.xml_types.msg_types import InvocationState
+
+# (Operation, Handle, Aufruf) wie in Test 9 von reference_consumer
+OPERATIONS = {
+    'SetString': ('string.ch0.vmd1_sco_0', lambda client, h: client.set_service_client.set_string(h, 'hoppeldipop')),
+    'SetValue': ('numeric.ch0.vmd1_sco_0',
+                 lambda client, h: client.set_service_client.set_numeric_value(h, Decimal('42'))),
+    'Activate': ('actop.vmd1_sco_0', lambda client, h: client.set_service_client.activate(h, 'hoppeldipop')),
+}
+
+
+@dataclasses.dataclass
+class Invocation:
+    """Zeiten eines Aufrufs in Sekunden, relativ zum Aufruf."""
+    operation: str
+    response: float
+    finished: float | None
+    state: str
+
+
+@dataclasses.dataclass
+class OperationResult:
+    """Verteilung einer Operation (Millisekunden)."""
+    operation: str
+    invocations: int
+    failed: int
+    response_p50: float
+    response_p99: float
+    finished_p50: float
+    finished_p90: float
+    finished_p99: float
+    finished_max: float
+    provider_phases: dict[str, float]
+
+
+def invoke(client: SdcConsumer, operation: str, timeout: float) -> Invocation:
+    handle, call = OPERATIONS[operation]
+    start = time.perf_counter()
+    future = call(client, handle)
+    response = time.perf_counter() - start
+    try:
+        result = future.result(timeout=timeout)
+    except futures.TimeoutError:
+        return Invocation(operation, response, None, 'Timeout')
+    finished = time.perf_counter() - start
+    state = result.InvocationInfo.InvocationState
+    return Invocation(operation, response, finished if state == InvocationState.FINISHED else None, str(state))
+
+
+def scrape_phases(url: str) -> dict[str, dict[str, float]]:
+    """Mittlere Dauer in ms je Operations-Handle und Phase laut Metrik-Endpunkt."""
+    try:
+        text = urllib.request.urlopen(url, timeout=5).read().decode()
+    except OSError:
+        return {}
+    totals: dict[tuple[str, str], dict[str, float]] = {}
+    pattern = re.compile(r'^sdc_operation_phase_seconds_(sum|count)\{operation="([^"]*)",phase="([^"]*)"\} (\S+)$',
+                         re.MULTILINE)
+    for kind, operation, phase, value in pattern.findall(text):
+        totals.setdefault((operation, phase), {})[kind] = float(value)
+    phases: dict[str, dict[str, float]] = {}
+    for (operation, phase), values in totals.items():
+        if values.get('count'):
+            phases.setdefault(operation, {})[phase] = values['sum'] * 1000 / values['count']
+    return phases
+
+
+def evaluate(operation: str, invocations: list[Invocation], phases: dict[str, float]) -> OperationResult:
+    response = np.asarray([i.response for i in invocations]) * 1000
+    finished = np.asarray([i.finished for i in invocations if i.finished is not None]) * 1000
+    pct = (lambda values, q: float(np.percentile(values, q)) if values.size else float('nan'))
+    return OperationResult(
+        operation=operation,
+        invocations=len(invocations),
+        failed=len(invocations) - finished.size,
+        response_p50=pct(response, 50),
+        response_p99=pct(response, 99),
+        finished_p50=pct(finished, 50),
+        finished_p90=pct(finished, 90),
+        finished_p99=pct(finished, 99),
+        finished_max=float(finished.max()) if finished.size else float('nan'),
+        provider_phases=phases,
+    )
+
+
+def print_result(r: OperationResult) -> None:
+    phases = ', '.join(f'{phase}={r.provider_phases[phase]:.2f}' for phase in PHASES if phase in r.provider_phases)
+    print(f"{r.operation:>9}: {r.invocations} Aufrufe ({r.failed} fehlgeschlagen), "
+          f"Antwort p50={r.response_p50:.1f}ms p99={r.response_p99:.1f}ms, "
+          f"Abschluss p50={r.finished_p50:.1f}ms p90={r.finished_p90:.1f}ms p99={r.finished_p99:.1f}ms "
+          f"max={r.finished_max:.1f}ms; Provider [ms]: {phases or 'n/a'}")
+
+
+def run_benchmark(operations: list[str], invocations: int, concurrency: int, timeout: float) -> list[OperationResult]:
+    metrics_port = free_port()
+    farm = ProviderFarm(1, extra_env={'ref_metrics_port': str(metrics_port), 'ref_log_tick_every': '1000'})
+    wsd = WSDiscovery(str(reference_provider.get_network_adapter().ip))
+    client = None
+    recorded: dict[str, list[Invocation]] = {}
+    try:
+        farm.start()
+        if not farm.wait_ready(timeout):
+            raise RuntimeError("Provider nicht bereit")
+        wsd.start()
+        service = find_service(wsd, str(farm.members[0].epr), timeout)
+        client = SdcConsumer.from_wsd_service(
+            service, ssl_context_container=reference_provider.get_ssl_context(), validate=False
+        )
+        client.start_all()
+        ConsumerMdib(client).init_mdib()
+        with futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='invoke') as pool:
+            for operation in operations:
+                print(f"{operation}: {invocations} Aufrufe mit {concurrency} parallelen Aufrufern...")
+                start = time.perf_counter()
+                pending = [pool.submit(invoke, client, operation, timeout) for _ in range(invocations)]
+                recorded[operation] = [f.result() for f in pending]
+                elapsed = time.perf_counter() - start
+                print(f"  {invocations / elapsed:.1f} Aufrufe/s")
+        phases = scrape_phases(f'http://127.0.0.1:{metrics_port}/metrics')
+    finally:
+        if client is not None:
+            client.stop_all()
+        wsd.stop()
+        farm.stop()
+    return [evaluate(operation, recorded[operation], phases.get(OPERATIONS[operation][0], {}))
+            for operation in operations]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Misst die Latenz der Provider-Operationen unter paralleler Last')
+    parser.add_argument('--operations', default=','.join(OPERATIONS),
+                        help=f"Operationen, kommagetrennt (Default: {','.join(OPERATIONS)})")
+    parser.add_argument('--invocations', type=int, default=100, help='Aufrufe je Operation')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallele Aufrufer')
+    parser.add_argument('--timeout', type=float, default=30, help='Timeout für Start, Verbinden und Aufrufe in Sekunden')
+    parser.add_argument('--csv', help='Ergebnisse zusätzlich als CSV schreiben')
+    args = parser.parse_args()
+
+    operations = args.operations.split(',')
+    unknown = [op for op in operations if op not in OPERATIONS]
+    if unknown:
+        parser.error(f"Unbekannte Operationen: {unknown}")
+    results = run_benchmark(operations, args.invocations, args.concurrency, args.timeout)
+
+    print("\n--- ERGEBNISSE ---")
+    for result in results:
+        print_result(result)
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            fields = [field.name for field in dataclasses.fields(OperationResult) if field.name != 'provider_phases']
+            writer = csv.DictWriter(f, fieldnames=fields + [f'provider_{phase}_ms' for phase in PHASES])
+            writer.writeheader()
+            for result in results:
+                row = dataclasses.asdict(result)
+                phases = row.pop('provider_phases')
+                row.update({f'provider_{phase}_ms': phases.get(phase) for phase in PHASES})
+                writer.writerow(row)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Per-phase timing of SCO operation invocations on the reference provider.
+
+Every invocation is followed through four points in time:
+  - received: the request was handed to the SCO operations registry
+  - started / finished: the operation handler (execute_operation) ran
+  - reported: the OperationInvokedReport sent by the handler thread after the
+    handler finished (the final invocation state) left send_to_subscribers
+and the time the handler spent committing MDIB transactions. Phases:
+queue (received -> started), handler (started -> finished, without commit),
+commit, report (finished -> reported), total (received -> reported).
+
+Invocations are matched per operation handle in FIFO order and through the
+handler thread, so only sdc11073 internals that exist are hooked; missing
+hooks leave the affected phases empty. Requests that are not queued for the
+handler (rejected, failed) are dropped again, so they do not shift the match.
+
+The hooks cost time in every transaction and notification, so the provider
+runner only installs the timer with metrics or ref_operation_timing=true.
+"""
+from __future__ import annotations
+
+import collections
+import contextlib
+import dataclasses
+import functools
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+from subscription_stats import subscription_managers
+
+if TYPE_CHECKING:
+    from sdc11073.provider import SdcProvider
+
+    from provider_metrics import ProviderMetrics
+
+PHASES = ('queue', 'handler', 'commit', 'report', 'total')
+# invocation states of a request the registry queued for the handler
+_QUEUED_STATES = {'Wait', 'Start'}
+_TRANSACTIONS = ('metric_state_transaction', 'alert_state_transaction', 'context_state_transaction',
+                 'component_state_transaction', 'operational_state_transaction')
+
+
+@dataclasses.dataclass
+class InvocationTiming:
+    """perf_counter timestamps of one invocation; commit in seconds."""
+    operation: str
+    received: float | None = None
+    started: float | None = None
+    finished: float | None = None
+    reported: float | None = None
+    commit: float = 0.0
+
+    def phases(self) -> dict[str, float]:
+        out = {}
+        if self.received is not None and self.started is not None:
+            out['queue'] = self.started - self.received
+        if self.started is not None and self.finished is not None:
+            out['handler'] = self.finished - self.started - self.commit
+            out['commit'] = self.commit
+        if self.finished is not None and self.reported is not None:
+            out['report'] = self.reported - self.finished
+        if self.received is not None and self.reported is not None:
+            out['total'] = self.reported - self.received
+        return out
+
+
+def timing_enabled() -> bool:
+    """True if ref_operation_timing asks for operation timing without metrics."""
+    return os.getenv('ref_operation_timing', 'false').lower() in ('true', '1', 'yes')
+
+
+def _operation_handle(operation: Any) -> str:
+    return getattr(operation, 'handle', None) or getattr(getattr(operation, 'descriptor_container', None),
+                                                        'Handle', '?')
+
+
+def sco_operations(prov: SdcProvider) -> list[Any]:
+    """All registered operation instances of the provider."""
+    operations = []
+    for registry in getattr(prov, '_sco_operations_registries', {}).values():
+        operations.extend(getattr(registry, '_registered_operations', {}).values())
+    return operations
+
+
+class OperationTimer:
+    """Records InvocationTimings of one provider, optionally into ProviderMetrics."""
+
+    def __init__(self, prov: SdcProvider, metrics: ProviderMetrics | None = None, keep: int = 10000):
+        self.metrics = metrics
+        self.records: collections.deque[InvocationTiming] = collections.deque(maxlen=keep)
+        self._waiting: dict[str, collections.deque[InvocationTiming]] = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hooks: list[str] = []
+        self._instrument(prov)
+
+    def _instrument(self, prov: SdcProvider) -> None:
+        for registry in getattr(prov, '_sco_operations_registries', {}).values():
+            if hasattr(registry, 'handle_operation_request'):
+                registry.handle_operation_request = self._receiving(registry.handle_operation_request)
+                self.hooks.append('received')
+        for operation in sco_operations(prov):
+            if hasattr(operation, 'execute_operation'):
+                operation.execute_operation = self._executing(operation.execute_operation,
+                                                              _operation_handle(operation))
+                self.hooks.append('handler')
+        for attribute in _TRANSACTIONS:
+            original = getattr(prov.mdib, attribute, None)
+            if original is not None:
+                setattr(prov.mdib, attribute, self._committing(original))
+        for manager in subscription_managers(prov):
+            if hasattr(manager, 'send_to_subscribers'):
+                manager.send_to_subscribers = self._reporting(manager.send_to_subscribers)
+                self.hooks.append('report')
+        self.hooks = sorted(set(self.hooks))
+
+    def _receiving(self, original):
+        @functools.wraps(original)
+        def handle_operation_request(operation, *args, **kwargs):
+            timing = InvocationTiming(_operation_handle(operation), received=time.perf_counter())
+            with self._lock:
+                self._waiting[timing.operation].append(timing)
+            queued = False
+            try:
+                state = original(operation, *args, **kwargs)
+                queued = state is None or str(getattr(state, 'value', state)) in _QUEUED_STATES
+                return state
+            finally:
+                if not queued:
+                    self._discard(timing)
+        return handle_operation_request
+
+    def _discard(self, timing: InvocationTiming) -> None:
+        with self._lock:
+            waiting = self._waiting.get(timing.operation)
+            if waiting is not None:
+                for i, candidate in enumerate(waiting):
+                    if candidate is timing:
+                        del waiting[i]
+                        break
+
+    def _executing(self, original, handle: str):
+        @functools.wraps(original)
+        def execute_operation(*args, **kwargs):
+            with self._lock:
+                waiting = self._waiting.get(handle)
+                timing = waiting.popleft() if waiting else InvocationTiming(handle)
+            timing.started = time.perf_counter()
+            self._local.current = timing
+            try:
+                return original(*args, **kwargs)
+            finally:
+                timing.finished = time.perf_counter()
+                self._local.current = None
+                if 'report' in self.hooks:
+                    self._local.awaiting_report = timing
+                else:
+                    self._record(timing)
+        return execute_operation
+
+    def _committing(self, original):
+        @contextlib.contextmanager
+        @functools.wraps(original)
+        def transaction(*args, **kwargs):
+            timing = getattr(self._local, 'current', None)
+            if timing is None:
+                with original(*args, **kwargs) as mgr:
+                    yield mgr
+                return
+            context = original(*args, **kwargs)
+            mgr = context.__enter__()
+            try:
+                yield mgr
+            except BaseException as ex:
+                if not context.__exit__(type(ex), ex, ex.__traceback__):
+                    raise
+            else:
+                start = time.perf_counter()
+                context.__exit__(None, None, None)
+                timing.commit += time.perf_counter() - start
+        return transaction
+
+    def _reporting(self, original):
+        @functools.wraps(original)
+        def send_to_subscribers(*args, **kwargs):
+            result = original(*args, **kwargs)
+            timing = getattr(self._local, 'awaiting_report', None)
+            action = kwargs.get('action', args[1] if len(args) > 1 else '')
+            if timing is not None and 'OperationInvokedReport' in str(action):
+                timing.reported = time.perf_counter()
+                self._local.awaiting_report = None
+                self._record(timing)
+            return result
+        return send_to_subscribers
+
+    def _record(self, timing: InvocationTiming) -> None:
+        self.records.append(timing)
+        if self.metrics is not None:
+            for phase, seconds in timing.phases().items():
+                self.metrics.observe('sdc_operation_phase_seconds', seconds, phase=phase, operation=timing.operation)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Mean duration in seconds per operation handle and phase."""
+        sums: dict[str, dict[str, list[float]]] = collections.defaultdict(lambda: collections.defaultdict(list))
+        for timing in list(self.records):
+            for phase, seconds in timing.phases().items():
+                sums[timing.operation][phase].append(seconds)
+        return {operation: {phase: sum(values) / len(values) for phase, values in phases.items()}
+                for operation, phases in sums.items()}
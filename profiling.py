@@ -0,0 +1,251 @@
+"""Profiling mode for run_provider and run_ref_test.
+
+ref_profile selects the mode, files go to ref_profile_dir (default: profiles):
+  - cprofile: deterministic cProfile of every thread started while profiling
+    (plus the calling thread), one <prefix>-<thread>.prof per thread (pstats /
+    snakeviz). cProfile records no call stacks, so the sampler below runs
+    alongside to produce the flamegraph file.
+  - sample: low-overhead sampling of all threads via sys._current_frames()
+    every ref_profile_interval seconds (default 0.005).
+Both modes write <prefix>.folded, collapsed stacks with the thread name as root
+frame (input for flamegraph.pl / speedscope), and <prefix>-<thread>.folded per
+thread.
+
+On Python 3.12+ cProfile can only be active in one thread at a time; further
+threads are then only covered by the sampler. A cProfile can only be stopped
+safely by its own thread, so .prof files are written for the calling thread
+and for threads that have exited; threads still running when profiling stops
+are skipped and only covered by the sampler.
+"""
+from __future__ import annotations
+
+import collections
+import cProfile
+import functools
+import os
+import pathlib
+import re
+import sys
+import threading
+import time
+from typing import Callable
+
+MODES = ('cprofile', 'sample')
+
+_active: Profiler | None = None
+_active_users = 0
+_active_lock = threading.Lock()
+
+
+def get_profile_mode() -> str | None:
+    """Get the profiling mode from ref_profile or None if profiling is off."""
+    mode = os.getenv('ref_profile', '').strip().lower()
+    if mode in ('', 'false', '0', 'off', 'none'):
+        return None
+    if mode not in MODES:
+        raise ValueError(f"ref_profile must be one of {MODES}, got {mode!r}")
+    return mode
+
+
+def _file_part(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+
+
+class StackSampler:
+    """Samples the stacks of all threads periodically into collapsed-stack counts."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: collections.Counter[tuple[str, tuple[str, ...]]] = collections.Counter()
+        self.rounds = 0
+        self._labels: dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            label = self._labels[code] = label.replace(';', ',')
+        return label
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            # idents are reused by new threads, so the names are looked up every round
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[(names.get(ident, str(ident)), tuple(stack))] += 1
+            self.rounds += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, directory: pathlib.Path, prefix: str) -> list[pathlib.Path]:
+        per_thread: dict[str, list[str]] = collections.defaultdict(list)
+        combined = []
+        for (thread_name, stack), count in sorted(self.samples.items()):
+            frames = ';'.join(stack)
+            per_thread[thread_name].append(f'{frames} {count}')
+            combined.append(f'{thread_name.replace(";", ",")};{frames} {count}')
+        paths = [directory / f'{prefix}.folded']
+        paths[0].write_text('\n'.join(combined) + '\n', encoding='utf-8')
+        for thread_name, lines in per_thread.items():
+            path = directory / f'{prefix}-{_file_part(thread_name)}.folded'
+            path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+            paths.append(path)
+        return paths
+
+
+class ThreadProfiles:
+    """One cProfile.Profile per thread, attached to new threads via threading.setprofile."""
+
+    def __init__(self):
+        # keyed by thread, not ident: idents of exited threads are reused
+        self.profiles: dict[threading.Thread, cProfile.Profile] = {}
+        self.unsupported = 0
+        self.skipped: list[str] = []
+        self._disabled: set[threading.Thread] = set()
+        self._lock = threading.Lock()
+
+    def enable_current(self) -> None:
+        thread = threading.current_thread()
+        if thread in self.profiles:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: only one cProfile can be active at a time
+            self.unsupported += 1
+            return
+        with self._lock:
+            self.profiles[thread] = profile
+
+    def disable_current(self) -> None:
+        """Stop the profile of the calling thread; it can then be written from any thread."""
+        thread = threading.current_thread()
+        if thread in self.profiles:
+            self.profiles[thread].disable()
+            with self._lock:
+                self._disabled.add(thread)
+
+    def _bootstrap(self, frame, event, arg):
+        sys.setprofile(None)
+        self.enable_current()
+
+    def start(self):
+        self.enable_current()
+        threading.setprofile(self._bootstrap)
+
+    def stop(self):
+        threading.setprofile(None)
+
+    def write(self, directory: pathlib.Path, prefix: str) -> list[pathlib.Path]:
+        paths = []
+        with self._lock:
+            profiles = list(self.profiles.items())
+        self.disable_current()
+        for thread, profile in profiles:
+            if thread not in self._disabled and thread.is_alive():
+                # dump_stats() disables the profile, which must not happen while its thread still calls into it
+                self.skipped.append(thread.name)
+                continue
+            path = directory / f'{prefix}-{_file_part(thread.name)}-{thread.ident}.prof'
+            profile.dump_stats(str(path))
+            paths.append(path)
+        return paths
+
+
+class Profiler:
+    """Sampler and (mode cprofile) per-thread cProfile of the whole process."""
+
+    def __init__(self, mode: str, directory: pathlib.Path, prefix: str, interval: float = 0.005):
+        self.mode = mode
+        self.directory = directory
+        self.prefix = f'{prefix}-{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}'
+        self.sampler = StackSampler(interval)
+        self.thread_profiles = ThreadProfiles() if mode == 'cprofile' else None
+
+    def start(self):
+        self.sampler.start()  # before threading.setprofile, the sampler itself is not profiled
+        if self.thread_profiles is not None:
+            self.thread_profiles.start()
+
+    def stop(self) -> list[pathlib.Path]:
+        """Stop profiling and write all files; returns the written paths."""
+        self.sampler.stop()
+        if self.thread_profiles is not None:
+            self.thread_profiles.stop()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        paths = self.sampler.write(self.directory, self.prefix)
+        if self.thread_profiles is not None:
+            paths += self.thread_profiles.write(self.directory, self.prefix)
+        return paths
+
+
+def _start(prefix: str) -> None:
+    global _active, _active_users
+    with _active_lock:
+        if _active is None:
+            _active = Profiler(
+                get_profile_mode(),
+                pathlib.Path(os.getenv('ref_profile_dir', 'profiles')),
+                prefix,
+                float(os.getenv('ref_profile_interval', '0.005')),
+            )
+            _active.start()
+        elif _active.thread_profiles is not None:
+            # a second profiled entry point in another thread, e.g. provider and consumer in one process
+            _active.thread_profiles.enable_current()
+        _active_users += 1
+
+
+def _stop() -> None:
+    global _active, _active_users
+    with _active_lock:
+        _active_users -= 1
+        if _active is None:
+            return
+        if _active_users:
+            # the profile of this entry point's thread can only be stopped here, by the thread itself
+            if _active.thread_profiles is not None:
+                _active.thread_profiles.disable_current()
+            return
+        profiler, _active = _active, None
+    paths = profiler.stop()
+    print(f"Profil ({profiler.mode}, {profiler.sampler.rounds} Samples) geschrieben nach {profiler.directory}: "
+          f"{len(paths)} Dateien, Flamegraph {paths[0].name}")
+    if profiler.thread_profiles is not None and profiler.thread_profiles.skipped:
+        print(f"cProfile laufender Threads nicht geschrieben (nur im Sampler): "
+              f"{', '.join(profiler.thread_profiles.skipped)}")
+
+
+def profile_entry(prefix: str) -> Callable:
+    """Decorator: run the function under the profiler selected by ref_profile (if any)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if get_profile_mode() is None:
+                return func(*args, **kwargs)
+            _start(prefix)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _stop()
+        return wrapper
+    return decorator
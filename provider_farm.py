@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Provider-Farm: startet N Referenz-Provider, jeden in einem eigenen OS-Prozess.
+
+Jeder Provider bekommt eine eigene EPR, eine eigene Location (ref_fac/ref_poc/ref_bed)
+und optional eine CPU-Affinität. Die Bereitschaft wird per WS-Discovery geprüft,
+beendet werden die Provider über SIGINT, so dass run_provider sauber aufräumt.
+
+Beispiel (eine Station mit 12 Monitoren auf 4 Kernen):
+    python provider_farm.py --count 12 --cpus 0-3 --duration 60
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import dataclasses
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import uuid
+
+import reference_provider
+from sdc11073.definitions_sdc import SdcV1Definitions
+from sdc11073.wsdiscovery import WSDiscovery
+
+
+@dataclasses.dataclass
+class FarmMember:
+    """Ein Provider-Prozess der Farm."""
+    index: int
+    epr: uuid.UUID
+    fac: str
+    poc: str
+    bed: str
+    cpus: list[int] | None = None
+    process: multiprocessing.Process | None = None
+    ready: bool = False
+
+    @property
+    def env(self) -> dict[str, str]:
+        return {
+            'ref_search_epr': str(self.epr),
+            'ref_fac': self.fac,
+            'ref_poc': self.poc,
+            'ref_bed': self.bed,
+            'ref_log_file': f'sdc_ref_dev_{self.index:03d}.log',
+        }
+
+
+def parse_cpu_list(text: str) -> list[int]:
+    """Parst eine CPU-Liste wie '0-3,6,8'."""
+    cpus = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def _provider_process(env: dict[str, str], cpus: list[int] | None) -> None:
+    """Einstiegspunkt des Kindprozesses."""
+    os.environ.update(env)
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    reference_provider.run_provider()
+
+
+class ProviderFarm:
+    """Startet, überwacht und beendet N Referenz-Provider-Prozesse."""
+
+    def __init__(self, count: int, fac: str = 'r_fac', poc: str = 'r_poc',
+                 cpus: list[int] | None = None, pin: bool = False, extra_env: dict[str, str] | None = None):
+        """
+        Args:
+            count: Anzahl der Provider
+            fac, poc: Location aller Provider, das Bett wird durchnummeriert
+            cpus: erlaubte CPUs (Linux); ohne pin teilen sich alle Provider diese CPUs
+            pin: jeden Provider reihum auf genau eine CPU aus cpus festlegen
+            extra_env: zusätzliche ref_*-Variablen für alle Provider
+        """
+        self.extra_env = extra_env or {}
+        self.members = []
+        for i in range(count):
+            member_cpus = cpus
+            if cpus and pin:
+                member_cpus = [cpus[i % len(cpus)]]
+            self.members.append(FarmMember(i, uuid.uuid4(), fac, poc, f'bed{i:03d}', member_cpus))
+
+    def start(self) -> None:
+        for member in self.members:
+            env = {**self.extra_env, **member.env}
+            member.process = multiprocessing.Process(
+                target=_provider_process, args=(env, member.cpus),
+                name=f'provider-{member.index:03d}', daemon=True
+            )
+            member.process.start()
+
+    def wait_ready(self, timeout: float, adapter_ip: str | None = None) -> bool:
+        """Wartet, bis alle Provider per WS-Discovery auffindbar sind."""
+        adapter_ip = adapter_ip or str(reference_provider.get_network_adapter().ip)
+        pending = {str(m.epr): m for m in self.members if not m.ready}
+        wsd = WSDiscovery(adapter_ip)
+        wsd.start()
+        try:
+            start = time.monotonic()
+            while pending and time.monotonic() - start < timeout:
+                for member in list(pending.values()):
+                    if not member.process.is_alive():
+                        print(f"FEHLER: Provider {member.index} beendet (Exit-Code {member.process.exitcode})")
+                        pending.pop(str(member.epr))
+                for service in wsd.search_services(types=SdcV1Definitions.MedicalDeviceTypesFilter, timeout=1):
+                    for epr, member in list(pending.items()):
+                        if service.epr and service.epr.endswith(epr):
+                            member.ready = True
+                            pending.pop(epr)
+                            print(f"Provider {member.index} bereit nach {time.monotonic() - start:.1f}s")
+        finally:
+            wsd.stop()
+        return all(m.ready for m in self.members)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Beendet alle Provider per SIGINT, nach Timeout hart per terminate()."""
+        alive = [m.process for m in self.members if m.process is not None and m.process.is_alive()]
+        for process in alive:
+            if sys.platform != 'win32':
+                os.kill(process.pid, signal.SIGINT)
+            else:
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"WARNUNG: {process.name} reagiert nicht, wird terminiert")
+                process.terminate()
+                process.join()
+
+    def __enter__(self) -> ProviderFarm:
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Startet N Referenz-Provider in eigenen Prozessen')
+    parser.add_argument('--count', type=int, default=4, help='Anzahl Provider (Default: 4)')
+    parser.add_argument('--fac', default=os.getenv('ref_fac', 'r_fac'), help='Facility aller Provider')
+    parser.add_argument('--poc', default=os.getenv('ref_poc', 'r_poc'), help='Point of Care aller Provider')
+    parser.add_argument('--cpus', help="CPU-Affinität, z.B. '0-3,6' (nur Linux)")
+    parser.add_argument('--pin', action='store_true', help='Jeden Provider auf genau eine CPU festlegen')
+    parser.add_argument('--timeout', type=float, default=30, help='Timeout für Bereitschaft in Sekunden')
+    parser.add_argument('--duration', type=float, default=0, help='Laufzeit in Sekunden (0 = bis CTRL-C)')
+    args = parser.parse_args()
+
+    cpus = parse_cpu_list(args.cpus) if args.cpus else None
+    farm = ProviderFarm(args.count, fac=args.fac, poc=args.poc, cpus=cpus, pin=args.pin)
+    print(f"Starte {args.count} Provider...")
+    farm.start()
+    ready = False
+    try:
+        ready = farm.wait_ready(args.timeout)
+        for m in farm.members:
+            print(f"  {m.index:3d}: EPR={m.epr} Location={m.fac}/{m.poc}/{m.bed} "
+                  f"CPUs={m.cpus or 'alle'} {'bereit' if m.ready else 'NICHT bereit'}")
+        if not ready:
+            print(f"WARNUNG: Nicht alle Provider innerhalb von {args.timeout}s bereit")
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while any(m.process.is_alive() for m in farm.members):
+                time.sleep(1)
+    except KeyboardInterrupt:
+        print("Farm wird beendet (KeyboardInterrupt)")
+    finally:
+        farm.stop()
+    return 0 if ready else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Local HTTP metrics endpoint of the reference provider (Prometheus text format).
+
+ProviderMetrics.instrument() wraps the hot paths of a started provider:
+  - sdc_commit_seconds{kind}: exit of the MDIB state transactions, i.e. applying
+    the states and handing the reports to the subscriptions managers
+  - sdc_serialization_seconds: MessageFactory.serialize_message of the provider
+  - sdc_dispatch_seconds: send_to_subscribers of the subscriptions managers
+  - sdc_delivery_seconds{subscriber}, sdc_delivery_failures_total{subscriber}:
+    sending one notification to one subscriber
+  - sdc_notifications_in_flight: deliveries started but not finished (queue depth)
+  - sdc_loop_latency_seconds, sdc_loop_jitter_seconds: tick loop, fed by the runner
+  - sdc_operation_phase_seconds{operation,phase}: SCO invocations, fed by operation_timing
+  - sdc_context_churn_seconds{operation}: admissions/re-associations and transfers
+    of the context churn, fed by context_churn
+Hooks for sdc11073 internals that do not exist are skipped, so the endpoint
+degrades to fewer series instead of failing.
+
+Enabled with ref_metrics_port (0 = any free port), bound to ref_metrics_host
+(default 127.0.0.1); scrape http://127.0.0.1:<port>/metrics.
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import functools
+import http.server
+import inspect
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+import log_pipeline
+from subscription_stats import subscription_key, subscription_managers
+
+if TYPE_CHECKING:
+    from sdc11073.provider import SdcProvider
+
+# 50us .. ~6.5s, doubling
+DEFAULT_BUCKETS = tuple(0.00005 * 2 ** i for i in range(18))
+
+_TRANSACTIONS = {
+    'metric': 'metric_state_transaction',
+    'alert': 'alert_state_transaction',
+    'context': 'context_state_transaction',
+    'rt_sample': 'rt_sample_state_transaction',
+    'component': 'component_state_transaction',
+    'operational': 'operational_state_transaction',
+    'descriptor': 'descriptor_transaction',
+}
+
+
+def get_metrics_port() -> int | None:
+    """Get the metrics port from ref_metrics_port or None if disabled."""
+    port = os.getenv('ref_metrics_port')
+    return int(port) if port else None
+
+
+def get_metrics_host() -> str:
+    return os.getenv('ref_metrics_host', '127.0.0.1')
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _labels(labels: tuple[tuple[str, str], ...], extra: str = '') -> str:
+    items = [f'{name}={quote(str(value))}' for name, value in labels]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed bucket bounds in seconds."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name: str, labels: tuple[tuple[str, str], ...]) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, "le=" + quote(f"{bound:g}"))} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, "le=" + quote("+Inf"))} {self.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {self.sum:.9f}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+
+class ProviderMetrics:
+    """Counters, gauges and histograms of one or more instrumented providers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+        self._in_flight = 0
+        self.gauge('sdc_notifications_in_flight', lambda: self._in_flight)
+        self.gauge('sdc_log_queue_depth', log_pipeline.queue_depth)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        self._gauges[name] = func
+
+    @contextlib.contextmanager
+    def timed(self, name: str, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                lines.extend(f'{name}{_labels(key)} {value:g}' for key, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in series.items():
+                    lines.extend(histogram.render(name, key))
+        for name, func in sorted(self._gauges.items()):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {func():g}')
+        return '\n'.join(lines) + '\n'
+
+    def observe_tick(self, latency: float, jitter: float) -> None:
+        self.observe('sdc_loop_latency_seconds', latency)
+        self.observe('sdc_loop_jitter_seconds', jitter)
+
+    # --- instrumentation of a started provider ---
+
+    def instrument(self, prov: SdcProvider) -> None:
+        for kind, attribute in _TRANSACTIONS.items():
+            original = getattr(prov.mdib, attribute, None)
+            if original is not None:
+                setattr(prov.mdib, attribute, self._timed_transaction(original, kind))
+        msg_factory = getattr(prov, 'msg_factory', None)
+        if msg_factory is not None and hasattr(msg_factory, 'serialize_message'):
+            msg_factory.serialize_message = self._timed_call(
+                msg_factory.serialize_message, 'sdc_serialization_seconds')
+        for manager in subscription_managers(prov):
+            if hasattr(manager, 'send_to_subscribers'):
+                manager.send_to_subscribers = self._timed_call(manager.send_to_subscribers, 'sdc_dispatch_seconds')
+            lookup = getattr(manager, '_get_subscriptions_for_action', None)
+            if lookup is not None:
+                manager._get_subscriptions_for_action = self._instrumenting_lookup(lookup)
+
+    def _timed_transaction(self, original, kind: str):
+        @contextlib.contextmanager
+        @functools.wraps(original)
+        def transaction(*args, **kwargs):
+            context = original(*args, **kwargs)
+            mgr = context.__enter__()
+            try:
+                yield mgr
+            except BaseException as ex:
+                if not context.__exit__(type(ex), ex, ex.__traceback__):
+                    raise
+            else:
+                start = time.perf_counter()
+                context.__exit__(None, None, None)
+                self.observe('sdc_commit_seconds', time.perf_counter() - start, kind=kind)
+        return transaction
+
+    def _timed_call(self, original, name: str):
+        @functools.wraps(original)
+        def call(*args, **kwargs):
+            with self.timed(name):
+                return original(*args, **kwargs)
+        return call
+
+    def _instrumenting_lookup(self, original):
+        @functools.wraps(original)
+        def get_subscriptions_for_action(*args, **kwargs):
+            subscriptions = original(*args, **kwargs)
+            for subscription in subscriptions:
+                if not getattr(subscription, '_sdc_metrics', False):
+                    self._instrument_subscription(subscription)
+            return subscriptions
+        return get_subscriptions_for_action
+
+    def _instrument_subscription(self, subscription: Any) -> None:
+        key = subscription_key(subscription)
+        for attribute in ('send_notification_report', 'async_send_notification_report'):
+            original = getattr(subscription, attribute, None)
+            if original is None:
+                continue
+            if inspect.iscoroutinefunction(original):
+                setattr(subscription, attribute, self._timed_async_delivery(original, key))
+            else:
+                setattr(subscription, attribute, self._timed_delivery(original, key))
+        subscription._sdc_metrics = True
+
+    def _delivery_started(self) -> float:
+        with self._lock:
+            self._in_flight += 1
+        return time.perf_counter()
+
+    def _delivery_finished(self, start: float, subscriber: str, failed: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self.observe('sdc_delivery_seconds', time.perf_counter() - start, subscriber=subscriber)
+        if failed:
+            self.inc('sdc_delivery_failures_total', subscriber=subscriber)
+
+    def _timed_delivery(self, original, subscriber: str):
+        @functools.wraps(original)
+        def send(*args, **kwargs):
+            start = self._delivery_started()
+            failed = True
+            try:
+                result = original(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self._delivery_finished(start, subscriber, failed)
+        return send
+
+    def _timed_async_delivery(self, original, subscriber: str):
+        @functools.wraps(original)
+        async def send(*args, **kwargs):
+            start = self._delivery_started()
+            failed = True
+            try:
+                result = await original(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self._delivery_finished(start, subscriber, failed)
+        return send
+
+
+class MetricsServer:
+    """Serves ProviderMetrics.render() on GET /metrics from a daemon thread."""
+
+    def __init__(self, metrics: ProviderMetrics, host: str = '127.0.0.1', port: int = 0):
+        metrics_ref = metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,304 @@
+"""Embeddable reference provider with start/stop, run budget and run statistics.
+
+A ProviderRunner owns everything one provider run needs (WSDiscovery, the
+provider, the tick loop) and releases all of it when the run ends, so many
+runs can follow each other in one process:
+
+    for i in range(100):
+        runner = ProviderRunner(max_ticks=200, interval=0.01)
+        runner.start()
+        ...  # consume
+        stats = runner.stop()
+
+A runner is single-use; create a new one per run.
+"""
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import time
+import traceback
+import uuid
+
+import numpy as np
+
+import reference_provider
+from sdc11073 import location, wsdiscovery
+from sdc11073.loghelper import LoggerAdapter
+from sdc11073.provider import SdcProvider
+
+from context_churn import ContextChurn
+from mdib_cache import StartupTimings
+from operation_timing import OperationTimer, timing_enabled
+from provider_metrics import ProviderMetrics
+from publish_policy import PublishFilter
+from scenario import Scenario, ScenarioDriver, compile_scenario
+from scheduler import DeadlineScheduler
+from subscription_stats import SubscriptionCounter
+from tick_engine import TickEngine
+from update_store import HandleBuffer
+from update_rates import RateDriver, UpdateRates, mk_rate_driver
+
+LATENCY_PERCENTILES = {'p50': 50, 'p90': 90, 'p99': 99, 'max': 100}
+# loop latencies kept for the percentiles: the last 65536 ticks (about a minute at 1 kHz)
+LATENCY_WINDOW = 65536
+
+
+@dataclasses.dataclass
+class RunStats:
+    """Result of one provider run; times in seconds."""
+    ticks: int = 0
+    transactions: int = 0
+    reports: int = 0
+    duration: float = 0.0
+    reports_per_subscription: dict[str, int] = dataclasses.field(default_factory=dict)
+    loop_latency: dict[str, float] = dataclasses.field(default_factory=dict)
+    overruns: int = 0
+    jitter_max: float = 0.0
+    startup: StartupTimings | None = None
+    operations: dict[str, dict[str, float]] = dataclasses.field(default_factory=dict)
+
+
+def latency_percentiles(latencies: HandleBuffer) -> dict[str, float]:
+    """Percentiles of the latencies in the window; max covers the whole run."""
+    if latencies.count == 0:
+        return {}
+    _, window, _ = latencies.snapshot()
+    values = np.percentile(window, list(LATENCY_PERCENTILES.values()))
+    percentiles = dict(zip(LATENCY_PERCENTILES, (float(v) for v in values)))
+    percentiles['max'] = latencies.value_max
+    return percentiles
+
+
+class ProviderRunner:
+    """Runs the vital signs tick loop of one reference provider until stopped or the budget is used up.
+
+    duration limits the run time after the first tick, max_ticks the number of
+    ticks; None means unlimited. interval defaults to ref_send_interval.
+    With metrics, the provider is instrumented and every tick is recorded.
+    rates (default: ref_update_rates) sets the update period per metric, see
+    update_rates; without it heart rate and SpO2 update in every tick.
+    A scenario (default: ref_scenario) replaces the rates: its metrics are
+    played from precomputed values, see scenario.
+    """
+
+    def __init__(
+        self,
+        duration: float | None = None,
+        max_ticks: int | None = None,
+        interval: float | None = None,
+        ws_discovery: wsdiscovery.WSDiscovery | None = None,
+        epr: uuid.UUID | None = None,
+        loc: location.SdcLocation | None = None,
+        handle: reference_provider.ProviderHandle | None = None,
+        metrics: ProviderMetrics | None = None,
+        rates: UpdateRates | None = None,
+        scenario: Scenario | None = None,
+        logger=None
+    ):
+        self.duration = duration
+        self.max_ticks = max_ticks
+        self.interval = interval or reference_provider.get_send_interval()
+        self._wsd = ws_discovery
+        self._epr = epr
+        self._loc = loc
+        self.handle = handle or reference_provider.ProviderHandle()
+        self.metrics = metrics
+        self.rates = rates or UpdateRates.from_env()
+        self.scenario = scenario or Scenario.from_env()
+        self._logger = logger or LoggerAdapter(logging.getLogger('sdc'))
+        self._tick_logger = LoggerAdapter(logging.getLogger('sdc.ticks'))
+        self._thread: threading.Thread | None = None
+        self.stats: RunStats | None = None
+
+    @property
+    def provider(self) -> SdcProvider | None:
+        ready = self.handle.ready
+        if ready.done() and ready.exception() is None:
+            return ready.result()
+        return None
+
+    def start(self, timeout: float | None = None) -> SdcProvider:
+        """Run in a background thread; returns the provider once it is ready."""
+        self._thread = threading.Thread(target=self._run_in_thread, name='provider-runner', daemon=True)
+        self._thread.start()
+        return self.handle.wait_ready(timeout)
+
+    def stop(self, timeout: float | None = None) -> RunStats | None:
+        """End the run and return its statistics (None if it failed to start)."""
+        self.handle.stop(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.stats
+
+    def wait(self, timeout: float | None = None) -> RunStats | None:
+        """Wait until the run ended by itself, i.e. its budget is used up."""
+        self.handle.stopped.wait(timeout)
+        return self.stats
+
+    def __enter__(self) -> ProviderRunner:
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run_in_thread(self):
+        try:
+            self.run()
+        except Exception:
+            self._logger.exception("Fehler beim Start des Providers – breche ab")
+
+    def run(self) -> RunStats:
+        """Run in the calling thread; CTRL-C ends the run like stop()."""
+        owns_wsd = self._wsd is None
+        wsd = self._wsd or wsdiscovery.WSDiscovery(reference_provider.get_network_adapter().ip)
+        prov = None
+        try:
+            if owns_wsd:
+                wsd.start()
+            timings = StartupTimings()
+            prov = reference_provider.start_reference_provider(
+                wsd, self._epr, self._loc,
+                start_rtsample_loop=self.scenario is not None or self.rates is None or not self.rates.drives_waveforms,
+                timings=timings
+            )
+            if self.metrics is not None:
+                self.metrics.instrument(prov)
+            # the timer hooks every transaction and notification, so only with metrics or on request
+            operation_timer = None
+            if self.metrics is not None or timing_enabled():
+                operation_timer = OperationTimer(prov, self.metrics)
+            self._logger.info("Provider gestartet. Sendet Vitalparameter (Herzfrequenz und SpO2). CTRL-C zum Beenden")
+            self.stats = self._tick_loop(prov)
+            self.stats.startup = timings
+            if operation_timer is not None:
+                self.stats.operations = operation_timer.summary()
+            for operation, phases in self.stats.operations.items():
+                self._logger.info(
+                    "Operation %s: %s", operation,
+                    ', '.join(f'{phase}={seconds * 1000:.3f}ms' for phase, seconds in phases.items())
+                )
+            return self.stats
+        except Exception as ex:
+            if not self.handle.ready.done():
+                self.handle.ready.set_exception(ex)
+            raise
+        finally:
+            if prov:
+                prov.stop_all()
+            if owns_wsd:
+                wsd.stop()
+            if not self.handle.ready.done():
+                self.handle.ready.set_exception(RuntimeError('Provider wurde vor der Bereitschaft gestoppt'))
+            self.handle.stopped.set()
+
+    def _budget_left(self, ticks: int, end: float | None) -> bool:
+        if self.handle.stop_requested:
+            return False
+        if self.max_ticks is not None and ticks >= self.max_ticks:
+            return False
+        return end is None or time.monotonic() < end
+
+    def _mk_driver(self, prov: SdcProvider) -> ScenarioDriver | RateDriver:
+        if self.scenario is not None:
+            compile_start = time.perf_counter()
+            compiled = compile_scenario(self.scenario, self.interval, reference_provider.mk_alert_engine(prov))
+            self._logger.info(
+                "Szenario: %d Ticks (%.0fs%s) für %s vorberechnet, %d Alarmwechsel, %.0fms",
+                compiled.ticks, self.scenario.duration, ', Schleife' if compiled.loop else '',
+                compiled.handles, sum(len(flips) for flips in compiled.alert_flips.values()),
+                (time.perf_counter() - compile_start) * 1000
+            )
+            return ScenarioDriver(compiled)
+        driver = mk_rate_driver(prov, self.rates, self.interval)
+        self._logger.info("Aktualisierungsraten: %d Handles im Timer-Wheel (%d Slots)",
+                          driver.handle_count, driver.wheel.slots)
+        return driver
+
+    def _tick_loop(self, prov: SdcProvider) -> RunStats:
+        counter = SubscriptionCounter(prov)
+        publish_filter = PublishFilter.from_env()
+        engine = TickEngine(prov.mdib, publish_filter)
+        alert_engine = reference_provider.mk_alert_engine(prov)
+        scheduler = DeadlineScheduler(self.interval)
+        self._logger.info("Sendeintervall: %.4fs (%.1f Hz)", scheduler.interval, scheduler.rate)
+        driver = self._mk_driver(prov)
+        churn = ContextChurn.from_env(prov, self._loc, self.metrics)
+        if churn is not None:
+            self._logger.info("Kontext-Churn: %s pro Sekunde", churn.rates)
+        latencies = HandleBuffer(LATENCY_WINDOW)
+        start = time.monotonic()
+        end = start + self.duration if self.duration is not None else None
+        try:
+            while self._budget_left(engine.ticks, end) and not driver.finished:
+                tick_start = time.perf_counter()
+                try:
+                    driver.step(engine, alert_engine)
+                    stats = engine.commit()
+                    if churn is not None:
+                        churn.step()
+                    if not self.handle.ready.done():
+                        self.handle.ready.set_result(prov)
+                    self._tick_logger.info(
+                        "Tick %d: Herzfrequenz=%s SpO2=%s Alarm=%s (%d Transaktionen, %d Reports)",
+                        engine.ticks,
+                        driver.latest.get(reference_provider.HEART_RATE_HANDLE),
+                        driver.latest.get(reference_provider.SPO2_HANDLE),
+                        alert_engine.presence.get(reference_provider.ALERT_CONDITION_HANDLE),
+                        stats.transactions, stats.reports
+                    )
+                except Exception:
+                    self._logger.error(traceback.format_exc())
+                latency = time.perf_counter() - tick_start
+                latencies.append(tick_start, latency)
+                jitter = scheduler.wait()
+                if self.metrics is not None:
+                    self.metrics.observe_tick(latency, jitter)
+            self._logger.info("Provider wird gestoppt")
+        except KeyboardInterrupt:
+            self._logger.info("Provider wird gestoppt (KeyboardInterrupt)")
+
+        run_stats = RunStats(
+            ticks=engine.ticks,
+            transactions=engine.total.transactions,
+            reports=engine.total.reports,
+            duration=time.monotonic() - start,
+            reports_per_subscription=counter.snapshot(),
+            loop_latency=latency_percentiles(latencies),
+            overruns=scheduler.stats.overruns,
+            jitter_max=scheduler.stats.jitter_max,
+        )
+        self._logger.info(
+            "Insgesamt %d Ticks, %d Transaktionen, %d Reports in %.1fs",
+            run_stats.ticks, run_stats.transactions, run_stats.reports, run_stats.duration
+        )
+        self._logger.info(
+            "Loop-Latenz: %s",
+            ', '.join(f'{name}={value * 1000:.3f}ms' for name, value in run_stats.loop_latency.items())
+        )
+        for subscription, reports in run_stats.reports_per_subscription.items():
+            self._logger.info("Subscription %s: %d Reports", subscription, reports)
+        self._logger.info(
+            "Publish-Filter: %d veröffentlicht, %d unterdrückt, %d Heartbeats",
+            publish_filter.stats.published, publish_filter.stats.suppressed, publish_filter.stats.heartbeats
+        )
+        self._logger.info(
+            "Alarmregeln: %d Auswertungen, aktiv: %s",
+            alert_engine.evaluations, [h for h, present in alert_engine.presence.items() if present]
+        )
+        if churn is not None:
+            self._logger.info(
+                "Kontext-Churn: %d Aufnahmen, %d Re-Assoziationen in %d Transaktionen (%.3fms/Transaktion), "
+                "%d Verlegungen (%.3fms/Verlegung)",
+                churn.stats.admissions, churn.stats.reassociations, churn.stats.transactions,
+                churn.stats.context_seconds * 1000 / max(1, churn.stats.transactions),
+                churn.stats.transfers, churn.stats.location_seconds * 1000 / max(1, churn.stats.transfers)
+            )
+        self._logger.info(
+            "Scheduler: %d Überläufe (%d Deadlines übersprungen), Jitter avg=%.3fms max=%.3fms",
+            scheduler.stats.overruns, scheduler.stats.skipped_deadlines,
+            scheduler.stats.jitter_avg * 1000, scheduler.stats.jitter_max * 1000
+        )
+        return run_stats
@@ -0,0 +1,151 @@
+"""Dead-band and change-only publishing of provider metric and alert states.
+
+A PublishFilter decides per handle whether a new value is worth a state
+update: numeric values must leave the absolute and relative dead-band
+around the last published value, other values must differ from it. A
+minimum interval rate-limits a handle, a maximum interval republishes an
+unchanged value as heartbeat. Values are always compared with the last
+*published* value, so slow drifts are reported once they leave the band.
+A value only counts as published once the caller reports it with published(),
+i.e. after its transaction was committed.
+"""
+from __future__ import annotations
+
+import dataclasses
+import heapq
+import json
+import os
+import pathlib
+import time
+from numbers import Number
+from typing import Any, Container
+
+DEFAULT_CONFIG_PATH = pathlib.Path(__file__).parent / 'publish_policy_default.json'
+
+
+def _is_numeric(value: Any) -> bool:
+    # bool is a Number, but a flipped Presence must never fall into a dead-band
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+@dataclasses.dataclass(frozen=True)
+class PublishPolicy:
+    """Publishing rules of one handle; intervals in seconds."""
+    abs_deadband: float = 0.0
+    rel_deadband: float = 0.0
+    change_only: bool = True
+    min_interval: float = 0.0
+    max_interval: float | None = None
+
+    def exceeds_deadband(self, value: Any, last: Any) -> bool:
+        if _is_numeric(value) and _is_numeric(last):
+            delta = abs(float(value) - float(last))
+            return delta > 0 and delta > self.abs_deadband and delta > self.rel_deadband * abs(float(last))
+        return value != last
+
+
+@dataclasses.dataclass
+class PublishStats:
+    published: int = 0
+    suppressed: int = 0
+    heartbeats: int = 0
+
+
+class PublishFilter:
+    """Applies PublishPolicy objects per handle."""
+
+    def __init__(self, default: PublishPolicy | None = None,
+                 policies: dict[str, PublishPolicy] | None = None, clock=time.monotonic):
+        self.default = default or PublishPolicy()
+        self.policies = policies or {}
+        self._clock = clock
+        self._last: dict[str, tuple[Any, float]] = {}
+        # (due time, handle, publish time) of pending heartbeats; outdated entries are skipped lazily
+        self._heartbeats: list[tuple[float, str, float]] = []
+        self.stats = PublishStats()
+
+    @classmethod
+    def from_config(cls, config: dict) -> PublishFilter:
+        """Create from {"default": {...}, "handles": {handle: {...}}}; handle entries extend the default."""
+        default_fields = config.get('default', {})
+        default = PublishPolicy(**default_fields)
+        policies = {handle: PublishPolicy(**{**default_fields, **fields})
+                    for handle, fields in config.get('handles', {}).items()}
+        return cls(default, policies)
+
+    @classmethod
+    def from_env(cls) -> PublishFilter:
+        """Load the file named by ref_publish_policy or publish_policy_default.json."""
+        path = pathlib.Path(os.getenv('ref_publish_policy', str(DEFAULT_CONFIG_PATH)))
+        if not path.exists():
+            return cls()
+        return cls.from_config(json.loads(path.read_bytes()))
+
+    def copy(self) -> PublishFilter:
+        """Return a filter with the same policies and clock but nothing published yet."""
+        return type(self)(self.default, dict(self.policies), self._clock)
+
+    def policy(self, handle: str) -> PublishPolicy:
+        return self.policies.get(handle, self.default)
+
+    def should_publish(self, handle: str, value: Any) -> bool:
+        """Return True if the value has to be published now; report it with published() once it is."""
+        now = self._clock()
+        last = self._last.get(handle)
+        policy = self.policy(handle)
+        publish = last is None
+        if not publish:
+            last_value, last_time = last
+            elapsed = now - last_time
+            if elapsed < policy.min_interval:
+                publish = False
+            elif not policy.change_only or policy.exceeds_deadband(value, last_value):
+                publish = True
+            elif policy.max_interval is not None and elapsed >= policy.max_interval:
+                publish = True
+                self.stats.heartbeats += 1
+        if not publish:
+            self.stats.suppressed += 1
+        return publish
+
+    def published(self, handle: str, value: Any) -> None:
+        """Remember value as the last published value of handle."""
+        now = self._clock()
+        self._last[handle] = (value, now)
+        policy = self.policy(handle)
+        if policy.max_interval is not None:
+            heapq.heappush(self._heartbeats, (now + policy.max_interval, handle, now))
+        self.stats.published += 1
+
+    def heartbeats_due(self, handles: Container[str] | None = None) -> list[tuple[str, Any]]:
+        """Return (handle, last published value) of all handles whose heartbeat is due.
+
+        Lets callers that only report changes (e.g. the alert engine) keep the
+        heartbeat without offering every value to should_publish on every tick.
+        With handles, only their heartbeats are returned; due heartbeats of
+        other handles stay pending for the caller that publishes them.
+        """
+        now = self._clock()
+        due = []
+        others = []
+        while self._heartbeats and self._heartbeats[0][0] <= now:
+            entry = heapq.heappop(self._heartbeats)
+            _, handle, published_at = entry
+            last = self._last.get(handle)
+            if last is None or last[1] != published_at:
+                continue
+            if handles is not None and handle not in handles:
+                others.append(entry)
+            else:
+                due.append((handle, last[0]))
+        for entry in others:
+            heapq.heappush(self._heartbeats, entry)
+        return due
+
+    def forget(self, handle: str | None = None) -> None:
+        """Force the next value of handle (or of all handles) to be published."""
+        if handle is None:
+            self._last.clear()
+            self._heartbeats.clear()
+        else:
+            self._last.pop(handle, None)
@@ -10,15 +10,17 @@ und konsistenter Konfiguration.
 
 import dataclasses
 import enum
+import math
 import os
 import pathlib
 import sys
+import threading
 import time
 import traceback
 import uuid
 import platform
 import logging
-from collections import defaultdict
+from collections import Counter, defaultdict
 from concurrent import futures
 from decimal import Decimal
 
@@ -33,6 +35,11 @@ from sdc11073.wsdiscovery import WSDiscovery
 from sdc11073.xml_types.msg_types import InvocationState
 from sdc11073.xml_types import pm_qnames
 
+import profiling
+import reference_provider
+from log_pipeline import Sampler
+from update_store import UpdateStore
+
 # Warn-Limit für Bestimmungszeiten
 ConsumerMdibMethods.DETERMINATIONTIME_WARN_LIMIT = 2.0
 
@@ -42,6 +49,7 @@ discovery_timeout = int(os.getenv('ref_discovery_timeout', "30"))  # Sekunden
 operation_timeout = int(os.getenv('ref_operation_timeout', "10"))  # Sekunden
 metric_update_wait = int(os.getenv('ref_metric_wait', "20"))  # Sekunden
 min_updates_required = int(os.getenv('ref_min_updates', "0"))  # 0 = automatisch (wait_time / 5 - 1)
+progress_interval = float(os.getenv('ref_progress_interval', "5"))  # Sekunden zwischen Fortschrittsausgaben
 enable_commlog = os.getenv('ref_enable_commlog', 'true').lower() in ('true', '1', 'yes')
 
 
@@ -117,6 +125,174 @@ class TestCollector:
                     print(f"   {info['details']}")
 
 
+@dataclasses.dataclass
+class WaveformStats:
+    """Empfangsstatistik eines Waveform-Handles."""
+    updates: int = 0
+    samples: int = 0
+    gaps: int = 0
+    missing_samples: int = 0
+    first_time: float | None = None
+    next_expected: float | None = None
+
+    def effective_rate(self) -> float:
+        """Empfangene Samples pro Sekunde Signalzeit."""
+        if self.first_time is None or self.next_expected is None:
+            return 0.0
+        duration = self.next_expected - self.first_time
+        return self.samples / duration if duration > 0 else 0.0
+
+
+class WaveformRecorder:
+    """
+    Zeichnet eingehende RealTimeSampleArray-Updates auf.
+    Zählt Samples und erkennt Lücken anhand von DeterminationTime und SamplePeriod.
+    """
+
+    def __init__(self, mdib: ConsumerMdib, gap_tolerance: float = 1.5):
+        self._mdib = mdib
+        self._gap_tolerance = gap_tolerance  # in Sample-Perioden
+        self._sample_periods: dict[str, float] = {}
+        self.stats: dict[str, WaveformStats] = defaultdict(WaveformStats)
+
+    def _sample_period(self, handle: str) -> float:
+        if (period := self._sample_periods.get(handle)) is None:
+            descriptor = self._mdib.descriptions.handle.get_one(handle)
+            period = self._sample_periods[handle] = float(descriptor.SamplePeriod)
+        return period
+
+    def on_waveform(self, updates) -> None:
+        for h, st in updates.items():
+            value = st.MetricValue
+            if value is None or not value.Samples or value.DeterminationTime is None:
+                continue
+            period = self._sample_period(h)
+            start = float(value.DeterminationTime)
+            count = len(value.Samples)
+            stats = self.stats[h]
+            if stats.first_time is None:
+                stats.first_time = start
+            elif start - stats.next_expected > self._gap_tolerance * period:
+                stats.gaps += 1
+                stats.missing_samples += int(round((start - stats.next_expected) / period))
+            stats.updates += 1
+            stats.samples += count
+            stats.next_expected = start + count * period
+
+
+class UpdateWaiter:
+    """
+    Wartet auf einer Condition, bis eine Abbruchbedingung erfüllt ist oder der Timeout abläuft.
+    Die Callbacks rufen notify() auf, wenn sich die Bedingung geändert haben kann;
+    Fortschritt wird höchstens alle `progress_interval` Sekunden ausgegeben, bei <= 0 gar nicht.
+    """
+
+    def __init__(self, progress_interval: float = 5.0):
+        self._condition = threading.Condition()
+        self._progress_interval = progress_interval if progress_interval > 0 else math.inf
+
+    def notify(self) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, timeout: float, done, progress=None) -> bool:
+        """True, sobald done() erfüllt ist, False nach `timeout` Sekunden."""
+        deadline = time.monotonic() + timeout
+        next_progress = time.monotonic() + self._progress_interval
+        with self._condition:
+            while not done():
+                now = time.monotonic()
+                if now >= deadline:
+                    return False
+                if now >= next_progress:
+                    status = f" ({progress()})" if progress is not None else ""
+                    print(f"Noch {deadline - now:.0f}s verbleibend{status}...")
+                    next_progress += self._progress_interval
+                self._condition.wait(min(deadline, next_progress) - now)
+        return True
+
+
+def expected_update_handles(mdib: ConsumerMdib) -> tuple[list[str], list[str], list[str]]:
+    """
+    Handles, deren Updates Test 7/8 erwartet, aus den Deskriptoren des MDIB: (Metriken, Alarme, Waveforms).
+    Metriken sind die numerischen Metriken, die nicht Ziel einer Operation sind, Alarme alle
+    Alarmbedingungen. ref_expected_handles (kommagetrennt) ersetzt Metriken und Alarme.
+    """
+    descriptions = mdib.descriptions
+    targets = {getattr(d, 'OperationTarget', None) for d in descriptions.objects}
+    alerts = [d.Handle for d in descriptions.NODETYPE.get(pm_qnames.AlertConditionDescriptor, [])
+              + descriptions.NODETYPE.get(pm_qnames.LimitAlertConditionDescriptor, [])]
+    waveforms = [d.Handle for d in descriptions.NODETYPE.get(pm_qnames.RealTimeSampleArrayMetricDescriptor, [])]
+    if configured := os.getenv('ref_expected_handles'):
+        handles = [h.strip() for h in configured.split(',') if h.strip()]
+        return ([h for h in handles if h not in alerts and h not in waveforms],
+                [h for h in handles if h in alerts], waveforms)
+    metrics = [d.Handle for d in descriptions.NODETYPE.get(pm_qnames.NumericMetricDescriptor, [])
+               if d.Handle not in targets]
+    return metrics, alerts, waveforms
+
+
+def run_operation_tests(mdib: ConsumerMdib, ops, invocations: int, timeout: float, results: TestCollector,
+                        max_workers: int = 64) -> None:
+    """
+    Test 9: Ruft jede Operation `invocations` Mal auf, alle Operationen gleichzeitig.
+    Handles werden über einen einmal aufgebauten Index (Operationstyp, Handle) aufgelöst,
+    die Invocation-Futures gemeinsam mit einem Timeout von `timeout` Sekunden eingesammelt.
+    """
+    if invocations < 1:
+        raise ValueError(f"invocations muss >= 1 sein, nicht {invocations}")
+    index = {}
+    for op_type, _, _ in ops:
+        if (desc_type := getattr(pm_qnames, f"{op_type}OperationDescriptor", None)) is not None:
+            index.update({(op_type, d.Handle): d for d in mdib.descriptions.NODETYPE.get(desc_type, [])})
+
+    found = []
+    for op_type, handle, call in ops:
+        print(f"Test 9: Prüfe {op_type} auf {handle}")
+        if (op_type, handle) not in index:
+            results.add_result(f"Test 9: {op_type} operation found", TestResult.FAILED,
+                               f"Handle {handle} nicht gefunden")
+            continue
+        results.add_result(f"Test 9: {op_type} operation found", TestResult.PASSED,
+                           f"Handle {handle} gefunden")
+        found.append((op_type, handle, call))
+    if not found:
+        return
+
+    print(f"Test 9: {len(found)} Operationen mit je {invocations} Aufruf(en) gleichzeitig")
+    # Das Senden der Requests blockiert, daher je Aufruf ein Thread; zurück kommt das Invocation-Future
+    with futures.ThreadPoolExecutor(max_workers=min(len(found) * invocations, max_workers),
+                                    thread_name_prefix='operation') as pool:
+        requests = {(op_type, handle): [pool.submit(call, handle) for _ in range(invocations)]
+                    for op_type, handle, call in found}
+    outcomes: dict[tuple[str, str], list[str]] = defaultdict(list)
+    pending: dict[futures.Future, tuple[str, str]] = {}
+    for key, submitted in requests.items():
+        for request in submitted:
+            try:
+                pending[request.result()] = key
+            except Exception as e:
+                outcomes[key].append(str(e))
+    done, not_done = futures.wait(pending, timeout=timeout)
+    for fut in done:
+        try:
+            outcomes[pending[fut]].append(f"State={fut.result().InvocationInfo.InvocationState}")
+        except Exception as e:
+            outcomes[pending[fut]].append(str(e))
+    for fut in not_done:
+        outcomes[pending[fut]].append(f"Timeout nach {timeout}s")
+
+    finished = f"State={InvocationState.FINISHED}"
+    for op_type, handle, _ in found:
+        counts = Counter(outcomes[(op_type, handle)])
+        ok = counts[finished] == invocations
+        if invocations == 1:
+            details = next(iter(counts))
+        else:
+            details = ", ".join(f"{outcome}: {n}" for outcome, n in counts.items())
+        results.add_result(f"Test 9: {op_type} {handle}", TestResult.PASSED if ok else TestResult.FAILED, details)
+
+
 def get_network_adapter() -> network.NetworkAdapter:
     """
     Liefert einen Netzwerkadapter basierend auf Konfiguration.
@@ -218,6 +394,7 @@ def setup_commlog() -> commlog.DirectoryLogger:
     )
 
 
+@profiling.profile_entry('consumer')
 def run_ref_test() -> TestCollector:
     """
     Führt Referenztests durch.
@@ -296,6 +473,9 @@ def run_ref_test() -> TestCollector:
                 ssl_context_container=get_ssl_context(),
                 validate=True
             )
+            if (methods := reference_provider.get_compression()) is not None:
+                reference_provider.apply_compression(client, methods)
+                print(f"HTTP-Kompression: {', '.join(methods) or 'aus'}")
             client.start_all()
             print("Test 2 bestanden: Verbindung hergestellt")
             results.add_result("Test 2: Connect to device", TestResult.PASSED)
@@ -341,90 +521,130 @@ def run_ref_test() -> TestCollector:
             results.add_result("Test 6: Location context", TestResult.FAILED, "Keine Location Contexts gefunden")
 
         # --- Test 7&8: Updates sammeln und prüfen ---
-        metric_updates = defaultdict(list)
-        alert_updates = defaultdict(list)
+        # Ringpuffer mit festem Speicherbudget je Handle (ref_update_buffer), keine State-Objekte
+        metric_updates = UpdateStore()
+        alert_updates = UpdateStore()
+        # Ausgabe nur jeder N-ten Aktualisierung pro Handle (ref_print_every, 0 = keine), Alarmwechsel immer
+        print_every = int(os.getenv('ref_print_every', "1"))
+        print_sampler = Sampler(every=print_every) if print_every > 0 else (lambda key: False)
+        wait_time = metric_update_wait
+        min_updates = (wait_time // 5 - 1) if min_updates_required == 0 else min_updates_required
+        metric_handles, alert_handles, waveform_handles = expected_update_handles(mdib)
+        # Geweckt wird nur, wenn ein Handle neu ist oder min_updates erreicht
+        waiter = UpdateWaiter(progress_interval)
 
         def on_metric(updates):
+            now = time.time()
+            version = getattr(mdib, 'mdib_version', None)
             for h, st in updates.items():
-                metric_updates[h].append(st)
-                if st.MetricValue and st.MetricValue.Value is not None:
+                value = st.MetricValue.Value if st.MetricValue is not None else None
+                if metric_updates.append(h, now, value, version).count in (1, min_updates):
+                    waiter.notify()
+                if value is not None and print_sampler(h):
                     name = 'Unbekannt'
                     if 'numeric.ch0.vmd0' in h:
                         name = 'HR'
                     elif 'numeric.ch1.vmd0' in h:
                         name = 'SpO2'
-                    print(f">>> {name}: {st.MetricValue.Value}")
+                    print(f">>> {name}: {value}")
 
         def on_alert(updates):
+            now = time.time()
+            version = getattr(mdib, 'mdib_version', None)
             for h, st in updates.items():
-                alert_updates[h].append(st)
-                if hasattr(st, 'Presence'):
-                    print(f">>> Alarm {h}: {'Aktiv' if st.Presence else 'Inaktiv'}")
+                presence = getattr(st, 'Presence', None)
+                previous = alert_updates[h].last_value if h in alert_updates else None
+                buffer = alert_updates.append(h, now, presence, version)
+                if hasattr(st, 'Presence') and (buffer.count == 1 or previous != presence or print_sampler(h)):
+                    print(f">>> Alarm {h}: {'Aktiv' if presence else 'Inaktiv'}")
+                if buffer.count in (1, min_updates):
+                    waiter.notify()
+
+        waveform_recorder = WaveformRecorder(mdib)
+
+        def on_waveform(updates):
+            waveform_recorder.on_waveform(updates)
+            if any(waveform_recorder.stats[h].updates == min_updates for h in updates):
+                waiter.notify()
+
+        def handles_done() -> list[bool]:
+            # alle erwarteten Handles, auch die, von denen noch kein Update kam
+            return ([metric_updates.count(h) >= min_updates for h in metric_handles]
+                    + [alert_updates.count(h) >= min_updates for h in alert_handles]
+                    + [h in waveform_recorder.stats and waveform_recorder.stats[h].updates >= min_updates
+                       for h in waveform_handles])
+
+        def all_updates_received() -> bool:
+            return all(handles_done())
+
+        def progress() -> str:
+            done = handles_done()
+            return f"{sum(done)}/{len(done)} Handles mit {min_updates} Updates"
 
         observableproperties.bind(
             mdib,
             metrics_by_handle=on_metric,
-            alert_by_handle=on_alert
+            alert_by_handle=on_alert,
+            waveform_by_handle=on_waveform
         )
 
-        wait_time = metric_update_wait
-        min_updates = (wait_time // 5 - 1) if min_updates_required == 0 else min_updates_required
-        print(f"Warte {wait_time}s auf Updates (min. {min_updates} pro Handle erwartet)")
-        start = time.time()
-        while time.time() - start < wait_time:
-            time.sleep(0.0001)
-            if int(time.time() - start) % 5 == 0:
-                print(f"Noch {wait_time - int(time.time()-start)}s verbleibend...")
-
-        # Auswertung Metric Updates
-        if not metric_updates:
-            results.add_result("Test 7: Metric updates", TestResult.FAILED, "Keine Metrik-Updates empfangen")
+        print(f"Warte bis zu {wait_time}s auf Updates (min. {min_updates} pro Handle erwartet)")
+        start = time.monotonic()
+        if waiter.wait(wait_time, all_updates_received, progress):
+            print(f"Alle Handles nach {time.monotonic() - start:.1f}s vollständig")
         else:
-            for h, lst in metric_updates.items():
-                res = TestResult.PASSED if len(lst) >= min_updates else TestResult.FAILED
-                results.add_result(f"Test 7: Metric updates {h}", res,
-                                   f"Empfangen: {len(lst)}, Erwartet: {min_updates}")
+            print(f"Timeout nach {wait_time}s: {progress()}")
+
+        # Auswertung Metric Updates: erwartete Handles, auch ohne Updates, und alle weiteren empfangenen
+        if not metric_updates and not metric_handles:
+            results.add_result("Test 7: Metric updates", TestResult.FAILED, "Keine Metrik-Updates empfangen")
+        for h in metric_handles + [h for h, _ in metric_updates.items() if h not in metric_handles]:
+            if h not in metric_updates:
+                results.add_result(f"Test 7: Metric updates {h}", TestResult.FAILED,
+                                   f"Keine Updates empfangen, Erwartet: {min_updates}")
+                continue
+            buffer = metric_updates[h]
+            res = TestResult.PASSED if buffer.count >= min_updates else TestResult.FAILED
+            results.add_result(f"Test 7: Metric updates {h}", res,
+                               f"Empfangen: {buffer.count} ({buffer.rate():.1f}/s), Erwartet: {min_updates}")
 
         # Auswertung Alert Updates
-        if not alert_updates:
+        if not alert_updates and not alert_handles:
             results.add_result("Test 8: Alert updates", TestResult.FAILED, "Keine Alarm-Updates empfangen")
-        else:
-            for h, lst in alert_updates.items():
-                res = TestResult.PASSED if len(lst) >= min_updates else TestResult.FAILED
-                results.add_result(f"Test 8: Alert updates {h}", res,
-                                   f"Empfangen: {len(lst)}, Erwartet: {min_updates}")
+        for h in alert_handles + [h for h, _ in alert_updates.items() if h not in alert_handles]:
+            count = alert_updates.count(h)
+            res = TestResult.PASSED if count >= min_updates else TestResult.FAILED
+            results.add_result(f"Test 8: Alert updates {h}", res, f"Empfangen: {count}, Erwartet: {min_updates}")
+
+        # Auswertung Waveforms
+        if not waveform_handles:
+            results.add_result("Test 7b: Waveform updates", TestResult.SKIPPED,
+                               "Keine RealTimeSampleArray-Metriken im MDIB")
+        for h in waveform_handles:
+            wf = waveform_recorder.stats.get(h)
+            if wf is None or wf.samples == 0:
+                results.add_result(f"Test 7b: Waveform updates {h}", TestResult.FAILED,
+                                   "Keine Samples empfangen")
+                continue
+            res = TestResult.PASSED if wf.updates >= min_updates else TestResult.FAILED
+            results.add_result(f"Test 7b: Waveform updates {h}", res,
+                               f"Updates: {wf.updates}, Samples: {wf.samples} "
+                               f"({wf.effective_rate():.0f} Hz), Lücken: {wf.gaps} "
+                               f"({wf.missing_samples} Samples fehlen)")
 
-        # --- Test 9: Operationen ---
+        # --- Test 9: Operationen (gleichzeitig) ---
         ops = [
             ('SetString', 'string.ch0.vmd1_sco_0', lambda h: client.set_service_client.set_string(h, 'hoppeldipop')),
             ('SetValue',  'numeric.ch0.vmd1_sco_0', lambda h: client.set_service_client.set_numeric_value(h, Decimal('42'))),
             ('Activate',  'actop.vmd1_sco_0', lambda h: client.set_service_client.activate(h, 'hoppeldipop'))
         ]
-        for op_type, handle, call in ops:
-            print(f"Test 9: Prüfe {op_type} auf {handle}")
-            desc_type = getattr(pm_qnames, f"{op_type}OperationDescriptor", None)
-            descs = mdib.descriptions.NODETYPE.get(desc_type, []) if desc_type else []
-            if not any(d.Handle == handle for d in descs):
-                results.add_result(f"Test 9: {op_type} operation found", TestResult.FAILED,
-                                   f"Handle {handle} nicht gefunden")
-                continue
-            results.add_result(f"Test 9: {op_type} operation found", TestResult.PASSED,
-                               f"Handle {handle} gefunden")
-            for d in descs:
-                if d.Handle != handle:
-                    continue
-                try:
-                    fut = call(d.Handle)
-                    res = fut.result(timeout=operation_timeout)
-                    ok = res.InvocationInfo.InvocationState == InvocationState.FINISHED
-                    results.add_result(f"Test 9: {op_type} {handle}",
-                                       TestResult.PASSED if ok else TestResult.FAILED,
-                                       f"State={res.InvocationInfo.InvocationState}")
-                except futures.TimeoutError:
-                    results.add_result(f"Test 9: {op_type} {handle}", TestResult.FAILED,
-                                       f"Timeout nach {operation_timeout}s")
-                except Exception as e:
-                    results.add_result(f"Test 9: {op_type} {handle}", TestResult.FAILED, str(e))
+        # Aufrufe je Operation (ref_operation_invocations), um die Operations-Queue des Providers zu belasten
+        invocations = int(os.getenv('ref_operation_invocations', "1"))
+        if invocations < 1:
+            results.add_result("Test 9: Operations", TestResult.FAILED,
+                               f"ref_operation_invocations muss >= 1 sein, nicht {invocations}")
+        else:
+            run_operation_tests(mdib, ops, invocations, operation_timeout, results)
 
         # --- Test 10: Unsubscribe ---
         print("Test 10: Beende alle Abonnements")
@@ -464,6 +684,14 @@ def run_ref_test() -> TestCollector:
     return results
 
 
+def positive_int(value: str) -> int:
+    """argparse-Typ für ganze Zahlen >= 1."""
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return number
+
+
 def main() -> int:
     """
     Hauptfunktion mit Kommandozeilenargumenten und Rückgabewert.
@@ -474,7 +702,7 @@ def main() -> int:
     parser.add_argument('--timeout', type=int, default=15,
                         help='Timeout für Service-Discovery in Sekunden (Default: 30)')
     parser.add_argument('--wait', type=int, default=20,
-                        help='Wartezeit für Metrik-Updates in Sekunden (Default: 20)')
+                        help='Maximale Wartezeit für Metrik-Updates in Sekunden (Default: 20)')
     parser.add_argument('--min-updates', type=int, default=0,
                         help='Minimale Anzahl an Updates pro Handle (Default: wait/5-1)')
     parser.add_argument('--loopback', action='store_true',
@@ -482,6 +710,14 @@ def main() -> int:
     parser.add_argument('--logdir', help='Verzeichnis für Logdateien')
     parser.add_argument('--no-commlog', action='store_true',
                         help='Kommunikationslogging deaktivieren')
+    parser.add_argument('--compression', help="HTTP-Kompression: lz4, gzip, 'lz4,gzip' oder none")
+    parser.add_argument('--print-every', type=int, default=None,
+                        help='Nur jede N-te Aktualisierung pro Handle ausgeben, 0 = keine Werte '
+                             '(Alarmwechsel werden immer ausgegeben) (Default: 1)')
+    parser.add_argument('--expect', help='Erwartete Metrik-/Alarm-Handles für Test 7/8, kommagetrennt '
+                                         '(Default: numerische Metriken ohne Operation und alle Alarmbedingungen)')
+    parser.add_argument('--operation-invocations', type=positive_int, default=None,
+                        help='Gleichzeitige Aufrufe je Operation in Test 9 (Default: 1)')
     
     args = parser.parse_args()
     
@@ -497,6 +733,14 @@ def main() -> int:
         os.environ['ref_commlog_dir'] = args.logdir
     if args.no_commlog:
         os.environ['ref_enable_commlog'] = 'false'
+    if args.compression:
+        os.environ['ref_compression'] = args.compression
+    if args.print_every is not None:
+        os.environ['ref_print_every'] = str(args.print_every)
+    if args.expect:
+        os.environ['ref_expected_handles'] = args.expect
+    if args.operation_invocations is not None:
+        os.environ['ref_operation_invocations'] = str(args.operation_invocations)
     
     results = run_ref_test()
     results.print_summary()
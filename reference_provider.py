@@ -4,14 +4,17 @@ from __future__ import annotations
 import setup_path
 
 import decimal
+import importlib.util
 import json
 import logging.config
 import os
 import pathlib
 import time
-import traceback
 import uuid
 import random
+import threading
+import weakref
+from concurrent import futures
 from typing import TYPE_CHECKING
 
 import sdc11073.certloader
@@ -26,11 +29,25 @@ from sdc11073.xml_types import dpws_types, pm_types
 from sdc11073.xml_types import pm_qnames as pm
 from sdc11073.xml_types.dpws_types import ThisDeviceType, ThisModelType
 
+import log_pipeline
+import profiling
+from alert_engine import AlertEngine
+from mdib_cache import MdibCache, StartupTimings, get_cache_dir, load_mdib, use_cache
+from signal_generator import get_seed
+from waveform_generator import PrecomputedWaveform, ecg_waveform, get_sample_rate, pleth_waveform
+
 if TYPE_CHECKING:
     pass
 
 USE_REFERENCE_PARAMETERS = True
 
+HEART_RATE_HANDLE = 'numeric.ch0.vmd0'
+SPO2_HANDLE = 'numeric.ch1.vmd0'
+ALERT_CONDITION_HANDLE = 'ac0.mds0'
+
+# generators registered per provider, see register_waveform_generators
+_waveform_generators: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
 def get_network_adapter() -> network.NetworkAdapter:
     """Get network adapter from environment or first loopback."""
     if (ip := os.getenv('ref_ip')) is not None:
@@ -68,6 +85,36 @@ def get_epr() -> uuid.UUID:
     return uuid.UUID('12345678-6f55-11ea-9697-123456789abc')
 
 
+def get_mdib_path() -> pathlib.Path | None:
+    """Get mdib file from environment or None for reference_mdib.xml."""
+    if (mdib_path := os.getenv('ref_mdib_path')) is not None:
+        return pathlib.Path(mdib_path)
+    return None
+
+
+def get_compression() -> list[str] | None:
+    """Get HTTP compression methods from ref_compression (e.g. 'lz4', 'gzip,lz4', 'none') or None for default."""
+    if (value := os.getenv('ref_compression')) is None:
+        return None
+    if value.strip().lower() in ('', 'none', 'off'):
+        return []
+    return [method.strip() for method in value.split(',') if method.strip()]
+
+
+def apply_compression(component, methods: list[str] | None) -> None:
+    """Restrict request and response compression of an SdcProvider or SdcConsumer; [] disables it."""
+    if methods is None:
+        return
+    if 'lz4' in methods and importlib.util.find_spec('lz4') is None:
+        raise RuntimeError("lz4-Kompression benötigt das Paket lz4 (pip install sdc11073[lz4])")
+    component.set_used_compression(*methods)
+
+
+def get_send_interval() -> float:
+    """Get the tick interval in seconds from environment or default."""
+    return float(os.getenv('ref_send_interval', '0.05'))
+
+
 def create_reference_provider(
     ws_discovery: wsdiscovery.WSDiscovery | None = None,
     mdib_path: pathlib.Path | None = None,
@@ -75,8 +122,11 @@ def create_reference_provider(
     dpws_device: dpws_types.ThisDeviceType | None = None,
     epr: uuid.UUID | None = None,
     specific_components: SdcProviderComponents | None = None,
-    ssl_context_container: sdc11073.certloader.SSLContextContainer | None = None
+    ssl_context_container: sdc11073.certloader.SSLContextContainer | None = None,
+    start_rtsample_loop: bool = True,
+    timings: StartupTimings | None = None
 ) -> provider.SdcProvider:
+    """Create and start the provider; the startup phases are measured into timings if given."""
     ws_discovery = ws_discovery or wsdiscovery.WSDiscovery(get_network_adapter().ip)
     ws_discovery.start()
 
@@ -94,8 +144,14 @@ def create_reference_provider(
         serial_number='12345'
     )
 
-    mdib = ProviderMdib.from_mdib_file(
-        str(mdib_path or pathlib.Path(__file__).parent / 'reference_mdib.xml')
+    mdib, load_timings = load_mdib(
+        mdib_path or pathlib.Path(__file__).parent / 'reference_mdib.xml',
+        post_process_mdib,
+        MdibCache(get_cache_dir()) if use_cache() else None
+    )
+    timings = timings or StartupTimings()
+    timings.parse, timings.post_process, timings.cache_hit = (
+        load_timings.parse, load_timings.post_process, load_timings.cache_hit
     )
 
     prov = provider.SdcProvider(
@@ -107,12 +163,77 @@ def create_reference_provider(
         specific_components=specific_components,
         ssl_context_container=ssl_context_container or get_ssl_context(),
     )
-    for desc in prov.mdib.descriptions.objects:
-        desc.SafetyClassification = pm_types.SafetyClassification.MED_A
-    prov.start_all(start_rtsample_loop=True)
+    apply_compression(prov, get_compression())
+    register_waveform_generators(prov)
+    start = time.perf_counter()
+    prov.start_all(start_rtsample_loop=start_rtsample_loop)
+    timings.start_all = time.perf_counter() - start
+    logging.getLogger('sdc').info(
+        "Startzeiten: Parsen %.3fs%s, Nachbearbeitung %.3fs, start_all %.3fs",
+        timings.parse, ' (Cache)' if timings.cache_hit else '', timings.post_process, timings.start_all
+    )
     return prov
 
 
+def post_process_mdib(mdib: ProviderMdib) -> None:
+    """Changes applied to every freshly parsed MDIB; cached together with the MDIB."""
+    for desc in mdib.descriptions.objects:
+        desc.SafetyClassification = pm_types.SafetyClassification.MED_A
+
+
+def mk_waveform_generators(prov: provider.SdcProvider) -> dict[str, PrecomputedWaveform]:
+    """Create an ECG or pleth generator for every RealTimeSampleArray metric.
+
+    Sample rates come from ref_ecg_rate / ref_pleth_rate (125..1000 Hz).
+    """
+    seed = get_seed()
+    generators = {}
+    for desc in prov.mdib.descriptions.NODETYPE.get(pm.RealTimeSampleArrayMetricDescriptor, []):
+        if desc.Handle.startswith('pleth'):
+            generator = pleth_waveform(get_sample_rate('pleth', 125), seed=seed)
+        else:
+            generator = ecg_waveform(get_sample_rate('ecg', 500), seed=seed)
+        generators[desc.Handle] = generator
+    return generators
+
+
+def mk_alert_engine(prov: provider.SdcProvider) -> AlertEngine:
+    """Load the alert rules (ref_alert_rules) for the alert conditions of the MDIB."""
+    descriptors = (prov.mdib.descriptions.NODETYPE.get(pm.AlertConditionDescriptor, [])
+                   + prov.mdib.descriptions.NODETYPE.get(pm.LimitAlertConditionDescriptor, []))
+    return AlertEngine.from_env(known_handles=[desc.Handle for desc in descriptors])
+
+
+def register_waveform_generators(prov: provider.SdcProvider):
+    """Drive all RealTimeSampleArray metrics with precomputed ECG or pleth samples.
+
+    The SamplePeriod of the descriptors is adjusted to the generators, so this
+    has to be called before the provider is started.
+    """
+    generators = _waveform_generators[prov] = mk_waveform_generators(prov)
+    for handle, generator in generators.items():
+        prov.mdib.descriptions.handle.get_one(handle).SamplePeriod = generator.sample_period
+        prov.waveform_provider.register_waveform_generator(handle, generator)
+
+
+def get_waveform_generators(prov: provider.SdcProvider) -> dict[str, PrecomputedWaveform]:
+    """The generators registered for prov; drivers that replace the rt sample loop write their samples."""
+    return _waveform_generators.get(prov, {})
+
+
+def write_waveform_samples(prov: provider.SdcProvider, chunks: dict[str, tuple[float, list[float]]]):
+    """Write {handle: (determination time, samples)} in one rt sample transaction."""
+    with prov.mdib.rt_sample_state_transaction() as mgr:
+        for handle, (start, samples) in chunks.items():
+            state = mgr.get_state(handle)
+            if state.MetricValue is None:
+                state.mk_metric_value()
+            state.ActivationState = pm_types.ComponentActivation.ON
+            state.MetricValue.Samples = samples
+            state.MetricValue.DeterminationTime = start
+            state.MetricValue.MetricQuality.Validity = pm_types.MeasurementValidity.VALID
+
+
 def set_reference_data(prov: provider.SdcProvider, loc: location.SdcLocation = None):
     loc = loc or get_location()
     prov.set_location(
@@ -151,12 +272,36 @@ def mk_all_services_except_localization(
     )
 
 
-def setup_logging() -> logging.LoggerAdapter:
+def use_queue_logging() -> bool:
+    return os.getenv('ref_log_queue', 'false').lower() in ('true', '1', 'yes')
+
+
+def setup_logging(queued: bool | None = None) -> logging.LoggerAdapter:
+    """Configure the sdc loggers; queued=True (default: ref_log_queue) writes from a background thread.
+
+    In queued mode the file is rotated after ref_log_max_bytes (default 10 MB)
+    keeping ref_log_backups (default 3) old files.
+    """
+    if queued is None:
+        queued = use_queue_logging()
     default_cfg = pathlib.Path(__file__).parent / 'logging_default.json'
     if default_cfg.exists():
-        logging.config.dictConfig(json.loads(default_cfg.read_bytes()))
+        config = json.loads(default_cfg.read_bytes())
+        if (log_file := os.getenv('ref_log_file')) is not None:
+            config['handlers']['file']['filename'] = log_file
+        if (tick_every := os.getenv('ref_log_tick_every')) is not None:
+            config['filters']['tick_sample']['every'] = int(tick_every)
+        if queued:
+            log_pipeline.use_batch_handlers(
+                config,
+                max_bytes=int(os.getenv('ref_log_max_bytes', str(10 * 1024 * 1024))),
+                backup_count=int(os.getenv('ref_log_backups', '3'))
+            )
+        logging.config.dictConfig(config)
     if (extra := os.getenv('ref_xtra_log_cnf')) is not None:
         logging.config.dictConfig(json.loads(pathlib.Path(extra).read_bytes()))
+    if queued:
+        log_pipeline.enqueue_handlers(logging.getLogger('sdc'))
     return LoggerAdapter(logging.getLogger('sdc'))
 
 
@@ -176,84 +321,103 @@ def generate_spo2(last_value=None):
     return decimal.Decimal(max(94, min(100, new_value)))
 
 
-def run_provider():
-    logger = setup_logging()
-    prov = None
-    wsd = None
+def mk_specific_components() -> SdcProviderComponents | None:
+    if not USE_REFERENCE_PARAMETERS:
+        return None
+    return SdcProviderComponents(
+        subscriptions_manager_class={'StateEvent': SubscriptionsManagerReferenceParamAsync},
+        services_factory=mk_all_services_except_localization
+    )
 
-    try:
-        adapter = get_network_adapter()
-        wsd = wsdiscovery.WSDiscovery(adapter.ip)
-        wsd.start()
-
-        specific_components = (
-            SdcProviderComponents(
-                subscriptions_manager_class={'StateEvent': SubscriptionsManagerReferenceParamAsync},
-                services_factory=mk_all_services_except_localization
-            ) if USE_REFERENCE_PARAMETERS else None
-        )
-
-        prov = create_reference_provider(
-            ws_discovery=wsd,
-            specific_components=specific_components
-        )
-        set_reference_data(prov, get_location())
-
-        heart_rate_metric = prov.mdib.descriptions.handle.get_one('numeric.ch0.vmd0')
-        spo2_metric      = prov.mdib.descriptions.handle.get_one('numeric.ch1.vmd0')
-        alert_condition  = prov.mdib.descriptions.handle.get_one('ac0.mds0')
-
-        with prov.mdib.metric_state_transaction() as mgr:
-            for h in (heart_rate_metric.Handle, spo2_metric.Handle):
-                state = mgr.get_state(h)
-                if not getattr(state, 'MetricValue', None):
-                    state.mk_metric_value()
-
-        logger.info("Provider gestartet. Sendet Vitalparameter (Herzfrequenz und SpO2). CTRL-C zum Beenden")
 
+def init_metric_values(prov: provider.SdcProvider, handles):
+    """Make sure the given metric states have a MetricValue."""
+    with prov.mdib.metric_state_transaction() as mgr:
+        for h in handles:
+            state = mgr.get_state(h)
+            if not getattr(state, 'MetricValue', None):
+                state.mk_metric_value()
+
+
+def start_reference_provider(
+    ws_discovery: wsdiscovery.WSDiscovery,
+    epr: uuid.UUID | None = None,
+    loc: location.SdcLocation | None = None,
+    start_rtsample_loop: bool = True,
+    timings: StartupTimings | None = None
+) -> provider.SdcProvider:
+    """Start a reference provider with reference data and initialized vital signs."""
+    prov = create_reference_provider(
+        ws_discovery=ws_discovery,
+        mdib_path=get_mdib_path(),
+        epr=epr,
+        specific_components=mk_specific_components(),
+        start_rtsample_loop=start_rtsample_loop,
+        timings=timings
+    )
+    try:
+        set_reference_data(prov, loc or get_location())
+        init_metric_values(prov, (HEART_RATE_HANDLE, SPO2_HANDLE))
     except Exception:
-        logger.exception("Fehler beim Start des Providers – breche ab")
-        if prov:
-            prov.stop_all()
-        if wsd:
-            wsd.stop()
-        return
+        prov.stop_all()
+        raise
+    return prov
+
+
+class ProviderHandle:
+    """Readiness and stop handle of a provider running in run_provider or a ProviderRunner.
+
+    ready resolves with the SdcProvider once the HTTP server runs, the device is
+    announced via discovery and the first tick is in the MDIB, or with the
+    exception that made the start fail. stopped is set when the run has ended.
+    """
+
+    def __init__(self):
+        self.ready: futures.Future[provider.SdcProvider] = futures.Future()
+        self.stopped = threading.Event()
+        self._stop_requested = threading.Event()
+
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop_requested.is_set()
+
+    def wait_ready(self, timeout: float | None = None) -> provider.SdcProvider:
+        """Block until the provider is ready; raises TimeoutError or the start error."""
+        return self.ready.result(timeout)
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Request the tick loop to end and wait until the provider is stopped."""
+        self._stop_requested.set()
+        return self.stopped.wait(timeout)
 
-    current_hr   = generate_heart_rate()
-    current_spo2 = generate_spo2()
+
+def get_run_budget() -> tuple[float | None, int | None]:
+    """Get (duration in seconds, tick count) from ref_run_duration / ref_max_ticks; None = unlimited."""
+    duration = os.getenv('ref_run_duration')
+    max_ticks = os.getenv('ref_max_ticks')
+    return (float(duration) if duration else None), (int(max_ticks) if max_ticks else None)
+
+
+@profiling.profile_entry('provider')
+def run_provider(handle: ProviderHandle | None = None):
+    """Run the reference provider until CTRL-C, handle.stop() or the run budget is used up."""
+    from provider_metrics import MetricsServer, ProviderMetrics, get_metrics_host, get_metrics_port
+    from provider_runner import ProviderRunner
+
+    logger = setup_logging()
+    duration, max_ticks = get_run_budget()
+    metrics = metrics_server = None
+    if (port := get_metrics_port()) is not None:
+        metrics = ProviderMetrics()
+        metrics_server = MetricsServer(metrics, get_metrics_host(), port)
+        metrics_server.start()
+        logger.info("Metriken unter %s", metrics_server.url)
+    runner = ProviderRunner(duration=duration, max_ticks=max_ticks, handle=handle, metrics=metrics, logger=logger)
     try:
-        while True:
-            try:
-                with prov.mdib.metric_state_transaction() as mgr:
-                    current_hr = generate_heart_rate(current_hr)
-                    hr_state   = mgr.get_state(heart_rate_metric.Handle)
-                    hr_state.MetricValue.Value = current_hr
-                    logger.info(f"Herzfrequenz aktualisiert: {current_hr}")
-
-                with prov.mdib.metric_state_transaction() as mgr:
-                    current_spo2 = generate_spo2(current_spo2)
-                    sp_state     = mgr.get_state(spo2_metric.Handle)
-                    sp_state.MetricValue.Value = current_spo2
-                    logger.info(f"SpO2 aktualisiert: {current_spo2}")
-
-            except Exception:
-                logger.error(traceback.format_exc())
-
-            try:
-                with prov.mdib.alert_state_transaction() as mgr:
-                    state = mgr.get_state(alert_condition.Handle)
-                    alarm = (current_hr > 95 or current_hr < 55 or current_spo2 < 95)
-                    state.Presence = alarm
-                    logger.info(f"Alarm gesetzt: {alarm}")
-            except Exception:
-                logger.error(traceback.format_exc())
-
-            time.sleep(0.0001)
-
-    except KeyboardInterrupt:
-        logger.info("Provider wird gestoppt (KeyboardInterrupt)")
+        runner.run()
+    except Exception:
+        logger.exception("Fehler beim Start des Providers – breche ab")
     finally:
-        if prov:
-            prov.stop_all()
-        if wsd:
-            wsd.stop()
\ No newline at end of file
+        if metrics_server:
+            metrics_server.stop()
+        log_pipeline.stop_queue_logging()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Replay provider: plays a recorded session into the reference provider.
+
+Sources are read as a stream, one report or line at a time:
+  - a commlog directory written by reference_consumer.setup_commlog; every
+    EpisodicMetricReport / EpisodicAlertReport file becomes one tick
+  - a compact metric stream, one "time;handle;value" line per state, where
+    time is in seconds and consecutive lines with the same time form a tick
+
+Playback speed: --speed 1 is real time, N is N times faster, 0 is as fast as
+possible. A commlog directory can be converted to the compact format with
+--convert OUT.
+"""
+from __future__ import annotations
+
+# Import setup_path to add system Python's site-packages to the path
+import setup_path
+
+import argparse
+import dataclasses
+import decimal
+import os
+import pathlib
+import sys
+import time
+import traceback
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator
+
+import reference_provider
+from sdc11073 import wsdiscovery
+
+from tick_engine import TickEngine
+
+_REPORTS = ('EpisodicMetricReport', 'EpisodicAlertReport')
+
+
+@dataclasses.dataclass
+class ReplayTick:
+    """All states of one recorded report (or one timestamp of a compact stream)."""
+    t: float
+    metrics: list[tuple[str, str]] = dataclasses.field(default_factory=list)
+    alerts: list[tuple[str, bool]] = dataclasses.field(default_factory=list)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _ms_to_s(value: str | None) -> float | None:
+    return int(value) / 1000.0 if value else None
+
+
+def read_commlog_report(path: pathlib.Path) -> ReplayTick | None:
+    """Parse one commlog file; returns None if it does not contain an episodic report."""
+    tick = ReplayTick(t=0.0)
+    times = []
+    body_seen = False
+    checked = False
+    for event, elem in ET.iterparse(str(path), events=('start', 'end')):
+        name = _local(elem.tag)
+        if event == 'start':
+            if name == 'Body':
+                body_seen = True
+            elif body_seen and not checked:
+                # first element of the body decides, everything else is skipped unparsed
+                if name not in _REPORTS:
+                    return None
+                checked = True
+            continue
+        if name == 'MetricState':
+            value = next((c for c in elem if _local(c.tag) == 'MetricValue'), None)
+            if value is not None and value.get('Value') is not None:
+                tick.metrics.append((elem.get('DescriptorHandle'), value.get('Value')))
+                if (t := _ms_to_s(value.get('DeterminationTime'))) is not None:
+                    times.append(t)
+            elem.clear()
+        elif name == 'AlertState':
+            # only AlertConditionStates have a boolean Presence
+            if elem.get('Presence') in ('true', 'false'):
+                tick.alerts.append((elem.get('DescriptorHandle'), elem.get('Presence') == 'true'))
+                if (t := _ms_to_s(elem.get('DeterminationTime'))) is not None:
+                    times.append(t)
+            elem.clear()
+    if not checked:
+        return None
+    tick.t = max(times) if times else path.stat().st_mtime
+    return tick
+
+
+def read_commlog(directory: pathlib.Path) -> Iterator[ReplayTick]:
+    """Yield the recorded reports of a commlog directory in recording order."""
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.xml')),
+        key=lambda entry: (entry.stat().st_mtime, entry.name)
+    )
+    for entry in entries:
+        try:
+            tick = read_commlog_report(pathlib.Path(entry.path))
+        except ET.ParseError:
+            continue
+        if tick is not None and (tick.metrics or tick.alerts):
+            yield tick
+
+
+def read_compact(path: pathlib.Path) -> Iterator[ReplayTick]:
+    """Yield ticks of a compact "time;handle;value" stream; alert values are true/false."""
+    tick = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            t_text, handle, value = line.split(';', 2)
+            t = float(t_text)
+            if tick is None or t != tick.t:
+                if tick is not None:
+                    yield tick
+                tick = ReplayTick(t)
+            # alert or metric is resolved against the MDIB at playback time
+            tick.metrics.append((handle, value))
+    if tick is not None:
+        yield tick
+
+
+def write_compact(ticks: Iterable[ReplayTick], path: pathlib.Path) -> int:
+    """Write ticks as compact stream; returns the number of lines written."""
+    lines = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# time;handle;value\n')
+        for tick in ticks:
+            for handle, value in tick.metrics:
+                f.write(f'{tick.t:.3f};{handle};{value}\n')
+                lines += 1
+            for handle, presence in tick.alerts:
+                f.write(f'{tick.t:.3f};{handle};{"true" if presence else "false"}\n')
+                lines += 1
+    return lines
+
+
+def open_source(source: pathlib.Path) -> Iterator[ReplayTick]:
+    return read_commlog(source) if source.is_dir() else read_compact(source)
+
+
+@dataclasses.dataclass
+class ReplayStats:
+    ticks: int = 0
+    states: int = 0
+    unknown_handles: int = 0
+    late_ticks: int = 0
+
+
+class Player:
+    """Paces recorded ticks and stages them into a TickEngine."""
+
+    def __init__(self, mdib, engine, speed: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        self._mdib = mdib
+        self._engine = engine
+        self.speed = speed
+        self._clock = clock
+        self._sleep = sleep
+        self._kinds: dict[str, str | None] = {}
+        self.stats = ReplayStats()
+
+    def _kind(self, handle: str) -> str | None:
+        """'numeric', 'alert', 'metric' or None for handles not in the MDIB."""
+        if handle not in self._kinds:
+            desc = self._mdib.descriptions.handle.get_one(handle, allow_none=True)
+            if desc is None:
+                kind = None
+            elif desc.NODETYPE.localname == 'NumericMetricDescriptor':
+                kind = 'numeric'
+            elif 'AlertCondition' in desc.NODETYPE.localname:
+                kind = 'alert'
+            else:
+                kind = 'metric'
+            self._kinds[handle] = kind
+        return self._kinds[handle]
+
+    def _stage(self, tick: ReplayTick) -> None:
+        for handle, value in tick.metrics:
+            kind = self._kind(handle)
+            if kind is None:
+                self.stats.unknown_handles += 1
+            elif kind == 'alert':
+                self._engine.set_alert_presence(handle, value.lower() == 'true')
+            elif kind == 'numeric':
+                self._engine.set_metric_value(handle, decimal.Decimal(value))
+            else:
+                self._engine.set_metric_value(handle, value)
+        for handle, presence in tick.alerts:
+            if self._kind(handle) is None:
+                self.stats.unknown_handles += 1
+            else:
+                self._engine.set_alert_presence(handle, presence)
+        self.stats.states += len(tick.metrics) + len(tick.alerts)
+
+    def play(self, ticks: Iterable[ReplayTick]) -> ReplayStats:
+        start_wall = None
+        start_t = None
+        for tick in ticks:
+            if self.speed > 0:
+                if start_wall is None:
+                    start_wall, start_t = self._clock(), tick.t
+                delay = start_wall + (tick.t - start_t) / self.speed - self._clock()
+                if delay > 0:
+                    self._sleep(delay)
+                elif delay < -0.1:
+                    self.stats.late_ticks += 1
+            self._stage(tick)
+            self._engine.commit()
+            self.stats.ticks += 1
+        return self.stats
+
+
+def run_replay(source: pathlib.Path, speed: float, loop: bool):
+    logger = reference_provider.setup_logging()
+    wsd = wsdiscovery.WSDiscovery(reference_provider.get_network_adapter().ip)
+    wsd.start()
+    prov = None
+    try:
+        prov = reference_provider.start_reference_provider(wsd)
+        engine = TickEngine(prov.mdib)
+        player = Player(prov.mdib, engine, speed)
+        logger.info("Replay von %s mit Geschwindigkeit %s gestartet. CTRL-C zum Beenden",
+                    source, speed if speed > 0 else 'max')
+        while True:
+            player.play(open_source(source))
+            logger.info("Replay: %d Ticks, %d States, %d unbekannte Handles, %d verspätete Ticks",
+                        player.stats.ticks, player.stats.states,
+                        player.stats.unknown_handles, player.stats.late_ticks)
+            if not loop:
+                break
+    except KeyboardInterrupt:
+        logger.info("Replay wird gestoppt (KeyboardInterrupt)")
+    except Exception:
+        logger.error(traceback.format_exc())
+    finally:
+        if prov:
+            prov.stop_all()
+        wsd.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Spielt eine aufgezeichnete Sitzung über den Referenz-Provider ab')
+    parser.add_argument('source', type=pathlib.Path, help='Commlog-Verzeichnis oder kompakte Stream-Datei')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Abspielgeschwindigkeit: 1 = Echtzeit, N = N-fach, 0 = so schnell wie möglich')
+    parser.add_argument('--loop', action='store_true', help='Aufzeichnung endlos wiederholen')
+    parser.add_argument('--convert', type=pathlib.Path,
+                        help='Commlog nur in kompakten Stream konvertieren und beenden')
+    args = parser.parse_args()
+
+    if args.convert:
+        lines = write_compact(open_source(args.source), args.convert)
+        print(f"{lines} Zeilen nach {args.convert} geschrieben")
+        return 0
+    run_replay(args.source, args.speed, args.loop)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
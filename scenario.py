@@ -0,0 +1,231 @@
+"""Clinical scenario timelines for the reference provider.
+
+A scenario file describes trajectories of metrics over time on top of the
+random walks of reference_provider.generate_heart_rate / generate_spo2:
+
+    {
+        "duration": 600,
+        "loop": true,
+        "seed": 1,
+        "metrics": {
+            "numeric.ch0.vmd0": {
+                "base": "heart_rate",
+                "events": [
+                    {"type": "ramp", "start": 60, "ramp": 30, "delta": 50, "hold": 90, "recover": 60},
+                    {"type": "off", "start": 400, "duration": 20}
+                ]
+            }
+        }
+    }
+
+"base" is heart_rate, spo2 or a constant. A ramp moves the value by delta
+within `ramp` seconds, holds it for `hold` seconds and returns within
+`recover` seconds; overlapping ramps add up. "off" is a sensor-off period in
+which the metric has no value and its Validity is Inv. "lower" / "upper" clamp
+a metric.
+
+compile_scenario() computes all values for the provider tick interval before
+the run, and runs the alert rules over them, so the hot loop only indexes
+lists. ref_scenario names the scenario file.
+"""
+from __future__ import annotations
+
+import dataclasses
+import decimal
+import json
+import os
+import pathlib
+import random
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from sdc11073.xml_types import pm_types
+
+import reference_provider
+
+if TYPE_CHECKING:
+    from alert_engine import AlertEngine
+    from tick_engine import TickEngine
+
+BASES = {
+    'heart_rate': reference_provider.generate_heart_rate,
+    'spo2': reference_provider.generate_spo2,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Ramp:
+    start: float
+    delta: float
+    ramp: float = 0.0
+    hold: float = 0.0
+    recover: float | None = None
+
+    def offsets(self, t: np.ndarray) -> np.ndarray:
+        recover = self.ramp if self.recover is None else self.recover
+        top = self.start + self.ramp
+        end = top + self.hold
+        return np.interp(t, [self.start, top, end, end + recover], [0.0, self.delta, self.delta, 0.0],
+                         left=0.0, right=0.0)
+
+
+@dataclasses.dataclass(frozen=True)
+class SensorOff:
+    start: float
+    duration: float
+
+    def mask(self, t: np.ndarray) -> np.ndarray:
+        return (t >= self.start) & (t < self.start + self.duration)
+
+
+@dataclasses.dataclass(frozen=True)
+class MetricTrack:
+    """Trajectory of one metric."""
+    handle: str
+    base: str | float
+    ramps: tuple[Ramp, ...] = ()
+    off: tuple[SensorOff, ...] = ()
+    lower: float | None = None
+    upper: float | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class Scenario:
+    duration: float
+    tracks: tuple[MetricTrack, ...]
+    loop: bool = True
+    seed: int | None = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> Scenario:
+        tracks = []
+        for handle, fields in config['metrics'].items():
+            base = fields.get('base', 'heart_rate')
+            if isinstance(base, str) and base not in BASES:
+                raise ValueError(f'{handle}: unknown base {base!r}, expected one of {sorted(BASES)} or a number')
+            ramps, off = [], []
+            for event in fields.get('events', []):
+                event = dict(event)
+                kind = event.pop('type')
+                if kind == 'ramp':
+                    ramps.append(Ramp(**event))
+                elif kind == 'off':
+                    off.append(SensorOff(**event))
+                else:
+                    raise ValueError(f'{handle}: unknown event type {kind!r}')
+            tracks.append(MetricTrack(handle, base, tuple(ramps), tuple(off), fields.get('lower'), fields.get('upper')))
+        return cls(float(config['duration']), tuple(tracks), config.get('loop', True), config.get('seed'))
+
+    @classmethod
+    def from_env(cls) -> Scenario | None:
+        """Load the file named by ref_scenario, None if not set."""
+        path = os.getenv('ref_scenario')
+        if not path:
+            return None
+        return cls.from_config(json.loads(pathlib.Path(path).read_bytes()))
+
+    @property
+    def handles(self) -> list[str]:
+        return [track.handle for track in self.tracks]
+
+
+@dataclasses.dataclass
+class CompiledScenario:
+    """Per tick values of every metric and the alert flips they cause."""
+    interval: float
+    handles: list[str]
+    values: list[list[decimal.Decimal | None]]
+    alert_flips: dict[int, list[tuple[str, bool]]]
+    loop: bool
+
+    @property
+    def ticks(self) -> int:
+        return len(self.values[0]) if self.values else 0
+
+
+def _base_series(base: str | float, n: int) -> np.ndarray:
+    if not isinstance(base, str):
+        return np.full(n, float(base))
+    generate = BASES[base]
+    out = np.empty(n)
+    value = None
+    for i in range(n):
+        value = generate(value)
+        out[i] = float(value)
+    return out
+
+
+def compile_track(track: MetricTrack, t: np.ndarray) -> list[decimal.Decimal | None]:
+    values = _base_series(track.base, len(t))
+    for ramp in track.ramps:
+        values += ramp.offsets(t)
+    if track.lower is not None or track.upper is not None:
+        values = np.clip(values, track.lower, track.upper)
+    off = np.zeros(len(t), dtype=bool)
+    for period in track.off:
+        off |= period.mask(t)
+    ints = np.rint(values).astype(np.int64)
+    table = {v: decimal.Decimal(v) for v in set(ints.tolist())}
+    return [None if is_off else table[v] for v, is_off in zip(ints.tolist(), off.tolist())]
+
+
+def compile_scenario(scenario: Scenario, interval: float, alert_engine: AlertEngine) -> CompiledScenario:
+    """Compute the values of all ticks and run alert_engine (a fresh one) over them.
+
+    The random walks are seeded with scenario.seed, so a scenario with a seed
+    produces the same values and alarm bursts in every run.
+    """
+    n = max(1, int(round(scenario.duration / interval)))
+    t = np.arange(n) * interval
+    state = random.getstate()
+    try:
+        if scenario.seed is not None:
+            random.seed(scenario.seed)
+        values = [compile_track(track, t) for track in scenario.tracks]
+    finally:
+        random.setstate(state)
+    handles = scenario.handles
+    alert_flips = {}
+    for i in range(n):
+        flips = alert_engine.update((handle, column[i]) for handle, column in zip(handles, values)
+                                    if column[i] is not None)
+        if flips:
+            alert_flips[i] = flips
+    return CompiledScenario(interval, handles, values, alert_flips, scenario.loop)
+
+
+class ScenarioDriver:
+    """Plays a CompiledScenario, one tick per step()."""
+
+    def __init__(self, compiled: CompiledScenario):
+        self.compiled = compiled
+        self.position = 0
+        self.finished = False
+        self.latest: dict[str, Any] = {}
+        self._items = list(zip(compiled.handles, compiled.values))
+
+    def step(self, engine: TickEngine, alert_engine: AlertEngine) -> list[tuple[str, Any]]:
+        """Stage the values and alert flips of the current tick on engine.
+
+        alert_engine.presence is kept up to date for logging; the flips
+        themselves were computed by compile_scenario.
+        """
+        if self.finished:
+            return []
+        i = self.position
+        values = [(handle, column[i]) for handle, column in self._items]
+        for handle, value in values:
+            # no value while the sensor is off; the measurement is invalid until it returns
+            validity = pm_types.MeasurementValidity.INVALID if value is None else pm_types.MeasurementValidity.VALID
+            engine.set_metric_value(handle, value, validity)
+        for alert_handle, presence in self.compiled.alert_flips.get(i, ()):
+            alert_engine.presence[alert_handle] = presence
+            engine.set_alert_presence(alert_handle, presence)
+        self.latest.update(values)
+        self.position += 1
+        if self.position >= self.compiled.ticks:
+            if self.compiled.loop:
+                self.position = 0
+            else:
+                self.finished = True
+        return values
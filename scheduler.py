@@ -0,0 +1,150 @@
+"""Deadline based tick scheduling for the reference provider loop."""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import time
+from typing import Hashable
+
+
+@dataclasses.dataclass
+class SchedulerStats:
+    """Overruns and wake-up jitter of a DeadlineScheduler."""
+    ticks: int = 0
+    overruns: int = 0
+    skipped_deadlines: int = 0
+    jitter_sum: float = 0.0
+    jitter_max: float = 0.0
+    last_jitter: float = 0.0
+
+    @property
+    def jitter_avg(self) -> float:
+        return self.jitter_sum / self.ticks if self.ticks else 0.0
+
+
+class DeadlineScheduler:
+    """Wakes up at start + n * interval on the monotonic clock.
+
+    Deadlines are computed from the start time and not from the previous
+    wake-up, so sleep inaccuracies do not accumulate. If a tick runs past one
+    or more deadlines, the missed deadlines are counted as overrun and skipped
+    instead of being caught up in a burst.
+    """
+
+    def __init__(self, interval: float, clock=time.monotonic, sleep=time.sleep):
+        if interval <= 0:
+            raise ValueError(f'interval must be > 0, got {interval}')
+        self.interval = interval
+        self._clock = clock
+        self._sleep = sleep
+        self._start: float | None = None
+        self._n = 0
+        self.stats = SchedulerStats()
+
+    @property
+    def rate(self) -> float:
+        return 1.0 / self.interval
+
+    def start(self) -> None:
+        self._start = self._clock()
+        self._n = 0
+
+    def next_deadline(self) -> float:
+        if self._start is None:
+            self.start()
+        return self._start + (self._n + 1) * self.interval
+
+    def wait(self) -> float:
+        """Sleep until the next deadline and return the wake-up jitter in seconds."""
+        delay = self.next_deadline() - self._clock()
+        if delay > 0:
+            self._sleep(delay)
+        return self._account(overrun=delay <= 0)
+
+    async def wait_async(self) -> float:
+        """Like wait(), but awaits asyncio.sleep instead of blocking the thread."""
+        delay = self.next_deadline() - self._clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._account(overrun=delay <= 0)
+
+    def _account(self, overrun: bool) -> float:
+        deadline = self.next_deadline()
+        now = self._clock()
+        if overrun:
+            # tick took longer than the interval: continue with the next deadline in the future
+            missed = int((now - deadline) / self.interval)
+            self.stats.overruns += 1
+            self.stats.skipped_deadlines += missed
+            self._n += missed + 1
+            deadline += missed * self.interval
+        else:
+            self._n += 1
+        jitter = now - deadline
+        stats = self.stats
+        stats.ticks += 1
+        stats.last_jitter = jitter
+        stats.jitter_sum += jitter
+        stats.jitter_max = max(stats.jitter_max, jitter)
+        return jitter
+
+
+class TimerWheel:
+    """Hashed timing wheel for many keys with periods in whole ticks.
+
+    Every key lives in the slot of its next due tick, so advance() only looks
+    at the entries of one slot. With at least as many slots as the longest
+    period, a slot holds exactly the keys due in that tick, i.e. a tick costs
+    O(1) per due key independent of the number of scheduled keys; longer
+    periods stay correct, their entries are just visited once per round.
+    """
+
+    def __init__(self, slots: int = 1024):
+        if slots <= 0:
+            raise ValueError(f'slots must be > 0, got {slots}')
+        self._slots: list[list[tuple[int, int, Hashable]]] = [[] for _ in range(slots)]
+        self.tick = 0
+        self.size = 0
+
+    @property
+    def slots(self) -> int:
+        return len(self._slots)
+
+    @classmethod
+    def for_periods(cls, periods, max_slots: int = 4096) -> TimerWheel:
+        """Create a wheel with the next power of two >= the longest period as slot count."""
+        longest = max(periods, default=1)
+        slots = 1
+        while slots < min(longest, max_slots):
+            slots *= 2
+        return cls(slots)
+
+    def schedule(self, key: Hashable, period: int, offset: int = 0) -> None:
+        """Make key due every period ticks, first in offset ticks from now."""
+        if period <= 0:
+            raise ValueError(f'period must be > 0, got {period}')
+        due = self.tick + offset
+        self._slots[due % len(self._slots)].append((due, period, key))
+        self.size += 1
+
+    def advance(self) -> list[Hashable]:
+        """Return the keys due in the current tick and move to the next tick."""
+        slots = self._slots
+        index = self.tick % len(slots)
+        entries = slots[index]
+        due_keys = []
+        if entries:
+            waiting = []
+            rescheduled = []
+            for entry in entries:
+                due, period, key = entry
+                if due > self.tick:
+                    waiting.append(entry)
+                    continue
+                due_keys.append(key)
+                rescheduled.append((due + period, period, key))
+            slots[index] = waiting
+            for entry in rescheduled:
+                slots[entry[0] % len(slots)].append(entry)
+        self.tick += 1
+        return due_keys
@@ -0,0 +1,158 @@
+"""Block based random walk generator for simulated numeric metrics.
+
+All walks of a generator are advanced together with NumPy, a block of ticks
+at a time. The integer results are mapped to Decimal objects through a lookup
+table that is built once, so handing out the values of a tick neither calls
+the RNG nor constructs Decimal objects.
+"""
+from __future__ import annotations
+
+import dataclasses
+import decimal
+import os
+from typing import Sequence
+
+import numpy as np
+
+
+@dataclasses.dataclass(frozen=True)
+class WalkSpec:
+    """Bounded integer random walk of one metric."""
+    handle: str
+    start_low: int
+    start_high: int
+    max_step: int
+    lower: int
+    upper: int
+
+
+def heart_rate_spec(handle: str) -> WalkSpec:
+    """Same walk as reference_provider.generate_heart_rate."""
+    return WalkSpec(handle, start_low=60, start_high=90, max_step=3, lower=50, upper=100)
+
+
+def spo2_spec(handle: str) -> WalkSpec:
+    """Same walk as reference_provider.generate_spo2."""
+    return WalkSpec(handle, start_low=96, start_high=99, max_step=1, lower=94, upper=100)
+
+
+def get_seed() -> int | None:
+    """Get RNG seed from environment or None for a random seed."""
+    if (seed := os.getenv('ref_seed')) is not None:
+        return int(seed)
+    return None
+
+
+class SignalGenerator:
+    """Precomputes bounded random walks of many metrics for many ticks."""
+
+    def __init__(self, specs: Sequence[WalkSpec], block_size: int = 1024, seed: int | None = None):
+        if not specs:
+            raise ValueError('at least one WalkSpec is required')
+        self.handles = [spec.handle for spec in specs]
+        self.block_size = block_size
+        self._rng = np.random.default_rng(seed)
+        self._max_step = np.array([s.max_step for s in specs], dtype=np.int64)
+        self._lower = np.array([s.lower for s in specs], dtype=np.int64)
+        self._upper = np.array([s.upper for s in specs], dtype=np.int64)
+        self._current = self._rng.integers(
+            [s.start_low for s in specs], np.array([s.start_high for s in specs]) + 1
+        ).astype(np.int64)
+        self._offset = int(self._lower.min())
+        self._decimals = [decimal.Decimal(v) for v in range(self._offset, int(self._upper.max()) + 1)]
+        self._block: list[list[decimal.Decimal]] = []
+        self._pos = 0
+        # the first tick hands out the start values, like generate_*() without last_value
+        self._pending_start = True
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def _compute_block(self) -> np.ndarray:
+        ticks, count = self.block_size, len(self.handles)
+        steps = self._rng.integers(-self._max_step, self._max_step + 1, size=(ticks, count))
+        out = np.empty((ticks, count), dtype=np.int64)
+        current = self._current
+        if self._pending_start:
+            # row 0 is the start value itself
+            steps[0] = 0
+            self._pending_start = False
+        for tick in range(ticks):
+            current += steps[tick]
+            np.clip(current, self._lower, self._upper, out=current)
+            out[tick] = current
+        return out
+
+    def _refill(self) -> None:
+        table = self._decimals
+        offset = self._offset
+        self._block = [[table[v - offset] for v in row] for row in self._compute_block().tolist()]
+        self._pos = 0
+
+    def next_values(self) -> list[decimal.Decimal]:
+        """Return the values of the next tick, ordered like self.handles."""
+        if self._pos >= len(self._block):
+            self._refill()
+        values = self._block[self._pos]
+        self._pos += 1
+        return values
+
+    def next_items(self) -> zip:
+        """Return (handle, value) pairs of the next tick."""
+        return zip(self.handles, self.next_values())
+
+
+class IndexedWalks:
+    """Bounded random walks of many metrics that are advanced individually.
+
+    Unlike SignalGenerator, only the walks passed to step() move, so metrics
+    with different update rates cost nothing between their updates. Every walk
+    draws its steps a block at a time and refills the block after block_size
+    updates, so a step neither calls the RNG nor touches NumPy.
+    """
+
+    def __init__(self, specs: Sequence[WalkSpec], block_size: int = 1024, seed: int | None = None):
+        if not specs:
+            raise ValueError('at least one WalkSpec is required')
+        self.handles = [spec.handle for spec in specs]
+        self.index = {handle: i for i, handle in enumerate(self.handles)}
+        self.block_size = block_size
+        self._rng = np.random.default_rng(seed)
+        self._max_step = [s.max_step for s in specs]
+        self._lower = [s.lower for s in specs]
+        self._upper = [s.upper for s in specs]
+        self._current = self._rng.integers(
+            [s.start_low for s in specs], np.array([s.start_high for s in specs]) + 1
+        ).tolist()
+        self._offset = min(self._lower)
+        self._decimals = [decimal.Decimal(v) for v in range(self._offset, max(self._upper) + 1)]
+        self._steps: list[list[int]] = [[] for _ in specs]
+        self._pos = [0] * len(specs)
+        # the first step of a walk hands out its start value
+        self._started = [False] * len(specs)
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def _refill(self, i: int) -> None:
+        max_step = self._max_step[i]
+        self._steps[i] = self._rng.integers(-max_step, max_step + 1, size=self.block_size).tolist()
+        self._pos[i] = 0
+
+    def step(self, indices: Sequence[int]) -> list[decimal.Decimal]:
+        """Advance the walks with the given indices and return their new values."""
+        table = self._decimals
+        offset = self._offset
+        current = self._current
+        values = []
+        for i in indices:
+            if self._started[i]:
+                if self._pos[i] >= len(self._steps[i]):
+                    self._refill(i)
+                step = self._steps[i][self._pos[i]]
+                self._pos[i] += 1
+                current[i] = min(max(current[i] + step, self._lower[i]), self._upper[i])
+            else:
+                self._started[i] = True
+            values.append(table[current[i] - offset])
+        return values
@@ -0,0 +1,54 @@
+"""Per-subscription notification counters of a running provider.
+
+The subscriptions managers of sdc11073 look up the subscriptions of every
+notification with _get_subscriptions_for_action; wrapping that lookup counts
+each report once per subscription it is sent to, without touching the send
+path itself.
+"""
+from __future__ import annotations
+
+import collections
+import threading
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from sdc11073.provider import SdcProvider
+
+
+def subscription_managers(prov: SdcProvider) -> list[Any]:
+    return list(getattr(prov, '_subscriptions_managers', {}).values())
+
+
+def subscription_key(subscription: Any) -> str:
+    """Readable, stable name of a subscription: notify-to address plus identifier."""
+    address = getattr(subscription, 'notify_to_address', None) or '?'
+    identifier = getattr(subscription, 'identifier_uuid', None) or id(subscription)
+    return f'{address}#{identifier}'
+
+
+class SubscriptionCounter:
+    """Counts the reports sent to every subscription of one provider."""
+
+    def __init__(self, prov: SdcProvider):
+        self._lock = threading.Lock()
+        self.reports: collections.Counter[str] = collections.Counter()
+        for manager in subscription_managers(prov):
+            self._instrument(manager)
+
+    def _instrument(self, manager: Any) -> None:
+        original = getattr(manager, '_get_subscriptions_for_action', None)
+        if original is None:
+            return
+
+        def get_subscriptions_for_action(*args, **kwargs):
+            subscriptions = original(*args, **kwargs)
+            with self._lock:
+                for subscription in subscriptions:
+                    self.reports[subscription_key(subscription)] += 1
+            return subscriptions
+
+        manager._get_subscriptions_for_action = get_subscriptions_for_action
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.reports)
@@ -0,0 +1,5 @@
+"""Make the top-level modules of the prototype importable from the tests."""
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
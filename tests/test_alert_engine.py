@@ -0,0 +1,67 @@
+import json
+
+from alert_engine import DEFAULT_CONFIG_PATH, AlertEngine, AlertRule, Limit
+
+HR = 'numeric.ch0.vmd0'
+SPO2 = 'numeric.ch1.vmd0'
+
+
+def mk_engine(latching=False):
+    return AlertEngine([AlertRule('ac', {HR: Limit(lower=55, upper=95)}, hysteresis=1, latching=latching)])
+
+
+def test_flip_is_reported_once():
+    engine = mk_engine()
+    assert engine.update([(HR, 70)]) == [('ac', False)]
+    assert engine.update([(HR, 96)]) == [('ac', True)]
+    assert engine.update([(HR, 97)]) == []
+    assert engine.presence == {'ac': True}
+
+
+def test_hysteresis_delays_the_clear():
+    engine = mk_engine()
+    engine.update([(HR, 96)])
+    assert engine.update([(HR, 95)]) == []
+    assert engine.update([(HR, 94.5)]) == []
+    assert engine.update([(HR, 94)]) == [('ac', False)]
+    # entering the violation is not affected by the hysteresis
+    assert engine.update([(HR, 95)]) == []
+    assert engine.update([(HR, 54)]) == [('ac', True)]
+    assert engine.update([(HR, 56)]) == [('ac', False)]
+
+
+def test_latching_condition_stays_until_reset():
+    engine = mk_engine(latching=True)
+    engine.update([(HR, 100)])
+    assert engine.update([(HR, 70)]) == []
+    assert engine.presence['ac'] is True
+    assert engine.reset('ac') == [('ac', False)]
+    assert engine.reset('ac') == []
+
+
+def test_reset_keeps_a_condition_that_is_still_violated():
+    engine = mk_engine(latching=True)
+    engine.update([(HR, 100)])
+    assert engine.reset('ac') == []
+    assert engine.presence['ac'] is True
+
+
+def test_unchanged_and_unknown_sources_are_not_evaluated():
+    engine = mk_engine()
+    engine.update([(HR, 70)])
+    engine.update([(HR, 70), ('numeric.other', 1)])
+    assert engine.evaluations == 1
+
+
+def test_any_violated_limit_makes_the_condition_present():
+    engine = AlertEngine([AlertRule('ac', {HR: Limit(upper=95), SPO2: Limit(lower=90)})])
+    assert engine.update([(HR, 100), (SPO2, 98)]) == [('ac', True)]
+    assert engine.update([(HR, 70)]) == [('ac', False)]
+    assert engine.update([(SPO2, 85)]) == [('ac', True)]
+
+
+def test_from_config_drops_rules_of_unknown_handles():
+    config = json.loads(DEFAULT_CONFIG_PATH.read_bytes())
+    engine = AlertEngine.from_config(config, known_handles=['ac0.mds0'])
+    assert set(engine.rules) == {'ac0.mds0'}
+    assert engine.sources == {HR, SPO2}
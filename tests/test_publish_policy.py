@@ -0,0 +1,126 @@
+import pytest
+
+from publish_policy import DEFAULT_CONFIG_PATH, PublishFilter, PublishPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def offer(publish_filter, handle, value):
+    """should_publish followed by published(), like a successful TickEngine commit."""
+    if publish_filter.should_publish(handle, value):
+        publish_filter.published(handle, value)
+        return True
+    return False
+
+
+@pytest.mark.parametrize('policy, last, value, expected', [
+    (PublishPolicy(abs_deadband=0.5), 70, 70.5, False),
+    (PublishPolicy(abs_deadband=0.5), 70, 70.6, True),
+    (PublishPolicy(rel_deadband=0.01), 100, 101, False),
+    (PublishPolicy(rel_deadband=0.01), 100, 98.9, True),
+    (PublishPolicy(), 70, 70, False),
+    (PublishPolicy(), 'a', 'b', True),
+    # a flipped Presence is never swallowed by a numeric dead-band
+    (PublishPolicy(abs_deadband=5), False, True, True),
+])
+def test_deadband(policy, last, value, expected):
+    assert policy.exceeds_deadband(value, last) is expected
+
+
+def test_slow_drift_is_compared_with_the_last_published_value():
+    publish_filter = PublishFilter(PublishPolicy(abs_deadband=1.0), clock=FakeClock())
+    published = [v for v in (70, 70.5, 70.9, 71.2, 71.5) if offer(publish_filter, 'h', v)]
+    assert published == [70, 71.2]
+    assert publish_filter.stats.suppressed == 3
+
+
+def test_value_counts_as_published_only_after_published():
+    publish_filter = PublishFilter(clock=FakeClock())
+    assert publish_filter.should_publish('h', 1)
+    # the commit failed, so the same value is still new
+    assert publish_filter.should_publish('h', 1)
+    publish_filter.published('h', 1)
+    assert not publish_filter.should_publish('h', 1)
+
+
+def test_min_interval_rate_limits():
+    clock = FakeClock()
+    publish_filter = PublishFilter(PublishPolicy(min_interval=1.0), clock=clock)
+    assert offer(publish_filter, 'h', 1)
+    clock.now = 0.5
+    assert not offer(publish_filter, 'h', 2)
+    clock.now = 1.0
+    assert offer(publish_filter, 'h', 2)
+
+
+def test_heartbeats_are_due_in_order_and_only_for_the_latest_publish():
+    clock = FakeClock()
+    publish_filter = PublishFilter(PublishPolicy(max_interval=5.0), {'b': PublishPolicy(max_interval=2.0)},
+                                   clock=clock)
+    offer(publish_filter, 'a', 1)
+    offer(publish_filter, 'b', 1)
+    clock.now = 1.0
+    offer(publish_filter, 'a', 2)
+    assert publish_filter.heartbeats_due() == []
+    clock.now = 2.0
+    assert publish_filter.heartbeats_due() == [('b', 1)]
+    clock.now = 5.5
+    # the heartbeat of the first publish of a was superseded by the second one
+    assert publish_filter.heartbeats_due() == []
+    clock.now = 6.0
+    assert publish_filter.heartbeats_due() == [('a', 2)]
+    assert publish_filter.heartbeats_due() == []
+
+
+def test_heartbeats_of_other_handles_stay_pending():
+    clock = FakeClock()
+    publish_filter = PublishFilter(PublishPolicy(max_interval=1.0), clock=clock)
+    offer(publish_filter, 'metric', 70)
+    offer(publish_filter, 'alert', True)
+    clock.now = 1.0
+    assert publish_filter.heartbeats_due({'metric'}) == [('metric', 70)]
+    assert publish_filter.heartbeats_due({'metric'}) == []
+    assert publish_filter.heartbeats_due({'alert'}) == [('alert', True)]
+
+
+def test_unchanged_value_is_republished_as_heartbeat():
+    clock = FakeClock()
+    publish_filter = PublishFilter(PublishPolicy(max_interval=5.0), clock=clock)
+    offer(publish_filter, 'h', 1)
+    clock.now = 4.0
+    assert not offer(publish_filter, 'h', 1)
+    clock.now = 5.0
+    assert offer(publish_filter, 'h', 1)
+    assert publish_filter.stats.heartbeats == 1
+
+
+def test_forget_forces_the_next_publish():
+    publish_filter = PublishFilter(clock=FakeClock())
+    offer(publish_filter, 'a', 1)
+    offer(publish_filter, 'b', 1)
+    publish_filter.forget('a')
+    assert publish_filter.should_publish('a', 1)
+    assert not publish_filter.should_publish('b', 1)
+    publish_filter.forget()
+    assert publish_filter.should_publish('b', 1)
+
+
+def test_copy_shares_the_policies_but_not_the_state():
+    publish_filter = PublishFilter.from_config({'default': {'abs_deadband': 1.0},
+                                                'handles': {'h': {'max_interval': 3.0}}})
+    offer(publish_filter, 'h', 1)
+    copy = publish_filter.copy()
+    assert copy.policy('h') == PublishPolicy(abs_deadband=1.0, max_interval=3.0)
+    assert copy.should_publish('h', 1)
+
+
+def test_default_config_loads(monkeypatch):
+    monkeypatch.delenv('ref_publish_policy', raising=False)
+    assert DEFAULT_CONFIG_PATH.exists()
+    assert PublishFilter.from_env().policy('numeric.ch0.vmd0').abs_deadband == 1
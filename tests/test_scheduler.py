@@ -0,0 +1,102 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from scheduler import DeadlineScheduler, TimerWheel
+
+
+class FakeTime:
+    """Monotonic clock whose sleep() advances it, with an optional oversleep."""
+
+    def __init__(self, oversleep=0.0):
+        self.now = 100.0
+        self.oversleep = oversleep
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay + self.oversleep
+
+
+def test_deadlines_do_not_accumulate_sleep_errors():
+    fake = FakeTime(oversleep=0.002)
+    scheduler = DeadlineScheduler(0.1, clock=fake.clock, sleep=fake.sleep)
+    for _ in range(10):
+        jitter = scheduler.wait()
+        assert jitter == pytest.approx(0.002)
+    # each sleep shortens by the previous oversleep instead of drifting
+    assert fake.sleeps[1:] == pytest.approx([0.098] * 9)
+    assert fake.now == pytest.approx(101.002)
+    assert scheduler.stats.overruns == 0
+    assert scheduler.stats.jitter_avg == pytest.approx(0.002)
+
+
+def test_overrun_skips_missed_deadlines():
+    fake = FakeTime()
+    scheduler = DeadlineScheduler(0.1, clock=fake.clock, sleep=fake.sleep)
+    scheduler.wait()
+    fake.now += 0.35  # the tick took 3.5 intervals
+    scheduler.wait()
+    assert scheduler.stats.overruns == 1
+    assert scheduler.stats.skipped_deadlines == 2
+    assert scheduler.stats.last_jitter == pytest.approx(0.05)
+    scheduler.wait()
+    assert fake.now == pytest.approx(100.5)
+    assert scheduler.stats.ticks == 3
+
+
+def test_wait_async_uses_the_same_deadlines():
+    fake = FakeTime()
+    scheduler = DeadlineScheduler(0.1, clock=fake.clock, sleep=fake.sleep)
+    scheduler.start()
+    fake.now += 0.35
+    assert asyncio.run(scheduler.wait_async()) == pytest.approx(0.05)
+    assert scheduler.next_deadline() == pytest.approx(100.4)
+    assert scheduler.rate == pytest.approx(10.0)
+
+
+def test_interval_must_be_positive():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(0)
+
+
+def test_wheel_returns_keys_at_their_periods_and_offsets():
+    wheel = TimerWheel(8)
+    wheel.schedule('every', 1)
+    wheel.schedule('third', 3, offset=1)
+    wheel.schedule('long', 20, offset=2)
+    due = [wheel.advance() for _ in range(25)]
+    assert [tick for tick, keys in enumerate(due) if 'every' in keys] == list(range(25))
+    assert [tick for tick, keys in enumerate(due) if 'third' in keys] == list(range(1, 25, 3))
+    # periods longer than the wheel wait for their round
+    assert [tick for tick, keys in enumerate(due) if 'long' in keys] == [2, 22]
+    assert wheel.size == 3
+
+
+def test_wheel_keeps_schedule_order_within_a_tick():
+    wheel = TimerWheel(4)
+    for key in 'abc':
+        wheel.schedule(key, 2)
+    assert wheel.advance() == ['a', 'b', 'c']
+    assert wheel.advance() == []
+    assert wheel.advance() == ['a', 'b', 'c']
+
+
+def test_wheel_counts_match_the_rates():
+    wheel = TimerWheel.for_periods([1, 5, 50])
+    assert wheel.slots == 64
+    for period in (1, 5, 50):
+        wheel.schedule(period, period, offset=period - 1)
+    counts = Counter(key for _ in range(1000) for key in wheel.advance())
+    assert counts == {1: 1000, 5: 200, 50: 20}
+
+
+def test_for_periods_caps_the_slot_count():
+    assert TimerWheel.for_periods([10_000], max_slots=256).slots == 256
+    assert TimerWheel.for_periods([]).slots == 1
+    with pytest.raises(ValueError):
+        TimerWheel(4).schedule('k', 0)
@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from signal_generator import IndexedWalks, SignalGenerator, WalkSpec, heart_rate_spec, spo2_spec  # noqa: E402
+
+SPECS = [heart_rate_spec('hr'), spo2_spec('spo2')]
+
+
+def run(generator, ticks):
+    return [generator.next_values() for _ in range(ticks)]
+
+
+def test_same_seed_gives_the_same_values_across_blocks():
+    a = run(SignalGenerator(SPECS, block_size=16, seed=7), 100)
+    b = run(SignalGenerator(SPECS, block_size=16, seed=7), 100)
+    assert a == b
+    assert a != run(SignalGenerator(SPECS, block_size=16, seed=8), 100)
+
+
+def test_walks_stay_within_bounds_and_steps():
+    values = run(SignalGenerator(SPECS, block_size=64, seed=1), 500)
+    for column, spec in zip(zip(*values), SPECS):
+        assert spec.start_low <= column[0] <= spec.start_high
+        assert all(spec.lower <= v <= spec.upper for v in column)
+        assert all(abs(b - a) <= spec.max_step for a, b in zip(column, column[1:]))
+
+
+def test_next_items_pairs_handles_with_values():
+    generator = SignalGenerator(SPECS, seed=3)
+    items = dict(generator.next_items())
+    assert list(items) == ['hr', 'spo2']
+    assert len(generator) == 2
+
+
+def test_specs_are_required():
+    with pytest.raises(ValueError):
+        SignalGenerator([])
+    with pytest.raises(ValueError):
+        IndexedWalks([])
+
+
+def test_indexed_walks_only_move_the_stepped_walks():
+    walks = IndexedWalks(SPECS, block_size=8, seed=5)
+    hr, spo2 = walks.index['hr'], walks.index['spo2']
+    spo2_start = walks.step([spo2])[0]
+    hr_values = [walks.step([hr])[0] for _ in range(50)]
+    # spo2 continues from its start value, however often hr moved
+    replay = IndexedWalks(SPECS, block_size=8, seed=5)
+    assert replay.step([spo2])[0] == spo2_start
+    assert [replay.step([hr])[0] for _ in range(50)] == hr_values
+    assert walks.step([spo2]) == replay.step([spo2])
+
+
+def test_indexed_walks_are_deterministic_and_bounded():
+    spec = WalkSpec('x', start_low=10, start_high=10, max_step=5, lower=0, upper=20)
+    a = IndexedWalks([spec], block_size=4, seed=11)
+    b = IndexedWalks([spec], block_size=4, seed=11)
+    values = [a.step([0])[0] for _ in range(200)]
+    assert values == [b.step([0])[0] for _ in range(200)]
+    assert values[0] == 10
+    assert all(0 <= v <= 20 for v in values)
@@ -0,0 +1,113 @@
+import contextlib
+import types
+
+import pytest
+
+from publish_policy import PublishFilter, PublishPolicy
+from tick_engine import TickEngine
+
+METRIC = 'numeric.ch0.vmd0'
+ALERT = 'ac0.mds0'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeState:
+    def __init__(self):
+        self.MetricValue = None
+        self.Presence = False
+
+    def mk_metric_value(self):
+        self.MetricValue = types.SimpleNamespace(Value=None, MetricQuality=types.SimpleNamespace(Validity='Vld'))
+
+
+class FakeMdib:
+    """Only knows metric states in metric transactions and alert states in alert transactions."""
+
+    def __init__(self, metric_handles=(METRIC,), alert_handles=(ALERT,)):
+        self.metric_states = {handle: FakeState() for handle in metric_handles}
+        self.alert_states = {handle: FakeState() for handle in alert_handles}
+        self.transactions = []
+
+    @contextlib.contextmanager
+    def _transaction(self, kind, states):
+        self.transactions.append(kind)
+        yield types.SimpleNamespace(get_state=states.__getitem__)
+
+    def metric_state_transaction(self):
+        return self._transaction('metric', self.metric_states)
+
+    def alert_state_transaction(self):
+        return self._transaction('alert', self.alert_states)
+
+
+def test_commit_batches_one_transaction_per_kind():
+    mdib = FakeMdib(metric_handles=(METRIC, 'numeric.ch1.vmd0'))
+    engine = TickEngine(mdib)
+    engine.set_metric_value(METRIC, 70)
+    engine.set_metric_value(METRIC, 71)
+    engine.set_metric_value('numeric.ch1.vmd0', 98)
+    engine.set_alert_presence(ALERT, True)
+    stats = engine.commit()
+    assert mdib.transactions == ['metric', 'alert']
+    assert (stats.transactions, stats.metric_states, stats.alert_states) == (2, 2, 1)
+    assert mdib.metric_states[METRIC].MetricValue.Value == 71
+    assert mdib.alert_states[ALERT].Presence is True
+    assert not engine.pending
+
+
+def test_shared_filter_routes_heartbeats_to_the_owning_engine():
+    clock = FakeClock()
+    publish_filter = PublishFilter(PublishPolicy(max_interval=5.0), clock=clock)
+    mdib = FakeMdib()
+    vitals = TickEngine(mdib, publish_filter)
+    alerts = TickEngine(mdib, publish_filter)
+    vitals.set_metric_value(METRIC, 70)
+    alerts.set_alert_presence(ALERT, True)
+    vitals.commit()
+    alerts.commit()
+
+    clock.now = 6.0
+    mdib.transactions.clear()
+    # a metric transaction asked for the alert state would raise KeyError here
+    stats = vitals.commit()
+    assert mdib.transactions == ['metric']
+    assert stats.metric_states == 1
+    stats = alerts.commit()
+    assert mdib.transactions == ['metric', 'alert']
+    assert stats.alert_states == 1
+    assert publish_filter.stats.heartbeats == 2
+
+
+def test_failed_transaction_is_retried_once():
+    mdib = FakeMdib()
+    publish_filter = PublishFilter()
+    engine = TickEngine(mdib, publish_filter)
+    engine.set_metric_value('unknown.handle', 1)
+    with pytest.raises(KeyError):
+        engine.commit()
+    assert engine.pending
+    with pytest.raises(KeyError):
+        engine.commit()
+    assert not engine.pending
+    assert publish_filter.stats.published == 0
+
+
+def test_validity_is_only_written_when_staged():
+    mdib = FakeMdib()
+    engine = TickEngine(mdib, PublishFilter())
+    engine.set_metric_value(METRIC, None, 'Inv')
+    engine.commit()
+    assert mdib.metric_states[METRIC].MetricValue.MetricQuality.Validity == 'Inv'
+    engine.set_metric_value(METRIC, None, 'Inv')
+    assert not engine.pending
+    engine.set_metric_value(METRIC, 70, 'Vld')
+    engine.commit()
+    assert mdib.metric_states[METRIC].MetricValue.Value == 70
+    assert mdib.metric_states[METRIC].MetricValue.MetricQuality.Validity == 'Vld'
@@ -0,0 +1,69 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from update_store import HandleBuffer, UpdateStore  # noqa: E402
+
+
+def test_snapshot_is_oldest_first_after_wraparound():
+    buffer = HandleBuffer(4)
+    for i in range(10):
+        buffer.append(float(i), i, version=100 + i)
+    times, values, versions = buffer.snapshot()
+    assert times.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert values.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert versions.tolist() == [106, 107, 108, 109]
+    assert (buffer.count, buffer.retained) == (10, 4)
+
+
+def test_snapshot_before_the_buffer_is_full():
+    buffer = HandleBuffer(4)
+    buffer.append(1.0, 5)
+    buffer.append(2.0, 6)
+    times, values, versions = buffer.snapshot()
+    assert times.tolist() == [1.0, 2.0]
+    assert versions.tolist() == [-1, -1]
+
+
+def test_snapshot_at_exact_capacity():
+    buffer = HandleBuffer(3)
+    for i in range(3):
+        buffer.append(float(i), i)
+    assert buffer.snapshot()[0].tolist() == [0.0, 1.0, 2.0]
+
+
+def test_counters_cover_all_updates_not_only_the_retained_ones():
+    buffer = HandleBuffer(2)
+    for t, value in [(0.0, 10), (0.5, 30), (0.5, 20), (2.0, 'text')]:
+        buffer.append(t, value)
+    assert (buffer.value_min, buffer.value_max, buffer.value_mean) == (10.0, 30.0, 20.0)
+    # equal timestamps of one report are not an interval
+    assert buffer.intervals == 2
+    assert (buffer.interval_min, buffer.interval_max) == (0.5, 1.5)
+    assert buffer.rate() == pytest.approx(1.5)
+    assert buffer.last_value == 'text'
+    assert math.isnan(buffer.snapshot()[1][-1])
+
+
+def test_presence_is_stored_as_number():
+    buffer = HandleBuffer(2)
+    buffer.append(0.0, True)
+    buffer.append(1.0, False)
+    assert buffer.snapshot()[1].tolist() == [1.0, 0.0]
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        HandleBuffer(0)
+
+
+def test_store_creates_one_buffer_per_handle():
+    store = UpdateStore(capacity=2)
+    store.append('a', 0.0, 1)
+    store.append('a', 1.0, 2)
+    store.append('b', 0.0, 3)
+    assert 'a' in store and 'c' not in store
+    assert store['a'].count == 2
+    assert store['b'].capacity == 2
@@ -19,6 +19,7 @@ import argparse
 import setup_path
 # Lokale Module
 import reference_provider
+from update_store import HandleBuffer, get_capacity
 from sdc11073.wsdiscovery import WSDiscovery
 from sdc11073.definitions_sdc import SdcV1Definitions
 from sdc11073.consumer import SdcConsumer
@@ -26,14 +27,14 @@ from sdc11073.mdib.consumermdib import ConsumerMdib
 from sdc11073 import observableproperties
 
 
-def provider_thread_target():
+def provider_thread_target(handle: reference_provider.ProviderHandle):
     """
     Provider mit konfigurierbarem Sendeintervall starten.
     Liest ENV ref_send_interval (Sekunden) aus.
     """
     send_interval = float(os.getenv('ref_send_interval', '0.05'))
     os.environ['ref_send_interval'] = str(send_interval)
-    reference_provider.run_provider()
+    reference_provider.run_provider(handle)
 
 
 def run_performance_consumer(perf_duration: int, discovery_timeout: int):
@@ -53,7 +54,8 @@ def run_performance_consumer(perf_duration: int, discovery_timeout: int):
     start_search = time.time()
     print(f"Suche Service mit EPR {epr} (Timeout {discovery_timeout}s)...")
     while not service and time.time() - start_search < discovery_timeout:
-        for s in wsd.search_services(types=SdcV1Definitions.MedicalDeviceTypesFilter):
+        # Provider ist bereits angekündigt, kurze Suchfenster genügen
+        for s in wsd.search_services(types=SdcV1Definitions.MedicalDeviceTypesFilter, timeout=1):
             if s.epr and s.epr.endswith(epr):
                 service = s
                 break
@@ -74,13 +76,15 @@ def run_performance_consumer(perf_duration: int, discovery_timeout: int):
     mdib = ConsumerMdib(client)
     mdib.init_mdib()
 
-    # Liste von Zeitstempeln in Sekunden (float)
-    recv_times: list[float] = []
+    # Empfangszeiten aller Updates in einem Ringpuffer, Abstände als laufende Zähler
+    recv_times = HandleBuffer(get_capacity())
 
     def on_perf_metric(updates):
         # Verwende time.perf_counter() für hohe Auflösung
-        for _ in updates:
-            recv_times.append(time.perf_counter())
+        now = time.perf_counter()
+        version = getattr(mdib, 'mdib_version', None)
+        for st in updates.values():
+            recv_times.append(now, st.MetricValue.Value if st.MetricValue is not None else None, version)
 
     observableproperties.bind(
         mdib,
@@ -92,23 +96,17 @@ def run_performance_consumer(perf_duration: int, discovery_timeout: int):
     client.stop_all()
     wsd.stop()
 
-    if not recv_times:
+    if not recv_times.count:
         print("Keine Metrik-Updates empfangen.")
         sys.exit(1)
 
-    total = len(recv_times)
+    total = recv_times.count
     rate_hz = total / perf_duration
 
-    # Sortiere und berechne Intervalle in Millisekunden
-    recv_times.sort()
-    intervals = [
-        (t2 - t1) * 1000.0
-        for t1, t2 in zip(recv_times, recv_times[1:])
-        if t2 > t1  # sichere Filterung, um 0-Differenzen zu vermeiden
-    ]
-    avg_int = sum(intervals) / len(intervals) if intervals else 0.0
-    min_int = min(intervals) if intervals else 0.0
-    max_int = max(intervals) if intervals else 0.0
+    # Intervalle in Millisekunden; 0-Differenzen (States desselben Reports) zählen nicht
+    avg_int = recv_times.interval_mean * 1000.0
+    min_int = recv_times.interval_min * 1000.0 if recv_times.intervals else 0.0
+    max_int = recv_times.interval_max * 1000.0
     return total, rate_hz, avg_int, min_int, max_int
 
 
@@ -135,15 +133,25 @@ def main():
         os.environ['ref_commlog_dir'] = args.logdir
 
     print("Starte Provider-Thread...")
-    thread = threading.Thread(target=provider_thread_target, daemon=True)
+    handle = reference_provider.ProviderHandle()
+    thread = threading.Thread(target=provider_thread_target, args=(handle,), daemon=True)
     thread.start()
     print(f"Warte bis zu {args.timeout}s auf Provider-Start...")
-    time.sleep(args.timeout)
-
-    total, rate_hz, avg_int, min_int, max_int = run_performance_consumer(
-        perf_duration=args.perf_duration,
-        discovery_timeout=args.timeout
-    )
+    start = time.time()
+    try:
+        handle.wait_ready(args.timeout)
+    except Exception as e:
+        print(f"FEHLER: Provider nicht bereit: {e!r}")
+        sys.exit(1)
+    print(f"Provider bereit nach {time.time() - start:.2f}s")
+
+    try:
+        total, rate_hz, avg_int, min_int, max_int = run_performance_consumer(
+            perf_duration=args.perf_duration,
+            discovery_timeout=args.timeout
+        )
+    finally:
+        handle.stop(args.timeout)
 
     print("\n--- ERGEBNISSE ---")
     print(f"Gesamt-Updates: {total}")
@@ -0,0 +1,137 @@
+"""Batched per-tick commits for the reference provider.
+
+sdc11073 only allows states of one kind per transaction (metric, alert, ...),
+so a tick can not be folded into a single transaction. The engine collects all
+changes of a tick and commits at most one metric_state_transaction and one
+alert_state_transaction, i.e. at most one report per state kind and tick.
+"""
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from sdc11073.mdib import ProviderMdib
+
+    from publish_policy import PublishFilter
+
+
+@dataclasses.dataclass
+class TickStats:
+    """Counters of one tick (or accumulated over many ticks)."""
+    transactions: int = 0
+    reports: int = 0
+    metric_states: int = 0
+    alert_states: int = 0
+
+    def add(self, other: TickStats) -> None:
+        self.transactions += other.transactions
+        self.reports += other.reports
+        self.metric_states += other.metric_states
+        self.alert_states += other.alert_states
+
+
+class TickEngine:
+    """Collects metric values and alert presences and commits them batched.
+
+    With a PublishFilter, values the filter rejects are not staged at all and
+    due heartbeats of the filter are staged on commit. Values are reported to
+    the filter as published once their transaction succeeded; the values of a
+    failed transaction are staged again for one retry in the next commit.
+    """
+
+    def __init__(self, mdib: ProviderMdib, publish_filter: PublishFilter | None = None):
+        self._mdib = mdib
+        self._filter = publish_filter
+        self._metric_values: dict[str, Any] = {}
+        self._metric_validity: dict[str, Any] = {}
+        self._alert_presence: dict[str, bool] = {}
+        self._metric_handles: set[str] = set()
+        self._alert_handles: set[str] = set()
+        self._retrying: set[str] = set()
+        self.ticks = 0
+        self.total = TickStats()
+
+    def set_metric_value(self, handle: str, value: Any, validity: Any = None) -> None:
+        """Stage a new MetricValue.Value, and MetricQuality.Validity if given; the last value per tick wins."""
+        self._metric_handles.add(handle)
+        if self._filter is None or self._filter.should_publish(handle, value):
+            self._metric_values[handle] = value
+            if validity is None:
+                self._metric_validity.pop(handle, None)
+            else:
+                self._metric_validity[handle] = validity
+
+    def set_alert_presence(self, handle: str, presence: bool, force: bool = False) -> None:
+        """Stage a new Presence of an alert condition; force stages it even if the filter would drop it."""
+        self._alert_handles.add(handle)
+        if force or self._filter is None or self._filter.should_publish(handle, presence):
+            self._alert_presence[handle] = presence
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._metric_values or self._alert_presence)
+
+    def commit(self) -> TickStats:
+        """Write all staged changes, one transaction per state kind."""
+        if self._filter is not None:
+            # the filter may be shared with other engines: only take the heartbeats of own handles
+            own_handles = self._metric_handles | self._alert_handles
+            for handle, value in self._filter.heartbeats_due(own_handles):
+                if handle in self._alert_handles:
+                    self.set_alert_presence(handle, value)
+                else:
+                    self.set_metric_value(handle, value)
+        stats = TickStats()
+        metric_values, self._metric_values = self._metric_values, {}
+        metric_validity, self._metric_validity = self._metric_validity, {}
+        alert_presence, self._alert_presence = self._alert_presence, {}
+        retrying, self._retrying = self._retrying, set()
+        try:
+            if metric_values:
+                try:
+                    with self._mdib.metric_state_transaction() as mgr:
+                        for handle, value in metric_values.items():
+                            state = mgr.get_state(handle)
+                            if state.MetricValue is None:
+                                state.mk_metric_value()
+                            state.MetricValue.Value = value
+                            if handle in metric_validity:
+                                state.MetricValue.MetricQuality.Validity = metric_validity[handle]
+                except Exception:
+                    self._restage(self._metric_validity, metric_validity, retrying)
+                    self._restage(self._metric_values, metric_values, retrying)
+                    self._restage(self._alert_presence, alert_presence, retrying)
+                    raise
+                self._published(metric_values)
+                stats.transactions += 1
+                stats.reports += 1
+                stats.metric_states = len(metric_values)
+            if alert_presence:
+                try:
+                    with self._mdib.alert_state_transaction() as mgr:
+                        for handle, presence in alert_presence.items():
+                            mgr.get_state(handle).Presence = presence
+                except Exception:
+                    self._restage(self._alert_presence, alert_presence, retrying)
+                    raise
+                self._published(alert_presence)
+                stats.transactions += 1
+                stats.reports += 1
+                stats.alert_states = len(alert_presence)
+        finally:
+            self.ticks += 1
+            self.total.add(stats)
+        return stats
+
+    def _published(self, values: dict[str, Any]) -> None:
+        if self._filter is not None:
+            for handle, value in values.items():
+                self._filter.published(handle, value)
+
+    def _restage(self, staged: dict[str, Any], values: dict[str, Any], retrying: set[str]) -> None:
+        # newer values staged in the meantime win; a value that failed twice is dropped
+        for handle, value in values.items():
+            if handle not in retrying:
+                staged.setdefault(handle, value)
+                self._retrying.add(handle)
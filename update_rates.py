@@ -0,0 +1,222 @@
+"""Per-handle update rates of the reference provider metrics.
+
+Real monitors update numerics about once per second, enumerations and strings
+rarely, alert conditions on change and waveforms in batches several times per
+second. An UpdateRates config assigns a period in seconds to every metric,
+either per kind (numeric, enumstring, string, waveform) or per handle; null
+disables a metric. Alert conditions are evaluated whenever one of their source
+metrics updates ("alerts": "on_change") or additionally re-staged every
+"alerts" seconds; the re-stage bypasses the publish filter, so the unchanged
+presence is reported.
+
+ref_update_rates names the JSON file (e.g. update_rates_default.json); without
+it, only heart rate and SpO2 update, both in every tick, and the waveforms are
+left to the rt sample loop of sdc11073.
+
+A RateDriver schedules all metrics of a provider on a TimerWheel whose tick is
+the provider loop interval, so periods are rounded to whole ticks and one tick
+only costs work for the metrics that are due.
+"""
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import pathlib
+import time
+import zlib
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from sdc11073.xml_types import pm_qnames as pm
+
+import reference_provider
+from scheduler import TimerWheel
+from signal_generator import IndexedWalks, WalkSpec, get_seed, heart_rate_spec, spo2_spec
+
+if TYPE_CHECKING:
+    from sdc11073.provider import SdcProvider
+
+    from alert_engine import AlertEngine
+    from tick_engine import TickEngine
+
+DEFAULT_CONFIG_PATH = pathlib.Path(__file__).parent / 'update_rates_default.json'
+
+KINDS = {
+    'numeric': pm.NumericMetricDescriptor,
+    'enumstring': pm.EnumStringMetricDescriptor,
+    'string': pm.StringMetricDescriptor,
+    'waveform': pm.RealTimeSampleArrayMetricDescriptor,
+}
+
+_ALERTS_KEY = ('alerts', None)
+
+
+def generic_numeric_spec(handle: str) -> WalkSpec:
+    return WalkSpec(handle, start_low=40, start_high=60, max_step=2, lower=0, upper=100)
+
+
+@dataclasses.dataclass(frozen=True)
+class UpdateRates:
+    """Update period in seconds per metric kind and per handle; None = not updated."""
+    defaults: dict[str, float | None] = dataclasses.field(default_factory=dict)
+    handles: dict[str, float | None] = dataclasses.field(default_factory=dict)
+    alerts: float | None = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> UpdateRates:
+        unknown = set(config.get('defaults', {})) - set(KINDS)
+        if unknown:
+            raise ValueError(f'unknown metric kinds in update rates: {sorted(unknown)}')
+        alerts = config.get('alerts', 'on_change')
+        return cls(
+            defaults=dict(config.get('defaults', {})),
+            handles=dict(config.get('handles', {})),
+            alerts=None if alerts == 'on_change' else float(alerts),
+        )
+
+    @classmethod
+    def from_env(cls) -> UpdateRates | None:
+        """Load the file named by ref_update_rates, None if not set."""
+        path = os.getenv('ref_update_rates')
+        if not path:
+            return None
+        return cls.from_config(json.loads(pathlib.Path(path).read_bytes()))
+
+    @classmethod
+    def legacy(cls, interval: float) -> UpdateRates:
+        """Heart rate and SpO2 in every tick, nothing else."""
+        return cls(handles={reference_provider.HEART_RATE_HANDLE: interval, reference_provider.SPO2_HANDLE: interval})
+
+    @property
+    def drives_waveforms(self) -> bool:
+        """True if the waveforms are written by the RateDriver instead of the rt sample loop."""
+        return self.defaults.get('waveform') is not None
+
+    def period(self, handle: str, kind: str) -> float | None:
+        if handle in self.handles:
+            return self.handles[handle]
+        return self.defaults.get(kind)
+
+
+def _ticks(period: float, interval: float) -> int:
+    return max(1, round(period / interval))
+
+
+def _phase(handle: str, period: int) -> int:
+    """Stable offset within the period, so equal periods do not all fire in the same tick."""
+    return zlib.crc32(handle.encode()) % period
+
+
+class RateDriver:
+    """Updates the metrics of one provider at their configured rates."""
+
+    finished = False  # runs until the provider is stopped
+    PICK_BLOCK = 256
+
+    def __init__(self, prov: SdcProvider, rates: UpdateRates, interval: float, seed: int | None = None):
+        self._prov = prov
+        self.rates = rates
+        self.interval = interval
+        self.latest: dict[str, Any] = {}
+        descriptions = prov.mdib.descriptions
+        # metrics written by operations are left to the consumer
+        targets = {getattr(desc, 'OperationTarget', None) for desc in descriptions.objects}
+        periods: dict[tuple[str, str], int] = {}
+        for kind, node_type in KINDS.items():
+            for desc in descriptions.NODETYPE.get(node_type, []):
+                if kind == 'waveform' and not rates.drives_waveforms:
+                    continue
+                period = rates.period(desc.Handle, kind)
+                if period and desc.Handle not in targets:
+                    periods[(kind, desc.Handle)] = _ticks(period, interval)
+        if rates.alerts:
+            periods[_ALERTS_KEY] = _ticks(rates.alerts, interval)
+        self.wheel = TimerWheel.for_periods(periods.values())
+        for key, period in periods.items():
+            self.wheel.schedule(key, period, _phase(key[1] or '', period))
+
+        specs = {reference_provider.HEART_RATE_HANDLE: heart_rate_spec, reference_provider.SPO2_HANDLE: spo2_spec}
+        numerics = [specs.get(handle, generic_numeric_spec)(handle) for kind, handle in periods if kind == 'numeric']
+        self._walks = IndexedWalks(numerics, seed=seed) if numerics else None
+        self._rng = np.random.default_rng(seed)
+        self._allowed = {
+            handle: [v.Value for v in descriptions.handle.get_one(handle).AllowedValue or []] or ['']
+            for kind, handle in periods if kind == 'enumstring'
+        }
+        # pre-drawn picks per enumstring, refilled every PICK_BLOCK updates
+        self._picks: dict[str, list[str]] = {}
+        self._string_counts: dict[str, int] = {}
+        self._waveforms = {}
+        self._next_start: dict[str, float] = {}
+        if rates.drives_waveforms:
+            now = time.time()
+            self._waveforms = {handle: generator
+                               for handle, generator in reference_provider.get_waveform_generators(prov).items()
+                               if ('waveform', handle) in periods}
+            self._next_start = {handle: now for handle in self._waveforms}
+
+    @property
+    def handle_count(self) -> int:
+        return self.wheel.size
+
+    def step(self, engine: TickEngine, alert_engine: AlertEngine) -> list[tuple[str, Any]]:
+        """Stage the values of all due metrics (and alert flips) on engine.
+
+        Waveform samples are written directly in their own rt sample transaction.
+        Returns the (handle, value) pairs of the numerics updated in this tick.
+        """
+        numerics = []
+        chunks = {}
+        alerts_due = False
+        for kind, handle in self.wheel.advance():
+            if kind == 'numeric':
+                numerics.append(handle)
+            elif kind == 'enumstring':
+                engine.set_metric_value(handle, self._pick(handle))
+            elif kind == 'string':
+                count = self._string_counts[handle] = self._string_counts.get(handle, 0) + 1
+                engine.set_metric_value(handle, f'{handle} #{count}')
+            elif kind == 'waveform':
+                if (chunk := self._waveform_chunk(handle)) is not None:
+                    chunks[handle] = chunk
+            else:
+                alerts_due = True
+        values = []
+        if numerics:
+            walks = self._walks
+            values = list(zip(numerics, walks.step([walks.index[h] for h in numerics])))
+            for handle, value in values:
+                engine.set_metric_value(handle, value)
+            self.latest.update(values)
+        for alert_handle, presence in alert_engine.update(values):
+            engine.set_alert_presence(alert_handle, presence)
+        if alerts_due:
+            for alert_handle, presence in alert_engine.presence.items():
+                engine.set_alert_presence(alert_handle, presence, force=True)
+        if chunks:
+            reference_provider.write_waveform_samples(self._prov, chunks)
+        return values
+
+    def _pick(self, handle: str) -> str:
+        picks = self._picks.get(handle)
+        if not picks:
+            allowed = self._allowed[handle]
+            # reversed, so pop() hands them out in drawing order
+            picks = self._picks[handle] = [allowed[i] for i in
+                                           self._rng.integers(len(allowed), size=self.PICK_BLOCK).tolist()[::-1]]
+        return picks.pop()
+
+    def _waveform_chunk(self, handle: str) -> tuple[float, list[float]] | None:
+        generator = self._waveforms[handle]
+        start = self._next_start[handle]
+        count = int((time.time() - start) / generator.sample_period)
+        if count <= 0:
+            return None
+        self._next_start[handle] = start + count * generator.sample_period
+        return start, generator.next_samples(count)
+
+
+def mk_rate_driver(prov: SdcProvider, rates: UpdateRates | None, interval: float) -> RateDriver:
+    """RateDriver for rates, or for UpdateRates.legacy(interval) if rates is None."""
+    return RateDriver(prov, rates or UpdateRates.legacy(interval), interval, seed=get_seed())
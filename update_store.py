@@ -0,0 +1,162 @@
+"""
+Speicher für empfangene Updates mit festem Speicherbudget.
+
+Je Handle ein vorallokierter Ringpuffer aus NumPy-Arrays mit
+(Empfangszeit, Wert, MDIB-Version) der letzten `capacity` Updates, dazu
+laufende Zähler über alle Updates (Anzahl, erstes/letztes Update, Minimum,
+Maximum und Mittelwert der Werte und der Empfangsabstände). Anhängen ist O(1),
+Zustandsobjekte werden nicht aufbewahrt, nur ihr Wert: numerische Werte als
+float, Alarm-Presence als 1.0/0.0, alles andere als NaN (der letzte Rohwert
+bleibt in `last_value`).
+
+Die Kapazität je Handle kommt aus ref_update_buffer (Default 4096).
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+from numbers import Number
+from typing import Any, Iterator
+
+import numpy as np
+
+DEFAULT_CAPACITY = 4096
+
+
+def get_capacity() -> int:
+    """Kapazität je Handle aus ref_update_buffer oder Default."""
+    return int(os.getenv('ref_update_buffer', str(DEFAULT_CAPACITY)))
+
+
+def numeric_value(value: Any) -> float:
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, Number):
+        return float(value)
+    return math.nan
+
+
+class HandleBuffer:
+    """Ringpuffer und laufende Zähler eines Handles."""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f'capacity muss > 0 sein, nicht {capacity}')
+        self.capacity = capacity
+        self._times = np.empty(capacity, dtype=np.float64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._versions = np.empty(capacity, dtype=np.int64)
+        self.count = 0
+        self.first_time: float | None = None
+        self.last_time: float | None = None
+        self.last_value: Any = None
+        self.last_version: int | None = None
+        self.value_min = math.inf
+        self.value_max = -math.inf
+        self._value_sum = 0.0
+        self._value_count = 0
+        self.interval_min = math.inf
+        self.interval_max = 0.0
+        self._interval_sum = 0.0
+        self.intervals = 0
+
+    def append(self, recv_time: float, value: Any, version: int | None = None) -> None:
+        i = self.count % self.capacity
+        number = numeric_value(value)
+        self._times[i] = recv_time
+        self._values[i] = number
+        self._versions[i] = -1 if version is None else version
+        self.count += 1
+        if self.last_time is None:
+            self.first_time = recv_time
+        else:
+            interval = recv_time - self.last_time
+            # gleiche Zeitstempel (mehrere States eines Reports) zählen nicht als Abstand
+            if interval > 0:
+                self.intervals += 1
+                self._interval_sum += interval
+                self.interval_min = min(self.interval_min, interval)
+                self.interval_max = max(self.interval_max, interval)
+        self.last_time = recv_time
+        self.last_value = value
+        self.last_version = version
+        if not math.isnan(number):
+            self._value_count += 1
+            self._value_sum += number
+            self.value_min = min(self.value_min, number)
+            self.value_max = max(self.value_max, number)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def retained(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def value_mean(self) -> float:
+        return self._value_sum / self._value_count if self._value_count else math.nan
+
+    @property
+    def interval_mean(self) -> float:
+        return self._interval_sum / self.intervals if self.intervals else 0.0
+
+    def rate(self) -> float:
+        """Updates pro Sekunde zwischen erstem und letztem Update."""
+        if self.count < 2 or self.last_time == self.first_time:
+            return 0.0
+        return (self.count - 1) / (self.last_time - self.first_time)
+
+    def snapshot(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Kopie von (Empfangszeiten, Werte, MDIB-Versionen) der gehaltenen Updates, älteste zuerst."""
+        n = self.retained
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        order = (np.arange(n) + start) % self.capacity
+        return self._times[order], self._values[order], self._versions[order]
+
+
+class UpdateStore:
+    """HandleBuffer je Handle; thread-sicher für einen Schreiber und beliebige Leser."""
+
+    def __init__(self, capacity: int | None = None):
+        self.capacity = capacity or get_capacity()
+        self._buffers: dict[str, HandleBuffer] = {}
+        self._lock = threading.Lock()
+
+    def append(self, handle: str, recv_time: float, value: Any, version: int | None = None) -> HandleBuffer:
+        buffer = self._buffers.get(handle)
+        if buffer is None:
+            with self._lock:
+                buffer = self._buffers.setdefault(handle, HandleBuffer(self.capacity))
+        buffer.append(recv_time, value, version)
+        return buffer
+
+    def __getitem__(self, handle: str) -> HandleBuffer:
+        return self._buffers[handle]
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._buffers
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def __bool__(self) -> bool:
+        return bool(self._buffers)
+
+    def count(self, handle: str) -> int:
+        buffer = self._buffers.get(handle)
+        return buffer.count if buffer is not None else 0
+
+    def items(self) -> Iterator[tuple[str, HandleBuffer]]:
+        with self._lock:
+            return iter(list(self._buffers.items()))
+
+    @property
+    def total(self) -> int:
+        return sum(buffer.count for _, buffer in self.items())
+
+    @property
+    def nbytes(self) -> int:
+        """Speicherbedarf der Ringpuffer in Bytes."""
+        return len(self._buffers) * self.capacity * 3 * 8
@@ -0,0 +1,95 @@
+"""Precomputed waveform sample generators for RealTimeSampleArray metrics.
+
+A generator computes a buffer of whole beats with NumPy once and then hands
+out slices of that (already converted) buffer. It implements the waveform
+generator protocol of sdc11073 (sample_period and next_samples(count)), so it
+can be registered with the provider's waveform provider.
+"""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+MIN_SAMPLE_RATE = 125
+MAX_SAMPLE_RATE = 1000
+
+# (position in beat as fraction of RR, width in seconds, amplitude in mV)
+_ECG_WAVES = (
+    (0.10, 0.025, 0.15),   # P
+    (0.22, 0.010, -0.10),  # Q
+    (0.25, 0.012, 1.00),   # R
+    (0.28, 0.012, -0.25),  # S
+    (0.55, 0.050, 0.30),   # T
+)
+# (position in beat as fraction of RR, width as fraction of RR, amplitude)
+_PLETH_WAVES = (
+    (0.30, 0.10, 1.00),    # systolic peak
+    (0.55, 0.08, 0.35),    # dicrotic wave
+)
+
+
+def get_sample_rate(name: str, default: int) -> int:
+    """Get the sample rate in Hz of a waveform from ref_<name>_rate or default."""
+    rate = int(os.getenv(f'ref_{name}_rate', str(default)))
+    if not MIN_SAMPLE_RATE <= rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f'ref_{name}_rate must be in {MIN_SAMPLE_RATE}..{MAX_SAMPLE_RATE} Hz, got {rate}')
+    return rate
+
+
+class PrecomputedWaveform:
+    """Cycles through a precomputed sample buffer."""
+
+    def __init__(self, samples: np.ndarray, sample_rate: int, decimals: int = 3):
+        self.sample_rate = sample_rate
+        self.sample_period = 1.0 / sample_rate
+        self._samples: list[float] = np.round(samples, decimals).tolist()
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def next_samples(self, count: int) -> list[float]:
+        samples = self._samples
+        out = []
+        while count > 0:
+            chunk = samples[self._pos:self._pos + count]
+            out.extend(chunk)
+            count -= len(chunk)
+            self._pos = (self._pos + len(chunk)) % len(samples)
+        return out
+
+
+def _beat_phase(sample_rate: int, heart_rate: float, beats: int, variability: float,
+                rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Return time since beat start and RR interval of every sample of `beats` beats."""
+    rr = 60.0 / heart_rate * (1.0 + variability * rng.standard_normal(beats))
+    starts = np.concatenate(([0.0], np.cumsum(rr)[:-1]))
+    n_samples = int(round(rr.sum() * sample_rate))
+    t = np.arange(n_samples) / sample_rate
+    beat = np.searchsorted(starts, t, side='right') - 1
+    return t - starts[beat], rr[beat]
+
+
+def ecg_waveform(sample_rate: int, heart_rate: float = 75.0, beats: int = 16,
+                 variability: float = 0.03, noise: float = 0.01, seed: int | None = None) -> PrecomputedWaveform:
+    """ECG lead II like signal in mV."""
+    rng = np.random.default_rng(seed)
+    tau, rr = _beat_phase(sample_rate, heart_rate, beats, variability, rng)
+    signal = np.zeros_like(tau)
+    for position, width, amplitude in _ECG_WAVES:
+        signal += amplitude * np.exp(-0.5 * ((tau - position * rr) / width) ** 2)
+    signal += noise * rng.standard_normal(signal.shape)
+    return PrecomputedWaveform(signal, sample_rate)
+
+
+def pleth_waveform(sample_rate: int, heart_rate: float = 75.0, beats: int = 16,
+                   variability: float = 0.03, noise: float = 0.005, seed: int | None = None) -> PrecomputedWaveform:
+    """Plethysmogram like signal, normalized to about 0..1."""
+    rng = np.random.default_rng(seed)
+    tau, rr = _beat_phase(sample_rate, heart_rate, beats, variability, rng)
+    signal = np.zeros_like(tau)
+    for position, width, amplitude in _PLETH_WAVES:
+        signal += amplitude * np.exp(-0.5 * ((tau - position * rr) / (width * rr)) ** 2)
+    signal += noise * rng.standard_normal(signal.shape)
+    return PrecomputedWaveform(signal, sample_rate)